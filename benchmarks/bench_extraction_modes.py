@@ -0,0 +1,45 @@
+"""Structured (one call) vs. two-call extraction against a stub model.
+
+The stub sleeps STUB_LATENCY seconds per generate_content call, standing in
+for Gemini round-trip time, so the comparison shows what the call count costs:
+
+    STUB_LATENCY=1.5 python benchmarks/bench_extraction_modes.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("EXTRACTION_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "cache.db"))
+
+from fake_model import install
+
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", "1.0"))
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "5"))
+
+StubModel = install(latency=STUB_LATENCY)
+
+import text_extractor  # noqa: E402  (imported after the stub is installed)
+
+
+def bench(mode, extract, raw_bytes):
+    text_extractor.EXTRACTION_MODE = mode
+    StubModel.calls = 0
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        extract(raw_bytes)
+    elapsed = (time.perf_counter() - start) / ITERATIONS
+    return elapsed, StubModel.calls / ITERATIONS
+
+
+if __name__ == "__main__":
+    raw_bytes = text_extractor.read_image_bytes(text_extractor.DEMO_PRESCRIPTION_PATH)
+    print(f"stub latency {STUB_LATENCY:.2f}s/call, {ITERATIONS} iterations")
+    for label, extract in (("medication", text_extractor._extract_medication_fields),
+                           ("prescription", text_extractor._extract_prescription_medications)):
+        for mode in ("two_call", "structured"):
+            elapsed, calls = bench(mode, extract, raw_bytes)
+            print(f"{label:<13} {mode:<11} {elapsed * 1000:8.1f}ms/extraction  {calls:.0f} model calls")
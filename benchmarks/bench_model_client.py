@@ -0,0 +1,113 @@
+"""Drive the shared model client against the local fake Gemini server.
+
+    python benchmarks/bench_model_client.py --calls 40 --rate 10 --max-in-flight 4
+
+Each scenario fires ``--calls`` concurrent requests through a fresh
+ModelClient, using the real SDK over REST against fake_model_server:
+
+* burst: healthy upstream; the server must never see more than
+  ``--max-in-flight`` requests at once or (after the burst) more than
+  ``--rate`` per second.
+* flaky: a share of requests get 429s; jittered retries must still get every
+  call through.
+* outage: every request gets a 503; the breaker must open and the remaining
+  calls fail fast instead of each waiting out its retries.
+
+Exits non-zero if any scenario misses its check.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_model_server import FakeModelServer
+from metrics import render
+from model_client import ModelClient, ModelUnavailableError, _retryable_errors
+
+PROMPT = "I am currently taking aspirin. If I now take ibuprofen, is it safe to take them together?"
+
+
+def run(server, client, calls):
+    def one(_):
+        start = time.monotonic()
+        try:
+            client.generate_content("bench", PROMPT)
+            outcome = "ok"
+        except ModelUnavailableError as e:
+            outcome = e.reason
+        return outcome, time.monotonic() - start
+
+    server.reset()
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=calls) as executor:
+        results = list(executor.map(one, range(calls)))
+    elapsed = time.monotonic() - start
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    slowest = max(seconds for _, seconds in results)
+    print(f"  {elapsed:6.2f}s  outcomes {outcomes}  server requests {server.requests} "
+          f"(failed {server.failures}), max concurrent {server.max_in_flight}, slowest call {slowest:.2f}s")
+    return outcomes, elapsed
+
+
+def peak_rate(request_times, window=1.0):
+    """Most requests the server saw in any ``window`` seconds"""
+    peak, first = 0, 0
+    for last, t in enumerate(request_times):
+        while t - request_times[first] > window:
+            first += 1
+        peak = max(peak, last - first + 1)
+    return peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=40)
+    parser.add_argument("--rate", type=float, default=10.0, help="client calls per second")
+    parser.add_argument("--burst", type=int, default=5)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.1, help="server seconds per request")
+    args = parser.parse_args()
+
+    import google.generativeai as genai
+
+    server = FakeModelServer(latency=args.latency).start()
+    genai.configure(api_key="fake", transport="rest", client_options={"api_endpoint": server.endpoint})
+
+    def client(**overrides):
+        settings = dict(rate=args.rate, burst=args.burst, max_in_flight=args.max_in_flight,
+                        timeout=5, deadline=30, max_attempts=6, breaker_failures=5, breaker_reset=30)
+        settings.update(overrides)
+        return ModelClient(genai.GenerativeModel("gemini-2.5-flash"), _retryable_errors(), **settings)
+
+    failed = []
+
+    print("burst: healthy upstream")
+    outcomes, _ = run(server, client(), args.calls)
+    # The bucket starts full, so the first second may carry burst + rate requests
+    rate_ok = peak_rate(server.request_times) <= args.burst + args.rate + 1
+    if outcomes != {"ok": args.calls} or server.max_in_flight > args.max_in_flight or not rate_ok:
+        failed.append("burst")
+
+    print("flaky: 30% of requests throttled with 429")
+    server.failure_rate, server.failure_status = 0.3, 429
+    outcomes, _ = run(server, client(breaker_failures=args.calls), args.calls)
+    if outcomes != {"ok": args.calls} or server.failures == 0:
+        failed.append("flaky")
+
+    print("outage: every request fails with 503")
+    server.failure_rate, server.failure_status = 1.0, 503
+    outcomes, elapsed = run(server, client(), args.calls)
+    # Without the breaker every call would retry; with it, only the first few reach the server
+    if outcomes.get("ok") or outcomes.get("circuit_open", 0) == 0 or server.requests >= args.calls:
+        failed.append("outage")
+
+    print("\n" + "\n".join(line for line in render().splitlines()
+                           if line.startswith(("medsafe_model_attempts", "medsafe_model_rejected"))))
+    server.shutdown()
+    if failed:
+        sys.exit(f"failed: {', '.join(failed)}")
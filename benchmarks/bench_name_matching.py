@@ -0,0 +1,111 @@
+"""Medication name matching speed and accuracy over synthetic drug vocabularies.
+
+    python benchmarks/bench_name_matching.py --sizes 20 1000 10000 100000
+
+For each vocabulary size a NameIndex is built over generated drug-like names
+("dexolopril", "varamastatin", ...). It is then queried with what a label
+read tends to produce for names that are in it, and with names that are not:
+
+* exact: the same name with case changed, strength and dosage form appended
+* typo: one substituted, dropped or swapped letter, plus a strength
+* unknown: a name that isn't in the vocabulary; it should not match. Large
+  synthetic vocabularies are dense enough that most such names are one edit
+  from a real one, so this column falls with size by design.
+
+Reports build time, per-lookup p50/p99, and how often each kind resolved to
+the right name (or, for unknown, to nothing). Exits non-zero when a lookup
+over a prescription-sized vocabulary (the first size) has a p99 above
+``--budget-ms``.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_dashboard import percentile
+from medication_names import NameIndex
+
+PREFIXES = ["a", "be", "ca", "de", "flu", "ga", "hy", "lo", "me", "ni", "pa", "ro", "se", "te", "va", "zo"]
+MIDDLES = ["xo", "lo", "ra", "ti", "na", "me", "su", "do", "ve", "ci", "pro", "ma", "ze", "lu", "fe", "ba"]
+SUFFIXES = ["pril", "statin", "olol", "azole", "sartan", "dipine", "cillin", "oxacin", "tidine",
+            "mab", "vir", "zepam", "tropin", "formin", "parin", "thiazide"]
+STRENGTHS = ["5mg", "10 mg", "20MG", "500 mg", "81mg", "0.5 mg", "100 mcg"]
+FORMS = ["", " tablets", " TABS", " capsules", " ER", " oral solution", " HCl"]
+
+
+def drug_names(count, rng, exclude=()):
+    names, exclude = set(), set(exclude)
+    while len(names) < count:
+        middle = "".join(rng.choice(MIDDLES) for _ in range(rng.randint(1, 3)))
+        name = rng.choice(PREFIXES) + middle + rng.choice(SUFFIXES)
+        if name not in exclude:
+            names.add(name)
+    return sorted(names)
+
+
+def as_on_label(name, rng):
+    case = rng.choice([str.upper, str.title, str.lower])
+    return f"{case(name)} {rng.choice(STRENGTHS)}{rng.choice(FORMS)}"
+
+
+def with_typo(name, rng):
+    i = rng.randrange(1, len(name) - 1)
+    kind = rng.choice(["substitute", "drop", "swap"])
+    if kind == "substitute":
+        name = name[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz".replace(name[i], "")) + name[i + 1:]
+    elif kind == "drop":
+        name = name[:i] + name[i + 1:]
+    else:
+        name = name[:i - 1] + name[i] + name[i - 1] + name[i + 1:]
+    return f"{name} {rng.choice(STRENGTHS)}"
+
+
+def bench(size, queries, seed):
+    rng = random.Random(seed)
+    vocabulary = drug_names(size, rng)
+    start = time.perf_counter()
+    index = NameIndex(vocabulary)
+    build = time.perf_counter() - start
+
+    sample = [rng.choice(vocabulary) for _ in range(queries)]
+    unknown = drug_names(queries, rng, exclude=vocabulary)
+    cases = {
+        "exact": [(as_on_label(name, rng), name) for name in sample],
+        "typo": [(with_typo(name, rng), name) for name in sample],
+        "unknown": [(name, None) for name in unknown],
+    }
+    results, latencies = {}, []
+    for kind, pairs in cases.items():
+        correct = 0
+        for query, expected in pairs:
+            start = time.perf_counter()
+            match = index.match(query)
+            latencies.append(time.perf_counter() - start)
+            correct += (match.name if match else None) == expected
+        results[kind] = correct / len(pairs)
+    return build, latencies, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=500, help="queries of each kind per size")
+    parser.add_argument("--budget-ms", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'names':>8} {'build ms':>9} {'p50 us':>8} {'p99 us':>8} {'exact':>7} {'typo':>7} {'unknown':>8}")
+    over_budget = False
+    for position, size in enumerate(args.sizes):
+        build, latencies, results = bench(size, args.queries, args.seed)
+        p99 = percentile(latencies, 99)
+        print(f"{size:>8} {build * 1000:>9.1f} {percentile(latencies, 50) * 1e6:>8.1f} {p99 * 1e6:>8.1f} "
+              f"{results['exact']:>7.1%} {results['typo']:>7.1%} {results['unknown']:>8.1%}")
+        if position == 0 and p99 * 1000 > args.budget_ms:
+            over_budget = True
+
+    if over_budget:
+        sys.exit(f"p99 lookup over {args.sizes[0]} names exceeds {args.budget_ms}ms")
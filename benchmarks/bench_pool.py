@@ -0,0 +1,64 @@
+"""Compare a fresh psycopg2 connection per query against the shared pool.
+
+Point it at a local Postgres so network latency doesn't drown the handshake:
+
+    DB_HOST=localhost DB_USER=postgres DB_PASSWORD=postgres python benchmarks/bench_pool.py
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+from db import DB_CONFIG, ConnectionPool
+
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "200"))
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<18} mean={statistics.mean(samples) * 1000:7.2f}ms "
+          f"p50={statistics.median(samples) * 1000:7.2f}ms p95={p95 * 1000:7.2f}ms")
+
+
+def bench_fresh_connections():
+    samples = []
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        conn = psycopg2.connect(**DB_CONFIG)
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        cur.close()
+        conn.close()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_pooled_connections():
+    db_pool = ConnectionPool(minconn=1, maxconn=4, **DB_CONFIG)
+    samples = []
+    try:
+        for _ in range(ITERATIONS):
+            start = time.perf_counter()
+            with db_pool.connection() as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT 1")
+                cur.fetchone()
+                cur.close()
+            samples.append(time.perf_counter() - start)
+    finally:
+        db_pool.closeall()
+    return samples
+
+
+if __name__ == "__main__":
+    print(f"{ITERATIONS} iterations against {DB_CONFIG['host']}:{DB_CONFIG['port']}")
+    fresh = bench_fresh_connections()
+    pooled = bench_pooled_connections()
+    report("fresh connection", fresh)
+    report("pooled checkout", pooled)
+    print(f"speedup: {statistics.mean(fresh) / statistics.mean(pooled):.1f}x")
@@ -0,0 +1,59 @@
+"""Payload size and encode time: raw re-encode vs. prepare_image.
+
+Walks test_images/ (or the directory given) and compares the original
+cv2.imread + default-quality imencode with the adaptive preprocessing:
+
+    python benchmarks/bench_preprocessing.py [image_dir] [--grayscale]
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cv2
+from image_preprocessing import prepare_image
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+
+
+def baseline_encode(path):
+    start = time.perf_counter()
+    img = cv2.imread(path)
+    success, encoded_image = cv2.imencode('.jpg', img)
+    return len(encoded_image.tobytes()), time.perf_counter() - start
+
+
+def adaptive_encode(path, grayscale):
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        raw_bytes = f.read()
+    encoded, report = prepare_image(raw_bytes, grayscale=grayscale)
+    return len(encoded), time.perf_counter() - start, report
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    grayscale = "--grayscale" in sys.argv
+    image_dir = args[0] if args else os.path.join(ROOT, "test_images")
+
+    paths = sorted(
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(image_dir)
+        for name in names if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    total_base = total_adaptive = 0
+    for path in paths:
+        base_bytes, base_time = baseline_encode(path)
+        new_bytes, new_time, report = adaptive_encode(path, grayscale)
+        total_base += base_bytes
+        total_adaptive += new_bytes
+        print(f"{os.path.relpath(path, image_dir)}: "
+              f"{os.path.getsize(path) / 1024:.0f}KB on disk | "
+              f"baseline {base_bytes / 1024:.0f}KB in {base_time * 1000:.1f}ms | "
+              f"adaptive {new_bytes / 1024:.0f}KB q={report['quality']} "
+              f"{report['width']}x{report['height']} in {new_time * 1000:.1f}ms")
+    if paths:
+        print(f"total payload {total_base / 1024:.0f}KB -> {total_adaptive / 1024:.0f}KB "
+              f"({100 * (1 - total_adaptive / total_base):.0f}% smaller)")
@@ -0,0 +1,85 @@
+"""Cold-start time of the API process, checked against a budget.
+
+Each run imports ``main`` in a fresh interpreter, so nothing is cached in
+sys.modules. Fails (exit 1) when the median exceeds STARTUP_BUDGET_SECONDS
+or when importing main drags in OpenCV or the Gemini SDK, which should
+only load on first use:
+
+    STARTUP_BUDGET_SECONDS=1.5 python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --importtime   # top offenders by cumulative time
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "2.0"))
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", "5"))
+MODULES = ["main", "update_prescription", "update_user_history", "bulk_ingest"]
+# Heavy dependencies that must stay out of an import of the API
+LAZY_MODULES = ["cv2", "numpy", "google.generativeai"]
+
+CHECK_LAZY = f"""
+import sys, main
+loaded = [m for m in {LAZY_MODULES!r} if m in sys.modules]
+if loaded:
+    sys.exit("imported eagerly: " + ", ".join(loaded))
+"""
+
+
+def run_python(args):
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True)
+
+
+def time_import(module):
+    samples = []
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        result = run_python(["-c", f"import {module}"])
+        samples.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            sys.exit(f"import {module} failed:\n{result.stderr}")
+    return samples
+
+
+def print_importtime(module, top=15):
+    result = run_python(["-X", "importtime", "-c", f"import {module}"])
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), name.strip()))
+    for cumulative_us, self_us, name in sorted(rows, reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:8.1f}ms cumulative {self_us / 1000:7.1f}ms self  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--importtime", action="store_true", help="show the slowest imports of main")
+    args = parser.parse_args()
+
+    baseline = statistics.median(time_import("os"))
+    print(f"{'interpreter':<22} median={baseline:6.3f}s")
+    medians = {}
+    for module in MODULES:
+        medians[module] = statistics.median(time_import(module))
+        print(f"{'import ' + module:<22} median={medians[module]:6.3f}s")
+
+    if args.importtime:
+        print("\nslowest imports of main:")
+        print_importtime("main")
+
+    failed = False
+    lazy = run_python(["-c", CHECK_LAZY])
+    if lazy.returncode != 0:
+        print(f"\nFAIL: {lazy.stderr.strip()}")
+        failed = True
+    if medians["main"] > STARTUP_BUDGET_SECONDS:
+        print(f"\nFAIL: import main took {medians['main']:.3f}s, budget {STARTUP_BUDGET_SECONDS:.3f}s")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,73 @@
+"""Accuracy and latency of the local pill counter over a labeled folder.
+
+Labels come from <folder>/labels.csv (``filename,count``) or, failing that,
+from file names such as ``bottle_3pills.jpg``:
+
+    python benchmarks/eval_pill_counter.py path/to/labeled_photos [--min-confidence 0.8]
+"""
+import argparse
+import csv
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pill_counter import PILL_COUNT_MIN_CONFIDENCE, count_pills
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp")
+FILENAME_LABEL = re.compile(r"(\d+)[_-]?pills?", re.IGNORECASE)
+
+
+def load_labels(folder):
+    labels_path = os.path.join(folder, "labels.csv")
+    if os.path.exists(labels_path):
+        with open(labels_path) as f:
+            return {row[0]: int(row[1]) for row in csv.reader(f) if len(row) >= 2 and row[1].strip().isdigit()}
+    labels = {}
+    for name in os.listdir(folder):
+        match = FILENAME_LABEL.search(name)
+        if name.lower().endswith(IMAGE_EXTENSIONS) and match:
+            labels[name] = int(match.group(1))
+    return labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("folder")
+    parser.add_argument("--min-confidence", type=float, default=PILL_COUNT_MIN_CONFIDENCE)
+    args = parser.parse_args()
+
+    labels = load_labels(args.folder)
+    if not labels:
+        print("No labeled images found")
+        return
+
+    results = []
+    for name, expected in sorted(labels.items()):
+        with open(os.path.join(args.folder, name), "rb") as f:
+            raw_bytes = f.read()
+        start = time.perf_counter()
+        count, confidence = count_pills(raw_bytes)
+        results.append((name, expected, count, confidence, time.perf_counter() - start))
+
+    confident = [r for r in results if r[3] >= args.min_confidence]
+    latencies = sorted(r[4] for r in results)
+    for name, expected, count, confidence, elapsed in results:
+        flag = "" if count == expected else "  MISS"
+        print(f"{name}: expected {expected} got {count} (confidence {confidence:.2f}, {elapsed * 1000:.1f}ms){flag}")
+
+    print(f"\n{len(results)} images")
+    print(f"exact accuracy       {sum(r[1] == r[2] for r in results) / len(results):.1%}")
+    print(f"mean absolute error  {statistics.mean(abs(r[1] - r[2]) for r in results):.2f}")
+    print(f"fast-path coverage   {len(confident) / len(results):.1%} at confidence >= {args.min_confidence}")
+    if confident:
+        print(f"fast-path accuracy   {sum(r[1] == r[2] for r in confident) / len(confident):.1%}")
+    print(f"latency p50={statistics.median(latencies) * 1000:.1f}ms "
+          f"p95={latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""EXPLAIN ANALYZE the hot queries before and after the index/normalization migrations.
+
+Run against a seeded local database (benchmarks/seed_bench_db.py):
+
+    python benchmarks/explain_hot_queries.py --output explain.json
+
+Rolls the schema back to version 2 (tables only: no dose key, lookup indexes,
+times_of_day array or partitions), explains every query, migrates to the
+latest version and explains them again. Each query reports the median execution time over
+``--repeat`` runs, the plan's top scan node and the buffers it touched.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import DB_CONFIG, get_connection
+from migrations import current_version, migrate, rollback
+from seed_bench_db import API_USER_ID
+
+BEFORE_VERSION = 2
+NORMALIZED_VERSION = 5
+
+
+def hot_queries(cur, version):
+    """(name, sql, params); the prescription check reads times_of_day once it exists"""
+    cur.execute("""
+                SELECT medicine_name, day, time_of_day, log_time FROM user_history
+                WHERE user_id = %s ORDER BY log_time DESC LIMIT 1 OFFSET 500
+                """, (API_USER_ID,))
+    medicine_name, day, time_of_day, log_time = cur.fetchone()
+    if version >= NORMALIZED_VERSION:
+        prescribed_filter = "%(time_of_day)s = ANY(times_of_day)"
+    else:
+        prescribed_filter = r"%(time_of_day)s = ANY(regexp_split_to_array(time_of_day, '\s*,\s*'))"
+    params = {"user_id": API_USER_ID, "medicine_name": medicine_name, "day": day,
+              "time_of_day": time_of_day, "log_time": log_time}
+    return [
+        ("history_first_page", """
+            SELECT log_time, medicine_name, medicine_dosage, day, time_of_day FROM user_history
+            WHERE user_id = %(user_id)s
+            ORDER BY log_time DESC, medicine_name DESC LIMIT 101""", params),
+        ("history_deep_page", """
+            SELECT log_time, medicine_name, medicine_dosage, day, time_of_day FROM user_history
+            WHERE user_id = %(user_id)s AND (log_time, medicine_name) < (%(log_time)s, %(medicine_name)s)
+            ORDER BY log_time DESC, medicine_name DESC LIMIT 101""", params),
+        ("dose_already_taken", """
+            SELECT EXISTS (SELECT 1 FROM user_history
+                WHERE user_id = %(user_id)s AND day = %(day)s
+                AND time_of_day = %(time_of_day)s AND medicine_name = %(medicine_name)s)""", params),
+        ("medicine_prescribed", f"""
+            SELECT EXISTS (SELECT 1 FROM prescription
+                WHERE user_id = %(user_id)s AND medicine_name = %(medicine_name)s
+                AND {prescribed_filter})""", params),
+        ("prescription_index_load", """
+            SELECT medicine_name, time_of_day FROM prescription WHERE user_id = %(user_id)s""", params),
+    ]
+
+
+def _scan_nodes(plan):
+    nodes = [plan["Node Type"] + (f" ({plan['Index Name']})" if "Index Name" in plan else "")]
+    for child in plan.get("Plans", []):
+        nodes.extend(_scan_nodes(child))
+    return [node for node in nodes if "Scan" in node]
+
+
+def explain_all(repeat):
+    results = {}
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("ANALYZE prescription; ANALYZE user_history")
+        for name, sql, params in hot_queries(cur, current_version()):
+            timings, plan = [], None
+            for _ in range(repeat):
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+                explained = cur.fetchone()[0][0]
+                timings.append(explained["Execution Time"])
+                plan = explained["Plan"]
+            results[name] = {
+                "execution_ms": round(statistics.median(timings), 3),
+                "scans": _scan_nodes(plan),
+                "shared_buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+            }
+        cur.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write before/after results as JSON here")
+    args = parser.parse_args()
+
+    if DB_CONFIG["host"] not in ("localhost", "127.0.0.1", "::1"):
+        sys.exit(f"refusing to roll back migrations on {DB_CONFIG['host']}; point DB_HOST at a local database")
+
+    migrate()
+    rollback(BEFORE_VERSION)
+    before = explain_all(args.repeat)
+    migrate()
+    after = explain_all(args.repeat)
+
+    for name in before:
+        print(f"{name:<25} {before[name]['execution_ms']:>10.3f}ms -> {after[name]['execution_ms']:>8.3f}ms  "
+              f"{', '.join(before[name]['scans'])} -> {', '.join(after[name]['scans'])}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"before": before, "after": after}, f, indent=2)
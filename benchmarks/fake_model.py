@@ -0,0 +1,109 @@
+"""Deterministic stand-in for ``google.generativeai.GenerativeModel``.
+
+    import fake_model                # from a script in benchmarks/
+    fake_model.install(latency=0.8)
+
+``install`` patches the genai module in place; the repo imports genai lazily,
+so anything that builds a model afterwards gets the fake. Answers are canned
+and depend only on the prompt (and image bytes), so runs are comparable.
+Every call sleeps ``latency`` seconds plus up to ``jitter`` seconds drawn
+from a seeded RNG, standing in for Gemini round-trip time.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+import google.generativeai as genai
+
+MEDICATIONS = [
+    "lisinopril", "metformin", "atorvastatin", "levothyroxine", "amlodipine",
+    "metoprolol", "omeprazole", "simvastatin", "losartan", "albuterol",
+    "gabapentin", "hydrochlorothiazide", "sertraline", "furosemide", "fluoxetine",
+    "pantoprazole", "prednisone", "escitalopram", "tramadol", "bupropion",
+]
+TIMES_OF_DAY = ["morning", "afternoon", "evening", "night"]
+
+_PAIR_LINE = re.compile(r"^\d+\. (.+) \+ (.+)$", re.MULTILINE)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    latency = 0.0
+    jitter = 0.0
+    unsafe_pairs = set()
+    calls = 0
+    _lock = threading.Lock()
+    _rng = random.Random(0)
+
+    def __init__(self, model_name, **kwargs):
+        self.model_name = model_name
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls.calls = 0
+
+    def _sleep(self):
+        with FakeGenerativeModel._lock:
+            FakeGenerativeModel.calls += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+
+    def generate_content(self, contents, generation_config=None, request_options=None):
+        self._sleep()
+        if isinstance(contents, str):
+            prompt, image = contents, b""
+        else:
+            prompt = str(contents[-1])
+            image = next((part["data"] for part in contents if isinstance(part, dict)), b"")
+        # The same image always "shows" the same medication
+        pick = int.from_bytes(hashlib.sha256(image).digest()[:4], "big")
+        medication = MEDICATIONS[pick % len(MEDICATIONS)]
+        structured = bool(generation_config) and generation_config.get("response_mime_type") == "application/json"
+
+        pairs = _PAIR_LINE.findall(prompt)
+        if pairs:
+            return FakeResponse(json.dumps({"results": [
+                {"drug_a": a, "drug_b": b, "safe": tuple(sorted((a, b))) not in self.unsafe_pairs}
+                for a, b in pairs]}))
+        if "is it safe to take them together" in prompt:
+            return FakeResponse("yes")
+
+        if "prescription" in prompt.lower():
+            medications = [MEDICATIONS[(pick + i) % len(MEDICATIONS)] for i in range(1 + pick % 4)]
+            times = [TIMES_OF_DAY[pick % len(TIMES_OF_DAY)]]
+            if structured:
+                return FakeResponse(json.dumps({"medications": [
+                    {"medication_name": name, "dosage": "10mg", "frequency_per_day": 1,
+                     "times_of_day": times} for name in medications]}))
+            if "[Medication_name]" in prompt:
+                return FakeResponse("\n".join(f"{name}, 10mg, 1, {times[0]}" for name in medications))
+
+        if structured:
+            return FakeResponse(json.dumps(
+                {"medicine_name": medication, "number_of_pills": 2, "medicine_dosage": "20"}))
+        if "Format: medication_name" in prompt:
+            # Text-only second call: echo the name the first call "read"
+            label = re.search(r"Extracted Text:\n(\w+)", prompt)
+            return FakeResponse(f"{label.group(1).lower() if label else medication}, 2, 20")
+        return FakeResponse(f"Extracted Text:\n{medication.upper()} 10MG\n\nVisible Pills Count:\n2")
+
+
+def install(latency=0.0, jitter=0.0, seed=0, unsafe_pairs=()):
+    """Route every genai model the repo creates to FakeGenerativeModel"""
+    FakeGenerativeModel.latency = latency
+    FakeGenerativeModel.jitter = jitter
+    FakeGenerativeModel.unsafe_pairs = {tuple(sorted(pair)) for pair in unsafe_pairs}
+    FakeGenerativeModel._rng = random.Random(seed)
+    FakeGenerativeModel.reset()
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = FakeGenerativeModel
+    return FakeGenerativeModel
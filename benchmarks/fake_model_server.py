@@ -0,0 +1,130 @@
+"""Local HTTP stand-in for the Gemini REST API (``models/*:generateContent``).
+
+    python benchmarks/fake_model_server.py --port 8090 --failure-rate 0.3
+    MODEL_API_ENDPOINT=http://127.0.0.1:8090 uvicorn main:app
+
+Answers come from fake_model.FakeGenerativeModel, so they match the
+in-process fake. On top of that the server can be slow (``latency``), throttle
+or fail a share of requests (``failure_rate`` with ``failure_status``, e.g.
+429 or 503), or be down entirely (``failure_rate=1``). It also counts
+requests and the highest number it served at once, so a client's rate limit
+and in-flight cap can be checked from the outside.
+"""
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fake_model import FakeGenerativeModel
+
+STATUS_NAMES = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED"}
+
+
+class FakeModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, failure_rate=0.0, failure_status=503, seed=0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.failures = 0
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self.request_times = []
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def _begin(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.request_times.append(time.monotonic())
+            fail = self._rng.random() < self.failure_rate
+            self.failures += fail
+        return fail
+
+    def _end(self):
+        with self._lock:
+            self.in_flight -= 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.split("?")[0].endswith(":generateContent"):
+            self._send_json(404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+            return
+        fail = self.server._begin()
+        try:
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            if fail:
+                status = self.server.failure_status
+                self._send_json(status, {"error": {"code": status, "message": "fake upstream failure",
+                                                   "status": STATUS_NAMES.get(status, "UNKNOWN")}})
+                return
+            contents = []
+            for content in request.get("contents", []):
+                for part in content.get("parts", []):
+                    if "inlineData" in part:
+                        contents.append({"mime_type": part["inlineData"]["mimeType"],
+                                         "data": base64.b64decode(part["inlineData"]["data"])})
+                    else:
+                        contents.append(part.get("text", ""))
+            generation_config = request.get("generationConfig") or {}
+            if generation_config.get("responseMimeType"):
+                generation_config = {"response_mime_type": generation_config["responseMimeType"]}
+            text = FakeGenerativeModel("fake").generate_content(contents, generation_config).text
+            self._send_json(200, {
+                "candidates": [{"content": {"parts": [{"text": text}], "role": "model"},
+                                "finishReason": "STOP", "index": 0}],
+                "usageMetadata": {"promptTokenCount": len(json.dumps(request)) // 4,
+                                  "candidatesTokenCount": len(text) // 4},
+            })
+        finally:
+            self.server._end()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per request")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--failure-status", type=int, default=503)
+    args = parser.parse_args()
+
+    server = FakeModelServer(args.port, args.latency, args.failure_rate, args.failure_status)
+    print(f"Fake model API on {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
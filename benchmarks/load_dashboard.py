@@ -0,0 +1,62 @@
+"""Hammer the dashboard endpoints with concurrent clients and report latency.
+
+Start the API first (python main.py), then:
+
+    python benchmarks/load_dashboard.py --clients 50 --requests 20
+"""
+import argparse
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_client(url, requests):
+    latencies, errors = [], 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                response.read()
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - start)
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/update-dashboard")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20, help="requests per client")
+    args = parser.parse_args()
+
+    url = args.base_url + args.endpoint
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as executor:
+        results = list(executor.map(lambda _: run_client(url, args.requests), range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [sample for samples, _ in results for sample in samples]
+    errors = sum(errors for _, errors in results)
+    if not latencies:
+        print(f"all {errors} requests failed")
+        return
+
+    print(f"{url}: {args.clients} clients x {args.requests} requests in {elapsed:.2f}s")
+    print(f"throughput={len(latencies) / elapsed:.1f} req/s errors={errors}")
+    print(f"p50={statistics.median(latencies) * 1000:.1f}ms "
+          f"p95={percentile(latencies, 95) * 1000:.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
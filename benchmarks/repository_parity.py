@@ -0,0 +1,158 @@
+"""Run the same storage scenarios against the Postgres and SQLite repositories.
+
+    DB_HOST=localhost DB_USER=postgres DB_PASSWORD=postgres python benchmarks/repository_parity.py
+
+Each scenario drives one backend through the repository interface
+(prescription upload, dose logging with its duplicate and not-prescribed
+outcomes, dashboard counts, keyset history pages, streaming, timezones)
+and records every result. The two result lists must match exactly; the
+script prints any difference and exits non-zero. Read calls are then
+repeated ``--repeat`` times to compare per-call latency.
+
+Postgres writes go to a throwaway user id that is deleted before and
+after the run; SQLite uses a temporary file.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import DB_CONFIG, get_connection
+from history_partitions import ensure_history_partitions
+from migrations import migrate
+from postgres_repository import PostgresRepository
+from sqlite_repository import SQLiteRepository
+from update_prescription import prescription_rows
+
+PARITY_USER_ID = 987_654_321
+# Every table a Postgres write can touch for one user
+USER_TABLES = ("prescription", "user_history", "prescription_medicines", "prescription_summary",
+               "daily_medicines_taken", "daily_medication_summary", "compliance_schedule",
+               "compliance_daily", "user_timezones")
+
+MEDICATIONS = [
+    {"medication_name": "Aspirin", "dosage": "81mg", "frequency_per_day": 2, "times_of_day": ["Morning", "night"]},
+    {"medication_name": "Ibuprofen", "dosage": "200mg", "frequency_per_day": 1, "times_of_day": ["afternoon"]},
+    {"medication_name": "Metformin", "dosage": "500mg", "frequency_per_day": 3,
+     "times_of_day": ["morning", "afternoon", "evening"]},
+]
+
+
+def delete_parity_user():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for table in USER_TABLES:
+            cur.execute(f"DELETE FROM {table} WHERE user_id = %s", (PARITY_USER_ID,))
+        cur.close()
+
+
+def scenarios(repo, user_id, today):
+    """Yield (step, result) pairs; both backends must produce the same sequence"""
+    yesterday = today - timedelta(days=1)
+    repo.add_prescriptions(prescription_rows(user_id, "2025-01-01 08:00:00", MEDICATIONS))
+    yield "active_prescription_count", repo.active_prescription_count(user_id)
+    yield "prescribed_times", sorted((name, sorted(times)) for name, times in repo.prescribed_times(user_id).items())
+
+    doses = [
+        ("08:00:00", yesterday, "Aspirin", "morning"),
+        ("08:05:00", yesterday, "Metformin", "morning"),
+        ("09:00:00", yesterday, "Aspirin", "morning"),     # already taken
+        ("13:00:00", yesterday, "Ibuprofen", "afternoon"),
+        ("13:30:00", yesterday, "Aspirin", "afternoon"),   # not prescribed then
+        ("23:00:00", yesterday, "Aspirin", "night"),
+        ("07:00:00", today, "Aspirin", "morning"),
+        ("07:00:00", today, "Metformin", "morning"),       # same log_time, ordered by name
+        ("12:00:00", today, "Tylenol", "afternoon"),       # not prescribed at all
+    ]
+    for clock, day, name, time_of_day in doses:
+        outcome = repo.log_medication(user_id, f"{day} {clock}", name, "1 pill", day, time_of_day)
+        yield f"log {name} {day} {time_of_day}", outcome
+
+    yield "dose_taken aspirin night", repo.dose_taken(user_id, yesterday, "night", "Aspirin")
+    yield "dose_taken ibuprofen today", repo.dose_taken(user_id, today, "afternoon", "Ibuprofen")
+    yield "medicines_taken_on yesterday", repo.medicines_taken_on(user_id, yesterday)
+    yield "medicines_taken_on today", repo.medicines_taken_on(user_id, today)
+
+    pages, after = [], None
+    while True:
+        page = repo.history_page(user_id, after=after, limit=2)
+        pages.append([tuple(row) for row in page])
+        if len(page) < 2:
+            break
+        after = (page[-1][0], page[-1][1])
+    yield "history pages of 2", pages
+    yield "history for yesterday", [tuple(row) for row in repo.history_page(
+        user_id, start_day=str(yesterday), end_day=str(yesterday), limit=100)]
+    yield "iter_history", [tuple(row) for row in repo.iter_history(user_id)]
+    yield "iter_history after cursor", [tuple(row) for row in repo.iter_history(
+        user_id, after=(f"{today} 07:00:00", "Metformin"))]
+
+    yield "timezone before", repo.get_timezone(user_id)
+    repo.set_timezone(user_id, "Europe/Berlin")
+    repo.set_timezone(user_id, "Asia/Tokyo")
+    yield "timezone after", repo.get_timezone(user_id)
+
+
+def time_reads(repo, user_id, today, repeat):
+    reads = {
+        "active_prescription_count": lambda: repo.active_prescription_count(user_id),
+        "medicines_taken_on": lambda: repo.medicines_taken_on(user_id, today),
+        "prescribed_times": lambda: repo.prescribed_times(user_id),
+        "dose_taken": lambda: repo.dose_taken(user_id, today, "morning", "Aspirin"),
+        "history_page": lambda: repo.history_page(user_id, limit=100),
+    }
+    timings = {}
+    for name, read in reads.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            read()
+            samples.append(time.perf_counter() - start)
+        timings[name] = statistics.median(samples) * 1e6
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="timed calls per read")
+    parser.add_argument("--allow-remote", action="store_true")
+    args = parser.parse_args()
+
+    if DB_CONFIG["host"] not in ("localhost", "127.0.0.1", "::1") and not args.allow_remote:
+        sys.exit(f"refusing to write test rows to {DB_CONFIG['host']}; point DB_HOST at a local database")
+
+    today = date.today()
+    migrate()
+    ensure_history_partitions(from_day=today - timedelta(days=1))
+    delete_parity_user()
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = [PostgresRepository(), SQLiteRepository(os.path.join(tmp, "parity.db"))]
+        try:
+            results = {repo.name: list(scenarios(repo, PARITY_USER_ID, today)) for repo in backends}
+            timings = {repo.name: time_reads(repo, PARITY_USER_ID, today, args.repeat) for repo in backends}
+        finally:
+            delete_parity_user()
+            backends[1].close()
+
+    postgres, sqlite = results["postgres"], results["sqlite"]
+    mismatches = 0
+    for (step, expected), (_, actual) in zip(postgres, sqlite):
+        same = expected == actual
+        mismatches += not same
+        print(f"{'ok' if same else 'DIFF':<5} {step}")
+        if not same:
+            print(f"      postgres: {expected}\n      sqlite:   {actual}")
+    if len(postgres) != len(sqlite):
+        mismatches += 1
+        print(f"DIFF  step count: postgres {len(postgres)}, sqlite {len(sqlite)}")
+
+    print(f"\n{'median per call (us)':<28}{'postgres':>10}{'sqlite':>10}")
+    for name in timings["postgres"]:
+        print(f"{name:<28}{timings['postgres'][name]:>10.1f}{timings['sqlite'][name]:>10.1f}")
+
+    sys.exit(1 if mismatches else 0)
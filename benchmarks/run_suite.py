@@ -0,0 +1,291 @@
+"""Offline end-to-end benchmarks: fake Gemini model, local Postgres or SQLite.
+
+Seed first (benchmarks/seed_bench_db.py, with the same STORAGE_BACKEND), then:
+
+    python benchmarks/run_suite.py --output results.json
+    python benchmarks/run_suite.py --output new.json --compare results.json
+    STORAGE_BACKEND=sqlite SQLITE_DB_PATH=/tmp/bench.db python benchmarks/run_suite.py
+
+Scenarios run the real code paths in-process; only the model is faked
+(fake_model.py, MODEL_LATENCY seconds per call). The API scenarios go through
+the FastAPI app over an in-memory ASGI transport, so routing, validation and
+serialization are included but no socket is. Each scenario reports
+throughput and p50/p95/p99 latency; the JSON written by ``--output`` is what
+``--compare`` reads back.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+WORKDIR = tempfile.mkdtemp(prefix="bench_suite_")
+os.environ.setdefault("EXTRACTION_CACHE_PATH", os.path.join(WORKDIR, "extraction_cache.db"))
+# The fake model has no quota; measure the code, not model_client's rate limit, unless asked to
+os.environ.setdefault("MODEL_RATE_PER_SECOND", "1000")
+os.environ.setdefault("MODEL_BURST", "1000")
+
+from fake_model import install
+from load_dashboard import percentile
+from seed_bench_db import API_USER_ID
+
+MODEL_LATENCY = float(os.getenv("MODEL_LATENCY", "0.5"))
+FakeModel = install(latency=MODEL_LATENCY, jitter=float(os.getenv("MODEL_JITTER", "0.1")))
+
+import cv2  # noqa: E402
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+
+from db import DB_CONFIG, get_connection  # noqa: E402
+from main import app  # noqa: E402
+from repository import STORAGE_BACKEND  # noqa: E402
+from sqlite_repository import SQLITE_DB_PATH  # noqa: E402
+from update_prescription import upload_data_to_prescription  # noqa: E402
+from update_user_history import upload_data_to_user_history  # noqa: E402
+
+SCENARIOS = ["log_medication", "prescription_upload", "update_dashboard", "history_page", "history_stream"]
+# Metrics where a larger value is a regression
+LOWER_IS_BETTER = ["p50_ms", "p95_ms", "p99_ms"]
+
+
+def synthetic_photo(path, index):
+    """A distinct pill photo per call, so the extraction cache never hits"""
+    rng = np.random.default_rng(index)
+    image = np.full((720, 960, 3), 200, np.uint8)
+    image += rng.integers(0, 12, image.shape, dtype=np.uint8)
+    for _ in range(int(rng.integers(1, 6))):
+        center = (int(rng.integers(80, 880)), int(rng.integers(80, 640)))
+        cv2.circle(image, center, 30, (60, 60, 160), -1)
+    cv2.imwrite(path, image)
+    return path
+
+
+def summarize(latencies, elapsed, concurrency, errors=0, **extra):
+    result = {"requests": len(latencies) + errors, "errors": errors, "concurrency": concurrency,
+              "elapsed_s": round(elapsed, 3)}
+    if latencies:
+        result.update({
+            "throughput_rps": round(len(latencies) / elapsed, 2),
+            "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(max(latencies) * 1000, 2),
+        })
+    result.update(extra)
+    return result
+
+
+def run_threaded(func, jobs, concurrency):
+    """Call ``func(job)`` for every job on a thread pool; (latencies, results, elapsed)"""
+    def timed(job):
+        start = time.perf_counter()
+        result = func(job)
+        return time.perf_counter() - start, result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        timings = list(executor.map(timed, jobs))
+    return [t for t, _ in timings], [r for _, r in timings], time.perf_counter() - start
+
+
+def query(sql, params=()):
+    """Rows from the configured store; ``sql`` uses ? placeholders"""
+    if STORAGE_BACKEND == "sqlite":
+        with sqlite3.connect(SQLITE_DB_PATH) as conn:
+            return conn.execute(sql, params).fetchall()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(sql.replace("?", "%s"), params)
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+
+def sample_user_ids(count):
+    user_ids = [row[0] for row in query(
+        "SELECT DISTINCT user_id FROM prescription ORDER BY user_id LIMIT ?", (count,))]
+    if not user_ids:
+        sys.exit("no prescriptions found; run benchmarks/seed_bench_db.py first")
+    return user_ids
+
+
+def bench_log_medication(iterations, concurrency):
+    # Half the logs go to the API user, who is prescribed everything, so the write path is exercised
+    user_ids = sample_user_ids(1000)
+    jobs = [(synthetic_photo(os.path.join(WORKDIR, f"med_{i}.png"), i),
+             API_USER_ID if i % 2 == 0 else user_ids[i % len(user_ids)])
+            for i in range(iterations)]
+    FakeModel.reset()
+    latencies, results, elapsed = run_threaded(
+        lambda job: upload_data_to_user_history(*job), jobs, concurrency)
+    outcomes = {}
+    for result in results:
+        outcome = "OK" if result["success"] else result["error_type"]
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    # NOT_PRESCRIBED / ALREADY_TAKEN are normal answers; only crashes count as errors
+    failed = [not result["success"] and result["error_type"] in ("DATABASE_ERROR", "MODEL_UNAVAILABLE", "UNKNOWN_ERROR")
+              for result in results]
+    latencies = [t for t, is_error in zip(latencies, failed) if not is_error]
+    return summarize(latencies, elapsed, concurrency, sum(failed),
+                     model_calls=FakeModel.calls, outcomes=outcomes)
+
+
+def bench_prescription_upload(iterations, concurrency):
+    user_ids = sample_user_ids(1000)
+    jobs = [(synthetic_photo(os.path.join(WORKDIR, f"rx_{i}.png"), 1_000_000 + i), user_ids[i % len(user_ids)])
+            for i in range(iterations)]
+    FakeModel.reset()
+    latencies, _, elapsed = run_threaded(lambda job: upload_data_to_prescription(*job), jobs, concurrency)
+    return summarize(latencies, elapsed, concurrency, model_calls=FakeModel.calls)
+
+
+async def _bench_http(paths, concurrency, consume):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        async def one(path):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path)
+                if response.status_code != 200:
+                    errors += 1
+                    return
+                await consume(client, response)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(path) for path in paths))
+        return latencies, errors, time.perf_counter() - start
+
+
+async def _ignore(client, response):
+    return None
+
+
+def bench_update_dashboard(iterations, concurrency):
+    latencies, errors, elapsed = asyncio.run(
+        _bench_http(["/update-dashboard"] * iterations, concurrency, _ignore))
+    return summarize(latencies, elapsed, concurrency, errors)
+
+
+def bench_history_page(iterations, concurrency, pages=10, limit=100):
+    """Walk ``pages`` pages deep per request, timing the whole walk"""
+    async def follow(client, response):
+        for _ in range(pages - 1):
+            next_cursor = response.json()["next_cursor"]
+            if not next_cursor:
+                return
+            response = await client.get("/user-history", params={"limit": limit, "cursor": next_cursor})
+
+    latencies, errors, elapsed = asyncio.run(
+        _bench_http([f"/user-history?limit={limit}"] * iterations, concurrency, follow))
+    return summarize(latencies, elapsed, concurrency, errors, pages_per_request=pages, page_size=limit)
+
+
+def bench_history_stream(iterations, concurrency, days=30):
+    rows = []
+
+    async def count_rows(client, response):
+        rows.append(response.text.count("\n"))
+
+    path = f"/user-history?stream=true&start_day={(datetime.now() - timedelta(days=days)).date().isoformat()}"
+    latencies, errors, elapsed = asyncio.run(_bench_http([path] * iterations, concurrency, count_rows))
+    return summarize(latencies, elapsed, concurrency, errors, days=days,
+                     rows_per_request=round(statistics.mean(rows)) if rows else 0)
+
+
+BENCHES = {
+    "log_medication": bench_log_medication,
+    "prescription_upload": bench_prescription_upload,
+    "update_dashboard": bench_update_dashboard,
+    "history_page": bench_history_page,
+    "history_stream": bench_history_stream,
+}
+
+
+def git_revision():
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def table_counts():
+    return {table: query(f"SELECT COUNT(*) FROM {table}")[0][0] for table in ("prescription", "user_history")}
+
+
+def compare(current, baseline_path, fail_over):
+    """Print per-metric change against a previous run; True if any regressed past ``fail_over`` %"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressed = False
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('git_revision')}):")
+    for name, result in current["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if not old:
+            continue
+        for metric in LOWER_IS_BETTER + ["throughput_rps"]:
+            if metric not in result or not old.get(metric):
+                continue
+            change = (result[metric] - old[metric]) / old[metric] * 100
+            worse = change > fail_over if metric in LOWER_IS_BETTER else change < -fail_over
+            regressed |= worse
+            print(f"  {name:<20} {metric:<15} {old[metric]:>10} -> {result[metric]:>10} "
+                  f"({change:+6.1f}%){'  REGRESSION' if worse else ''}")
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark suite")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--iterations", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--output", help="write results as JSON here")
+    parser.add_argument("--compare", help="earlier --output file to diff against")
+    parser.add_argument("--fail-over", type=float, default=10.0,
+                        help="with --compare, exit 1 if a metric regresses by more than this %%")
+    args = parser.parse_args()
+
+    if STORAGE_BACKEND == "postgres" and DB_CONFIG["host"] not in ("localhost", "127.0.0.1", "::1"):
+        sys.exit(f"refusing to benchmark against {DB_CONFIG['host']}; point DB_HOST at a local database")
+
+    results = {
+        "meta": {
+            "git_revision": git_revision(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "storage_backend": STORAGE_BACKEND,
+            "model_latency_s": MODEL_LATENCY,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "rows": table_counts(),
+        },
+        "scenarios": {},
+    }
+    for name in args.scenarios:
+        results["scenarios"][name] = BENCHES[name](args.iterations, args.concurrency)
+        scenario = results["scenarios"][name]
+        print(f"{name:<20} {scenario.get('throughput_rps', 0):8.1f} req/s  "
+              f"p50={scenario.get('p50_ms', 0):8.1f}ms p95={scenario.get('p95_ms', 0):8.1f}ms "
+              f"p99={scenario.get('p99_ms', 0):8.1f}ms errors={scenario['errors']}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.compare and compare(results, args.compare, args.fail_over):
+        sys.exit(1)
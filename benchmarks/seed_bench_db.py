@@ -0,0 +1,185 @@
+"""Seed the configured store with synthetic users for the offline benchmark suite.
+
+    DB_HOST=localhost DB_USER=postgres DB_PASSWORD=postgres \\
+        python benchmarks/seed_bench_db.py --users 10000 --history-rows 1000000 --reset
+    STORAGE_BACKEND=sqlite SQLITE_DB_PATH=/tmp/bench.db \\
+        python benchmarks/seed_bench_db.py --users 10000 --history-rows 1000000 --reset
+
+Postgres: the schema is migrated first (migrations.py), rows are loaded with
+COPY, then the dashboard summaries and compliance rollups are rebuilt.
+SQLite: prescriptions go through the repository, history rows are inserted
+in one transaction (SQLite keeps no rollups). User 123 (the user the API serves) gets
+``--heavy-user-rows`` of the history so dashboard and history numbers
+reflect a long-lived account. Refuses to touch a non-local database unless
+``--allow-remote`` is given.
+"""
+import argparse
+import io
+import os
+import sqlite3
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytz
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import DB_CONFIG
+from fake_model import MEDICATIONS, TIMES_OF_DAY
+from repository import STORAGE_BACKEND
+from user_timezones import DEFAULT_TIMEZONE, get_time_of_day
+
+API_USER_ID = 123
+COPY_CHUNK_ROWS = 200_000
+
+
+def _copy(cur, table, columns, rows):
+    """COPY ``rows`` into ``table`` in chunks; returns the row count"""
+    count = 0
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(str(value) for value in row) + "\n")
+        count += 1
+        if count % COPY_CHUNK_ROWS == 0:
+            buffer.seek(0)
+            cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+            buffer = io.StringIO()
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+    return count
+
+
+def synthetic_prescriptions(rng, user_ids):
+    """{user_id: [(medicine_name, times)]}; the API user is prescribed everything at every time"""
+    plans = {}
+    for user_id in user_ids:
+        if user_id == API_USER_ID:
+            plans[user_id] = [(name, TIMES_OF_DAY) for name in MEDICATIONS]
+            continue
+        medications = rng.sample(MEDICATIONS, rng.randint(2, 6))
+        plans[user_id] = [(name, sorted(rng.sample(TIMES_OF_DAY, rng.randint(1, 3)), key=TIMES_OF_DAY.index))
+                          for name in medications]
+    return plans
+
+
+def synthetic_history(rng, plans, total_rows, heavy_user_rows, days):
+    # log_time in UTC, day and time of day local, as the API stamps them
+    now = datetime.now(pytz.utc).replace(microsecond=0)
+    tz = pytz.timezone(DEFAULT_TIMEZONE)
+    others = [user_id for user_id in plans if user_id != API_USER_ID]
+    seen = set()  # user_history allows one log per user, day, time of day and medicine
+    i = 0
+    while i < total_rows:
+        user_id = API_USER_ID if i < heavy_user_rows or not others else rng.choice(others)
+        name, _ = rng.choice(plans[user_id])
+        log_time = now - timedelta(seconds=rng.randrange(days * 86400))
+        local = log_time.astimezone(tz)
+        key = (user_id, local.date(), get_time_of_day(local), name)
+        if key in seen:
+            continue
+        seen.add(key)
+        i += 1
+        yield (user_id, log_time.replace(tzinfo=None), name, f"{rng.choice((10, 20, 40))}", key[1], key[2])
+
+
+def _load_postgres(plans, history, upload_time, reset):
+    from compliance import rebuild_rollups
+    from dashboard_summary import rebuild_summaries
+    from db import get_connection
+    from history_partitions import ensure_history_partitions
+    from migrations import migrate
+
+    migrate()
+    ensure_history_partitions(from_day=upload_time.date() - timedelta(days=1))
+    with get_connection() as conn:
+        cur = conn.cursor()
+        if reset:
+            cur.execute("TRUNCATE prescription, user_history")
+        prescription_count = _copy(cur, "prescription", (
+            "user_id", "upload_time", "medicine_name", "medicine_dosage", "num_of_times_per_day", "time_of_day",
+            "times_of_day"), (
+            (user_id, upload_time, name, "10mg", len(times), ", ".join(times), "{" + ",".join(times) + "}")
+            for user_id, plan in plans.items() for name, times in plan))
+        history_count = _copy(cur, "user_history", (
+            "user_id", "log_time", "medicine_name", "medicine_dosage", "day", "time_of_day"),
+            history)
+        cur.close()
+    loaded = time.perf_counter()
+
+    rebuild_summaries()
+    rebuild_rollups()
+    with get_connection() as conn:
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute("ANALYZE")
+        cur.close()
+        conn.autocommit = False
+    return prescription_count, history_count, loaded
+
+
+def _load_sqlite(plans, history, upload_time, reset):
+    from sqlite_repository import SQLITE_DB_PATH, SQLiteRepository
+
+    repo = SQLiteRepository(SQLITE_DB_PATH)  # creates the schema
+    if reset:
+        repo.close()
+        with sqlite3.connect(SQLITE_DB_PATH) as conn:
+            conn.execute("DELETE FROM prescription")
+            conn.execute("DELETE FROM user_history")
+        repo = SQLiteRepository(SQLITE_DB_PATH)
+    rows = [(user_id, upload_time, name, "10mg", len(times), ", ".join(times), times)
+            for user_id, plan in plans.items() for name, times in plan]
+    repo.add_prescriptions(rows)
+    repo.close()
+
+    with sqlite3.connect(SQLITE_DB_PATH) as conn:
+        history_count = conn.executemany(
+            "INSERT INTO user_history (user_id, log_time, medicine_name, medicine_dosage, day, time_of_day) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((user_id, str(log_time), name, dosage, str(day), time_of_day)
+             for user_id, log_time, name, dosage, day, time_of_day in history)).rowcount
+    loaded = time.perf_counter()
+    with sqlite3.connect(SQLITE_DB_PATH) as conn:
+        conn.execute("ANALYZE")
+    return len(rows), history_count, loaded
+
+
+def seed(users, history_rows, heavy_user_rows, days, reset, seed_value=0):
+    rng = random.Random(seed_value)
+    # Keep well under the API user's distinct (day, time of day, medicine) slots
+    heavy_user_rows = min(heavy_user_rows, days * len(TIMES_OF_DAY) * len(MEDICATIONS) // 2)
+    user_ids = sorted(set(range(1, users + 1)) | {API_USER_ID})
+    upload_time = datetime.now().replace(microsecond=0) - timedelta(days=days)
+    plans = synthetic_prescriptions(rng, user_ids)
+    history = synthetic_history(rng, plans, history_rows, min(heavy_user_rows, history_rows), days)
+    started = time.perf_counter()
+
+    load = _load_sqlite if STORAGE_BACKEND == "sqlite" else _load_postgres
+    prescription_count, history_count, loaded = load(plans, history, upload_time, reset)
+    return {
+        "storage_backend": STORAGE_BACKEND,
+        "users": len(user_ids),
+        "prescription_rows": prescription_count,
+        "history_rows": history_count,
+        "load_seconds": round(loaded - started, 2),
+        "rebuild_seconds": round(time.perf_counter() - loaded, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed a local database for benchmarks/run_suite.py")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--history-rows", type=int, default=1_000_000)
+    parser.add_argument("--heavy-user-rows", type=int, default=10_000,
+                        help=f"history rows given to user {API_USER_ID}")
+    parser.add_argument("--days", type=int, default=365, help="history spread over this many days")
+    parser.add_argument("--reset", action="store_true", help="truncate the base tables first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--allow-remote", action="store_true")
+    args = parser.parse_args()
+
+    if STORAGE_BACKEND == "postgres" and DB_CONFIG["host"] not in ("localhost", "127.0.0.1", "::1") and not args.allow_remote:
+        sys.exit(f"refusing to seed {DB_CONFIG['host']}; point DB_HOST at a local database")
+    print(seed(args.users, args.history_rows, args.heavy_user_rows, args.days, args.reset, args.seed))
@@ -0,0 +1,198 @@
+"""Bulk prescription ingest for onboarding a clinic.
+
+    python bulk_ingest.py scans/ --user-id 123
+    python bulk_ingest.py scans/ --user-from-parent-dir   # scans/<user_id>/*.png
+
+Extraction runs on a bounded thread pool; finished files are written to
+the repository (repository.py) in batched transactions. Progress is
+appended to a checkpoint file, so a crashed run can be restarted with the
+same command: written files are skipped, and files that were extracted but
+not yet written are inserted without calling the model again. Files that
+fail (no usable user id, extraction error) are recorded as failed and
+tried again on the next run.
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from dashboard_events import notify_dashboard_changed
+from prescription_index import prescription_index
+from repository import get_repository
+from text_extractor import extract_prescription
+from update_prescription import prescription_rows
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".tif", ".tiff")
+DEFAULT_CONCURRENCY = 4
+DEFAULT_BATCH_SIZE = 50
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IngestCheckpoint:
+    """Append-only JSONL log of per-file progress.
+
+    Each file is tracked by path and content hash, so an edited file is
+    picked up again on the next run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.extracted = {}
+        self.written = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash
+                    key = (entry["path"], entry["sha256"])
+                    if entry["status"] == "extracted":
+                        self.extracted[key] = entry["medications"]
+                    elif entry["status"] == "written":
+                        self.written.add(key)
+        self._file = open(path, "a")
+
+    def _append(self, entries):
+        for entry in entries:
+            self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record_extracted(self, path, sha256, medications):
+        self.extracted[(path, sha256)] = medications
+        self._append([{"path": path, "sha256": sha256, "status": "extracted",
+                       "medications": medications}])
+
+    def record_failed(self, path, sha256, error):
+        self._append([{"path": path, "sha256": sha256, "status": "failed", "error": error}])
+
+    def record_written(self, keys):
+        self.written.update(keys)
+        self._append([{"path": path, "sha256": sha256, "status": "written"}
+                      for path, sha256 in keys])
+
+    def close(self):
+        self._file.close()
+
+
+def find_images(directory):
+    return sorted(
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(directory)
+        for name in names if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def _user_for(path, user_id, user_from_parent_dir):
+    """The file's user; raises ValueError when its parent directory isn't a user id"""
+    if user_from_parent_dir:
+        parent = os.path.basename(os.path.dirname(path))
+        try:
+            return int(parent)
+        except ValueError:
+            raise ValueError(f"parent directory {parent!r} is not a user id")
+    return user_id
+
+
+def _write_batch(batch, checkpoint):
+    """Insert one batch of extracted files in a single transaction"""
+    upload_time = datetime.now()
+    rows = []
+    for (path, sha256), user_id, medications in batch:
+        rows.extend(prescription_rows(user_id, upload_time, medications))
+
+    get_repository().add_prescriptions(rows)
+
+    checkpoint.record_written([key for key, _, _ in batch])
+    for user_id in {user_id for _, user_id, _ in batch}:
+        prescription_index.invalidate(user_id)
+        notify_dashboard_changed(user_id)
+    return len(rows)
+
+
+def ingest_directory(directory, user_id=123, user_from_parent_dir=False,
+                     concurrency=DEFAULT_CONCURRENCY, batch_size=DEFAULT_BATCH_SIZE,
+                     checkpoint_path=None):
+    checkpoint = IngestCheckpoint(checkpoint_path or os.path.join(directory, ".ingest_checkpoint.jsonl"))
+    stats = {"files": 0, "skipped": 0, "resumed": 0, "extracted": 0, "failed": 0, "rows": 0}
+    pending = []
+    batch = []
+
+    def flush():
+        if batch:
+            stats["rows"] += _write_batch(batch, checkpoint)
+            batch.clear()
+
+    def fail(path, sha256, error):
+        stats["failed"] += 1
+        checkpoint.record_failed(path, sha256, str(error))
+        print(f"Failed to ingest {path}: {error}")
+
+    try:
+        for path in find_images(directory):
+            stats["files"] += 1
+            key = (path, file_sha256(path))
+            if key in checkpoint.written:
+                stats["skipped"] += 1
+                continue
+            # Checked before extraction so a misplaced file costs no model call
+            try:
+                file_user = _user_for(path, user_id, user_from_parent_dir)
+            except ValueError as e:
+                fail(*key, e)
+                continue
+            if key in checkpoint.extracted:
+                stats["resumed"] += 1
+                batch.append((key, file_user, checkpoint.extracted[key]))
+                if len(batch) >= batch_size:
+                    flush()
+            else:
+                pending.append((key, file_user))
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(extract_prescription, key[0]): (key, file_user)
+                       for key, file_user in pending}
+            for future in as_completed(futures):
+                (path, sha256), file_user = futures[future]
+                try:
+                    medications = json.loads(future.result())
+                except Exception as e:
+                    fail(path, sha256, e)
+                    continue
+                stats["extracted"] += 1
+                checkpoint.record_extracted(path, sha256, medications)
+                batch.append(((path, sha256), file_user, medications))
+                if len(batch) >= batch_size:
+                    flush()
+        flush()
+    finally:
+        checkpoint.close()
+
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory of scanned prescriptions")
+    parser.add_argument("directory")
+    parser.add_argument("--user-id", type=int, default=123, help="user the prescriptions belong to")
+    parser.add_argument("--user-from-parent-dir", action="store_true",
+                        help="take the user id from each file's parent directory name")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="extractions in flight at once")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="files written per transaction")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <directory>/.ingest_checkpoint.jsonl)")
+    args = parser.parse_args()
+
+    print(ingest_directory(args.directory, args.user_id, args.user_from_parent_dir,
+                           args.concurrency, args.batch_size, args.checkpoint))
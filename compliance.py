@@ -0,0 +1,217 @@
+"""Daily compliance rollups.
+
+Two small tables stand in for scanning a user's whole ``user_history``:
+
+* ``compliance_schedule`` - one row per (user, medicine): doses expected per
+  day and the first day the prescription applies.
+* ``compliance_daily`` - one row per (user, day, medicine): doses logged.
+
+Expected doses for a window are arithmetic on the schedule, taken doses are
+a range read on the daily rollup, so a 7/30/90 day query touches at most
+``days x medicines`` rows no matter how long the history is.
+
+Run ``python compliance.py rebuild`` to create and backfill the tables.
+"""
+import argparse
+from datetime import timedelta
+
+from psycopg2.extras import execute_batch
+
+from db import execute_prepared, get_connection
+from metrics import db_query
+from user_timezones import local_today
+
+COMPLIANCE_TABLES_DDL = """
+    CREATE TABLE IF NOT EXISTS compliance_schedule (
+        user_id INT NOT NULL,
+        medicine_name VARCHAR NOT NULL,
+        doses_per_day INT NOT NULL,
+        start_day DATE NOT NULL,
+        PRIMARY KEY (user_id, medicine_name)
+    );
+    CREATE TABLE IF NOT EXISTS compliance_daily (
+        user_id INT NOT NULL,
+        day DATE NOT NULL,
+        medicine_name VARCHAR NOT NULL,
+        taken_doses INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day, medicine_name)
+    );
+"""
+
+
+def ensure_compliance_tables(cur):
+    cur.execute(COMPLIANCE_TABLES_DDL)
+
+
+# A prescribed medicine is expected at least once a day even when the
+# extractor couldn't read a frequency (it stores 0 in that case)
+RECORD_SCHEDULE_SQL = """
+    INSERT INTO compliance_schedule (user_id, medicine_name, doses_per_day, start_day)
+    VALUES (%s, %s, GREATEST(%s, 1), %s::date)
+    ON CONFLICT (user_id, medicine_name) DO UPDATE
+    SET doses_per_day = GREATEST(compliance_schedule.doses_per_day, EXCLUDED.doses_per_day),
+        start_day = LEAST(compliance_schedule.start_day, EXCLUDED.start_day)
+"""
+
+
+def record_schedule(cur, user_id, medicine_name, num_of_times_per_day, upload_time):
+    cur.execute(RECORD_SCHEDULE_SQL, (user_id, medicine_name, num_of_times_per_day, upload_time))
+
+
+def record_schedules(cur, rows):
+    """Batch form of record_schedule for (user_id, medicine_name, times_per_day, upload_time) rows"""
+    execute_batch(cur, RECORD_SCHEDULE_SQL, rows)
+
+
+RECORD_DOSE_TAKEN_SQL = """
+    INSERT INTO compliance_daily (user_id, day, medicine_name, taken_doses)
+    VALUES ($1::int, $2::date, $3::varchar, 1)
+    ON CONFLICT (user_id, day, medicine_name) DO UPDATE
+    SET taken_doses = compliance_daily.taken_doses + 1
+"""
+
+
+def record_dose_taken(cur, user_id, day, medicine_name):
+    execute_prepared(cur, "record_dose_taken", RECORD_DOSE_TAKEN_SQL, (user_id, day, medicine_name))
+
+
+def _window(cur, user_id, days, end_day):
+    if days is not None:
+        return end_day - timedelta(days=days - 1), end_day
+    cur.execute("SELECT MIN(start_day) FROM compliance_schedule WHERE user_id = %s", (user_id,))
+    start_day = cur.fetchone()[0]
+    return (start_day or end_day), end_day
+
+
+@db_query("compliance")
+def get_compliance(user_id, days=None, medicine_name=None, end_day=None):
+    """Expected vs. taken doses over the last ``days`` days (all time if None).
+
+    Doses logged above the prescribed count for a day are not counted, so the
+    rate never exceeds 1.
+    """
+    medicine_filter = "" if medicine_name is None else "AND medicine_name = %(medicine_name)s"
+    # Before checking out a connection: a timezone cache miss borrows one of its own
+    end_day = end_day or local_today(user_id)
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        start_day, end_day = _window(cur, user_id, days, end_day)
+        cur.execute(f"""
+                    WITH schedule AS (
+                        SELECT medicine_name, doses_per_day,
+                               GREATEST(start_day, %(start_day)s) AS from_day
+                        FROM compliance_schedule
+                        WHERE user_id = %(user_id)s AND start_day <= %(end_day)s
+                        {medicine_filter}
+                    ),
+                    taken AS (
+                        SELECT d.medicine_name,
+                               SUM(LEAST(d.taken_doses, s.doses_per_day)) AS taken_doses
+                        FROM compliance_daily d
+                        JOIN schedule s USING (medicine_name)
+                        WHERE d.user_id = %(user_id)s
+                        AND d.day BETWEEN s.from_day AND %(end_day)s
+                        GROUP BY d.medicine_name
+                    )
+                    SELECT COALESCE(SUM(s.doses_per_day * (%(end_day)s::date - s.from_day + 1)), 0),
+                           COALESCE(SUM(t.taken_doses), 0)
+                    FROM schedule s
+                    LEFT JOIN taken t USING (medicine_name)
+                    """, {"user_id": user_id, "start_day": start_day, "end_day": end_day,
+                          "medicine_name": medicine_name})
+        expected_doses, taken_doses = cur.fetchone()
+        cur.close()
+
+    return {
+        "start_day": start_day,
+        "end_day": end_day,
+        "expected_doses": int(expected_doses),
+        "taken_doses": int(taken_doses),
+        "compliance_rate": float(taken_doses) / expected_doses if expected_doses else 0.0,
+    }
+
+
+@db_query("compliance_trend")
+def get_compliance_trend(user_id, days=30, medicine_name=None, end_day=None):
+    """Per-day expected/taken/rate for the last ``days`` days, oldest first"""
+    medicine_filter = "" if medicine_name is None else "AND s.medicine_name = %(medicine_name)s"
+    end_day = end_day or local_today(user_id)
+    start_day = end_day - timedelta(days=days - 1)
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+                    SELECT days.day,
+                           COALESCE(SUM(s.doses_per_day), 0),
+                           -- LEAST skips NULLs: a medicine with no log that day must count 0, not its full dose
+                           COALESCE(SUM(LEAST(COALESCE(d.taken_doses, 0), s.doses_per_day)), 0)
+                    FROM generate_series(%(start_day)s::date, %(end_day)s::date, interval '1 day') AS days(day)
+                    LEFT JOIN compliance_schedule s
+                        ON s.user_id = %(user_id)s AND s.start_day <= days.day
+                        {medicine_filter}
+                    LEFT JOIN compliance_daily d
+                        ON d.user_id = %(user_id)s AND d.day = days.day
+                        AND d.medicine_name = s.medicine_name
+                    GROUP BY days.day
+                    ORDER BY days.day
+                    """, {"user_id": user_id, "start_day": start_day, "end_day": end_day,
+                          "medicine_name": medicine_name})
+        rows = cur.fetchall()
+        cur.close()
+
+    return [
+        {
+            "day": day.strftime('%Y-%m-%d'),
+            "expected_doses": int(expected),
+            "taken_doses": int(taken),
+            "compliance_rate": float(taken) / expected if expected else 0.0,
+        }
+        for day, expected, taken in rows
+    ]
+
+
+def rebuild_rollups(user_ids=None):
+    """Recompute rollups for many users at once with set-based statements.
+
+    One GROUP BY pass over user_history/prescription per table instead of a
+    per-user loop; meant for after a backfill or bulk import.
+    """
+    user_filter = "" if not user_ids else "WHERE user_id = ANY(%(user_ids)s)"
+    params = {"user_ids": list(user_ids or [])}
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        ensure_compliance_tables(cur)
+        cur.execute("LOCK TABLE prescription, user_history IN SHARE MODE")
+
+        cur.execute(f"DELETE FROM compliance_schedule {user_filter}", params)
+        cur.execute(f"""
+                    INSERT INTO compliance_schedule (user_id, medicine_name, doses_per_day, start_day)
+                    SELECT user_id, medicine_name,
+                           GREATEST(MAX(num_of_times_per_day), 1),
+                           MIN(upload_time)::date
+                    FROM prescription {user_filter}
+                    GROUP BY user_id, medicine_name
+                    """, params)
+
+        cur.execute(f"DELETE FROM compliance_daily {user_filter}", params)
+        cur.execute(f"""
+                    INSERT INTO compliance_daily (user_id, day, medicine_name, taken_doses)
+                    SELECT user_id, day, medicine_name, COUNT(*)
+                    FROM user_history {user_filter}
+                    GROUP BY user_id, day, medicine_name
+                    """, params)
+        cur.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the compliance rollup tables")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    rebuild = subcommands.add_parser("rebuild", help="create the tables and backfill them from the raw tables")
+    rebuild.add_argument("--user-id", type=int, nargs="*", help="only rebuild these users")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        rebuild_rollups(args.user_id)
+        print("Compliance rollups rebuilt")
@@ -0,0 +1,100 @@
+"""Push dashboard changes to connected clients (the API's /dashboard/events stream).
+
+Writers call ``notify_dashboard_changed(user_id)`` after committing a
+medication log or prescription, the same place they invalidate the
+prescription index. If nobody is watching that user the call returns
+immediately; otherwise the dashboard numbers are read once (two summary
+lookups) and handed to every subscriber of that user. Each stream then
+sends only the fields that changed since its last event.
+
+The bus is in-process. Writes made by other processes (bulk_ingest.py,
+CLI uploads) still bump the user's stored version, which each open stream
+checks whenever it is idle, so they arrive within one keepalive interval.
+"""
+import asyncio
+import threading
+
+from extract_dashboard_info import get_active_prescriptions, get_todays_medication
+from metrics import register_collector
+
+
+class DashboardEventBus:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Register the calling event loop for ``user_id``; returns the queue snapshots arrive on.
+
+        The queue holds at most one snapshot: a slow client skips straight
+        to the newest numbers instead of replaying every write.
+        """
+        subscription = (asyncio.Queue(maxsize=1), asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def has_subscribers(self, user_id):
+        with self._lock:
+            return user_id in self._subscribers
+
+    def publish(self, user_id, snapshot):
+        """Deliver ``snapshot`` to the user's subscribers; safe to call from any thread"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(_replace, queue, snapshot)
+            except RuntimeError:
+                pass  # loop already closed; its stream is going away
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+def _replace(queue, snapshot):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(snapshot)
+
+
+dashboard_events = DashboardEventBus()
+
+
+def dashboard_snapshot(user_id):
+    """The numbers the dashboard shows, as sent on the event stream"""
+    return {
+        "active_prescriptions": get_active_prescriptions(user_id)[0],
+        "todays_medication": get_todays_medication(user_id),
+    }
+
+
+def notify_dashboard_changed(user_id):
+    """Call after committing a write that changes the user's dashboard.
+
+    Never raises: the write already succeeded, and a missed push only costs
+    the client a stale number until its next event.
+    """
+    if not dashboard_events.has_subscribers(user_id):
+        return
+    try:
+        dashboard_events.publish(user_id, dashboard_snapshot(user_id))
+    except Exception as e:
+        print(f"Could not push dashboard update for user {user_id}: {e}")
+
+
+def _collect_subscriber_metrics():
+    return [("medsafe_dashboard_event_subscribers", "gauge", "Open dashboard event streams",
+             [({}, dashboard_events.subscriber_count())])]
+
+
+register_collector(_collect_subscriber_metrics)
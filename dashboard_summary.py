@@ -0,0 +1,147 @@
+"""Incrementally maintained dashboard counters.
+
+The dashboard used to run COUNT(DISTINCT medicine_name) over a user's whole
+prescription list and history on every view. Instead, the upload paths call
+the ``record_*`` helpers with their own cursor, so the summaries change in
+the same transaction as the raw rows, and the dashboard reads one row.
+
+The tables are created (if missing) by migration 2 and at API startup.
+Run ``python dashboard_summary.py rebuild`` to backfill them from existing
+rows, and again whenever they need recovering from the raw tables.
+"""
+import argparse
+
+from psycopg2.extras import execute_batch
+
+from db import execute_prepared, get_connection
+
+SUMMARY_TABLES_DDL = """
+    CREATE TABLE IF NOT EXISTS prescription_medicines (
+        user_id INT NOT NULL,
+        medicine_name VARCHAR NOT NULL,
+        PRIMARY KEY (user_id, medicine_name)
+    );
+    CREATE TABLE IF NOT EXISTS prescription_summary (
+        user_id INT PRIMARY KEY,
+        active_prescriptions INT NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS daily_medicines_taken (
+        user_id INT NOT NULL,
+        day DATE NOT NULL,
+        medicine_name VARCHAR NOT NULL,
+        PRIMARY KEY (user_id, day, medicine_name)
+    );
+    CREATE TABLE IF NOT EXISTS daily_medication_summary (
+        user_id INT NOT NULL,
+        day DATE NOT NULL,
+        medicines_taken INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, day)
+    );
+"""
+
+
+def ensure_summary_tables(cur):
+    cur.execute(SUMMARY_TABLES_DDL)
+
+
+RECORD_PRESCRIPTION_SQL = """
+    WITH new_medicine AS (
+        INSERT INTO prescription_medicines (user_id, medicine_name)
+        VALUES (%s, %s)
+        ON CONFLICT DO NOTHING
+        RETURNING user_id
+    )
+    INSERT INTO prescription_summary (user_id, active_prescriptions)
+    SELECT user_id, 1 FROM new_medicine
+    ON CONFLICT (user_id) DO UPDATE
+    SET active_prescriptions = prescription_summary.active_prescriptions + 1
+"""
+
+
+def record_prescription(cur, user_id, medicine_name):
+    """Count a prescribed medicine once per user, inside the caller's transaction"""
+    cur.execute(RECORD_PRESCRIPTION_SQL, (user_id, medicine_name))
+
+
+def record_prescriptions(cur, rows):
+    """Batch form of record_prescription for (user_id, medicine_name) rows"""
+    execute_batch(cur, RECORD_PRESCRIPTION_SQL, rows)
+
+
+# Runs on every medication log, so it is a prepared statement
+RECORD_MEDICATION_TAKEN_SQL = """
+    WITH new_medicine AS (
+        INSERT INTO daily_medicines_taken (user_id, day, medicine_name)
+        VALUES ($1::int, $2::date, $3::varchar)
+        ON CONFLICT DO NOTHING
+        RETURNING user_id, day
+    )
+    INSERT INTO daily_medication_summary (user_id, day, medicines_taken)
+    SELECT user_id, day, 1 FROM new_medicine
+    ON CONFLICT (user_id, day) DO UPDATE
+    SET medicines_taken = daily_medication_summary.medicines_taken + 1
+"""
+
+
+def record_medication_taken(cur, user_id, day, medicine_name):
+    """Count a medicine once per user per local day, inside the caller's transaction.
+
+    ``day`` is the dose's local day as stamped on the user_history row.
+    """
+    execute_prepared(cur, "record_medication_taken", RECORD_MEDICATION_TAKEN_SQL,
+                     (user_id, day, medicine_name))
+
+
+def rebuild_summaries(user_id=None):
+    """Recompute the summaries from prescription and user_history.
+
+    Writers are blocked for the duration (SHARE lock) so no insert can land
+    between the wipe and the backfill.
+    """
+    user_filter = "" if user_id is None else "WHERE user_id = %(user_id)s"
+    params = {"user_id": user_id}
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        ensure_summary_tables(cur)
+        cur.execute("LOCK TABLE prescription, user_history IN SHARE MODE")
+
+        for table in ("prescription_medicines", "prescription_summary",
+                      "daily_medicines_taken", "daily_medication_summary"):
+            cur.execute(f"DELETE FROM {table} {user_filter}", params)
+
+        cur.execute(f"""
+                    INSERT INTO prescription_medicines (user_id, medicine_name)
+                    SELECT DISTINCT user_id, medicine_name
+                    FROM prescription {user_filter}
+                    """, params)
+        cur.execute(f"""
+                    INSERT INTO prescription_summary (user_id, active_prescriptions)
+                    SELECT user_id, COUNT(*)
+                    FROM prescription_medicines {user_filter}
+                    GROUP BY user_id
+                    """, params)
+        cur.execute(f"""
+                    INSERT INTO daily_medicines_taken (user_id, day, medicine_name)
+                    SELECT DISTINCT user_id, day, medicine_name
+                    FROM user_history {user_filter}
+                    """, params)
+        cur.execute(f"""
+                    INSERT INTO daily_medication_summary (user_id, day, medicines_taken)
+                    SELECT user_id, day, COUNT(*)
+                    FROM daily_medicines_taken {user_filter}
+                    GROUP BY user_id, day
+                    """, params)
+        cur.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the dashboard summary tables")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    rebuild = subcommands.add_parser("rebuild", help="create the tables and backfill them from the raw tables")
+    rebuild.add_argument("--user-id", type=int, help="only rebuild this user")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        rebuild_summaries(args.user_id)
+        print("Dashboard summaries rebuilt" + ("" if args.user_id is None else f" for user {args.user_id}"))
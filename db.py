@@ -0,0 +1,248 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool
+from dotenv import load_dotenv
+
+from metrics import Histogram, register_collector
+
+load_dotenv()
+
+# Host and credentials have no defaults; set them in the environment or .env
+REQUIRED_SETTINGS = ("DB_HOST", "DB_USER", "DB_PASSWORD")
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST"),
+    "port": int(os.getenv("DB_PORT", "5432")),
+    "dbname": os.getenv("DB_NAME", "postgres"),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASSWORD"),
+}
+
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", "10"))
+# Connections idle for longer than this are pinged with SELECT 1 before use
+HEALTHCHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTHCHECK_INTERVAL", "30"))
+# A checkout waits this long for a free connection before raising PoolError
+POOL_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "30"))
+# Threads that run blocking DB helpers for async handlers. Capped at the pool
+# size so run_db callers queue here rather than holding a thread while they
+# wait for a connection; streams, verification workers and other threads
+# also check out connections, and wait in ConnectionPool.getconn.
+EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", str(POOL_MAX_SIZE)))
+
+POOL_CHECKOUT_SECONDS = Histogram("medsafe_db_pool_checkout_seconds",
+                                  "Time to borrow a pooled connection, including the health check")
+
+
+def check_db_config():
+    """Raise RuntimeError naming any required connection setting that isn't set"""
+    missing = [name for name in REQUIRED_SETTINGS if not os.getenv(name)]
+    if missing:
+        raise RuntimeError(f"Postgres is not configured: set {', '.join(missing)}")
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool with a health check on checkout.
+
+    Every data-access helper borrows a connection from here instead of
+    opening its own, so one request costs at most one TCP+auth handshake
+    (and usually none once the pool is warm).
+    """
+
+    def __init__(self, minconn=POOL_MIN_SIZE, maxconn=POOL_MAX_SIZE,
+                 healthcheck_interval=HEALTHCHECK_INTERVAL, checkout_timeout=POOL_CHECKOUT_TIMEOUT,
+                 **conn_kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.healthcheck_interval = healthcheck_interval
+        self.checkout_timeout = checkout_timeout
+        self._pool = pool.ThreadedConnectionPool(minconn, maxconn, **conn_kwargs)
+        # psycopg2's pool raises as soon as it is empty; holding a slot per
+        # checked-out connection makes callers wait their turn instead
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn), 0)
+        if time.monotonic() - last_used < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        with POOL_CHECKOUT_SECONDS.time():
+            return self._checkout()
+
+    def _checkout(self):
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise pool.PoolError(f"no database connection free after {self.checkout_timeout:g}s")
+        try:
+            conn = self._pool.getconn()
+            if not self._is_healthy(conn):
+                # Drop the dead connection and let the pool open a fresh one
+                self._pool.putconn(conn, close=True)
+                self._last_used.pop(id(conn), None)
+                conn = self._pool.getconn()
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def putconn(self, conn, close=False):
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if close or conn.closed:
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+                return
+            self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of one unit of work.
+
+        Commits on success and rolls back on error before returning the
+        connection to the pool.
+        """
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            # BaseException so a generator closed mid-stream (GeneratorExit)
+            # doesn't hand back a connection with an open transaction
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def stats(self):
+        with self._lock:
+            return {"min": self.minconn, "max": self.maxconn, "in_use": self._in_use}
+
+    def closeall(self):
+        self._pool.closeall()
+        self._last_used.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                check_db_config()
+                _pool = ConnectionPool(**DB_CONFIG)
+    return _pool
+
+
+def get_connection():
+    """Per-request checkout: ``with get_connection() as conn: ...``"""
+    return get_pool().connection()
+
+
+# Names already PREPAREd on each live connection; entries vanish with the connection
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+
+def execute_prepared(cur, name, sql, params=()):
+    """Run ``sql`` (``$1``-style placeholders) as a server-side prepared statement.
+
+    The statement is parsed and planned once per connection, on first use;
+    after that only EXECUTE and the parameters go over the wire.
+    """
+    with _prepared_lock:
+        prepared = _prepared.setdefault(cur.connection, set())
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} AS {sql}")
+        prepared.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+
+def _collect_pool_metrics():
+    if _pool is None:
+        return []
+    stats = _pool.stats()
+    return [("medsafe_db_pool_connections", "gauge", "Pooled connections checked out, and the pool's bounds",
+             [({"state": "in_use"}, stats["in_use"]), ({"state": "max"}, stats["max"]),
+              ({"state": "min"}, stats["min"])])]
+
+
+register_collector(_collect_pool_metrics)
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=min(EXECUTOR_WORKERS, POOL_MAX_SIZE),
+                    thread_name_prefix="db",
+                )
+    return _executor
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking data-access helper without freezing the event loop.
+
+    Calls queue on a bounded executor, so a burst of requests waits for a
+    free worker instead of exhausting the connection pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
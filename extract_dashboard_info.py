@@ -1,122 +1,31 @@
-import psycopg2
-from datetime import datetime, timezone
-import pytz
-
-def get_current_pst_time():
-    """Get current time in PST"""
-    pst = pytz.timezone('America/Los_Angeles')
-    return datetime.now(pst)
-
-def set_server_timezone_to_pst():
-    """Set the PostgreSQL server timezone to PST"""
-    conn = psycopg2.connect(
-        host="35.193.11.213",
-        port=5432,
-        dbname="postgres",
-        user="adityaiyer7",
-        password="CalHacksAI2025"
-    )
-
-    cur = conn.cursor()
-    
-    # Set timezone to PST
-    cur.execute("SET timezone = 'America/Los_Angeles'")
-    conn.commit()
-    
-    # Verify the change
-    cur.execute("SHOW timezone")
-    result = cur.fetchone()
-    print(f"Server timezone set to: {result[0]}")
-    
-    cur.close()
-    conn.close()
+import argparse
+from metrics import db_query
+from repository import get_repository
+from user_timezones import local_today
 
+@db_query("active_prescriptions")
 def get_active_prescriptions(user_id):
-    conn = psycopg2.connect(
-    host="35.193.11.213",
-    port=5432,
-    dbname="postgres",
-    user="adityaiyer7",
-    password="CalHacksAI2025"
-    )
-
-    cur = conn.cursor()
-    cur.execute("""
-                SELECT COUNT(DISTINCT medicine_name) 
-                FROM prescription 
-                WHERE user_id = %s""", (user_id,))
-    num_of_meds = cur.fetchall()[0]
-    cur.close()
-    conn.close()
-    return num_of_meds
+    return (get_repository().active_prescription_count(user_id),)
 
 
+@db_query("todays_medication")
 def get_todays_medication(user_id):
-    conn = psycopg2.connect(
-    host="35.193.11.213",
-    port=5432,
-    dbname="postgres",
-    user="adityaiyer7",
-    password="CalHacksAI2025"
-    )
-
-    cur = conn.cursor()
-    
-    # Set session timezone to PST for this connection
-    cur.execute("SET timezone = 'America/Los_Angeles'")
-    
-    # Now use PST-aware date comparison
-    cur.execute("""
-                SELECT COUNT(DISTINCT medicine_name) 
-                FROM user_history 
-                WHERE user_id = %s 
-                AND DATE(log_time AT TIME ZONE 'UTC' AT TIME ZONE 'America/Los_Angeles') = CURRENT_DATE""", (user_id,))
-    
-    num_of_meds_taken_today = cur.fetchall()[0]
-    cur.close()
-    conn.close()
-    return num_of_meds_taken_today[0]
-
-
-def get_compliance_rate(user_id):
-    conn = psycopg2.connect(
-    host="35.193.11.213",
-    port=5432,
-    dbname="postgres",
-    user="adityaiyer7",
-    password="CalHacksAI2025"
-    )
+    # "Today" is the user's local day, the same day stamped on their logs
+    return get_repository().medicines_taken_on(user_id, local_today(user_id))
 
-    cur = conn.cursor()
-    
-    total_medicines = get_active_prescriptions(user_id)
- 
-    cur.execute("""
-                WITH date_grouped_table AS (
-                    SELECT day, COUNT(medicine_name) AS medicines_taken
-                    FROM user_history
-                    WHERE user_id = %s
-                    GROUP BY day
-                ),
-                expected_count_table AS (
-                    SELECT *, %s::int AS expected_medicine_count
-                    FROM date_grouped_table)
-                
-                SELECT  SUM(medicines_taken)::numeric/NULLIF(SUM(expected_medicine_count),0)
-                FROM expected_count_table;
-                """, (user_id, total_medicines))
-    
-    compliance_rate = cur.fetchall()[0]
-    cur.close()
-    conn.close()
-    result = cur.fetchone()[0]        
-    if result is None:
-        return 0.0
-    return float(result)              
 
+def get_compliance_rate(user_id, days=None):
+    """Share of expected doses taken over the last ``days`` days (all time if None)"""
+    from compliance import get_compliance  # Postgres-only, so not imported at module load
+    return get_compliance(user_id, days=days)["compliance_rate"]
 
-def get_alerts(user_id):
-    pass
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print a user's dashboard numbers")
+    parser.add_argument("--user-id", type=int, default=123)
+    parser.add_argument("--days", type=int, help="compliance window (default: all time)")
+    args = parser.parse_args()
 
-print(get_compliance_rate(123))
\ No newline at end of file
+    print(f"Active prescriptions: {get_active_prescriptions(args.user_id)[0]}")
+    print(f"Medications taken today: {get_todays_medication(args.user_id)}")
+    print(f"Compliance rate: {get_compliance_rate(args.user_id, args.days):.1%}")
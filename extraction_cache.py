@@ -0,0 +1,193 @@
+"""Persistent cache of Gemini extraction results, keyed by image content.
+
+Entries live in a local SQLite file so they survive restarts. The key is the
+SHA-256 of the uploaded bytes plus the extractor kind and prompt version, so
+changing a prompt (and bumping its version) naturally misses old results.
+
+With ``EXTRACTION_CACHE_NEAR_DUPLICATE`` > 0, a miss on the exact hash falls
+back to a perceptual (difference) hash: a re-taken photo of the same label
+within that many differing bits reuses the earlier result. Only the
+``EXTRACTION_CACHE_NEAR_DUPLICATE_WINDOW`` most recently used entries are
+compared, so a lookup costs the same however large the cache grows; a
+re-take is almost always of a label seen moments ago.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from metrics import register_collector
+
+CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "extraction_cache.db")
+CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "10000"))
+# Max Hamming distance between 64-bit dHashes; 0 disables near-duplicate matching
+NEAR_DUPLICATE_DISTANCE = int(os.getenv("EXTRACTION_CACHE_NEAR_DUPLICATE", "0"))
+NEAR_DUPLICATE_WINDOW = int(os.getenv("EXTRACTION_CACHE_NEAR_DUPLICATE_WINDOW", "1000"))
+
+
+def content_hash(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def perceptual_hash(image_bytes):
+    """64-bit difference hash of the image, or None if it can't be decoded"""
+    # Deferred so importing the cache doesn't pull in OpenCV
+    import cv2
+    import numpy as np
+
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    small = cv2.resize(img, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+class ExtractionCache:
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES,
+                 near_duplicate_distance=NEAR_DUPLICATE_DISTANCE,
+                 near_duplicate_window=NEAR_DUPLICATE_WINDOW):
+        self.max_entries = max_entries
+        self.near_duplicate_distance = near_duplicate_distance
+        self.near_duplicate_window = near_duplicate_window
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                phash TEXT,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS extraction_cache_last_access
+            ON extraction_cache (last_access)
+        """)
+        # Serves the near-duplicate window straight from the index, newest first
+        self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS extraction_cache_recent_phash
+            ON extraction_cache (kind, prompt_version, last_access)
+            WHERE phash IS NOT NULL
+        """)
+        self._conn.commit()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(kind, image_bytes, prompt_version):
+        return f"{kind}:{prompt_version}:{content_hash(image_bytes)}"
+
+    def _touch(self, key):
+        self._conn.execute("UPDATE extraction_cache SET last_access = ? WHERE key = ?",
+                           (time.time(), key))
+        self._conn.commit()
+
+    def _find_near_duplicate(self, kind, prompt_version, phash):
+        rows = self._conn.execute("""
+            SELECT key, phash, result FROM extraction_cache
+            WHERE kind = ? AND prompt_version = ? AND phash IS NOT NULL
+            ORDER BY last_access DESC
+            LIMIT ?
+        """, (kind, prompt_version, self.near_duplicate_window)).fetchall()
+        best = None
+        for key, stored, result in rows:
+            distance = bin(int(stored, 16) ^ phash).count("1")
+            if distance <= self.near_duplicate_distance and (best is None or distance < best[0]):
+                best = (distance, key, result)
+        return best
+
+    def get(self, kind, image_bytes, prompt_version):
+        """Cached result for these exact bytes (or a near duplicate), else None"""
+        key = self._key(kind, image_bytes, prompt_version)
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM extraction_cache WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is not None:
+                self._touch(key)
+                self.hits += 1
+                return json.loads(row[0])
+
+        if self.near_duplicate_distance > 0:
+            phash = perceptual_hash(image_bytes)
+            if phash is not None:
+                with self._lock:
+                    match = self._find_near_duplicate(kind, prompt_version, phash)
+                    if match is not None:
+                        self._touch(match[1])
+                        self.near_hits += 1
+                        return json.loads(match[2])
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, kind, image_bytes, prompt_version, result):
+        key = self._key(kind, image_bytes, prompt_version)
+        phash = perceptual_hash(image_bytes) if self.near_duplicate_distance > 0 else None
+        now = time.time()
+        with self._lock:
+            self._conn.execute("""
+                INSERT OR REPLACE INTO extraction_cache
+                (key, kind, prompt_version, phash, result, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (key, kind, prompt_version, None if phash is None else format(phash, "016x"),
+                  json.dumps(result), now, now))
+            # Evict least recently used entries beyond the size bound
+            self._conn.execute("""
+                DELETE FROM extraction_cache WHERE key IN (
+                    SELECT key FROM extraction_cache
+                    ORDER BY last_access DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache():
+    """Process-wide cache, opened on first use"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ExtractionCache()
+    return _cache
+
+
+def _collect_cache_metrics():
+    if _cache is None:
+        return []
+    stats = _cache.stats()
+    return [
+        ("medsafe_extraction_cache_lookups_total", "counter", "Extraction cache lookups by outcome",
+         [({"result": "hit"}, stats["hits"]), ({"result": "near_hit"}, stats["near_hits"]),
+          ({"result": "miss"}, stats["misses"])]),
+        ("medsafe_extraction_cache_entries", "gauge", "Results stored in the extraction cache",
+         [({}, stats["entries"])]),
+    ]
+
+
+register_collector(_collect_cache_metrics)
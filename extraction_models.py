@@ -0,0 +1,50 @@
+from typing import List
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class MedicationExtraction(BaseModel):
+    """What the model reads off a photo of a medication being taken"""
+    medicine_name: str = Field(min_length=1, description="Name of the medication on the label")
+    number_of_pills: str = Field(description="Pills physically visible outside the bottle, or 'unknown'")
+    medicine_dosage: str = Field(description="Total dosage (pills x dosage per pill) in mg, or 'unknown'")
+
+    @field_validator("number_of_pills", "medicine_dosage", mode="before")
+    @classmethod
+    def stringify(cls, value):
+        # Models often answer with bare numbers; the rest of the code stores strings
+        return str(value) if isinstance(value, (int, float)) else value
+
+    @field_validator("medicine_name")
+    @classmethod
+    def lowercase_name(cls, value):
+        return value.strip().lower()
+
+
+class PrescribedMedication(BaseModel):
+    medication_name: str = Field(min_length=1)
+    dosage: str
+    frequency_per_day: int = Field(default=0, ge=0)
+    times_of_day: List[str] = Field(default_factory=lambda: ["Anytime"],
+                                    description="e.g. morning, afternoon, evening, night; ['Anytime'] if unspecified")
+
+    @field_validator("dosage", mode="before")
+    @classmethod
+    def stringify(cls, value):
+        return str(value) if isinstance(value, (int, float)) else value
+
+
+class PrescriptionExtraction(BaseModel):
+    """Every medication listed on a prescription image"""
+    medications: List[PrescribedMedication]
+
+
+class InteractionVerdict(BaseModel):
+    drug_a: str
+    drug_b: str
+    safe: bool = Field(description="true if the two can be taken together")
+
+
+class InteractionBatch(BaseModel):
+    """One verdict per medication pair asked about"""
+    results: List[InteractionVerdict]
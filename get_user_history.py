@@ -1,5 +1,11 @@
-import psycopg2
+import base64
+import json
 
+from metrics import db_query
+from repository import get_repository
+
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 1000
 
 
 def user_history_to_json(user_data):
@@ -24,26 +30,45 @@ def user_history_to_json(user_data):
     return user_data_list
 
 
+def encode_history_cursor(row):
+    """Opaque keyset cursor from the last row of a page: (log_time, medicine_name)"""
+    raw = json.dumps([row[0], row[1]]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_history_cursor(cursor):
+    try:
+        log_time, medicine_name = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid history cursor") from None
+    return log_time, medicine_name
+
+
+@db_query("history_page")
+def get_raw_user_histroy(user_id, start_day=None, end_day=None, cursor=None, limit=HISTORY_PAGE_SIZE):
+    """One page of a user's history, newest first.
+
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    after = decode_history_cursor(cursor) if cursor is not None else None
+    # One extra row tells us whether another page exists
+    user_data = get_repository().history_page(user_id, start_day, end_day, after, limit + 1)
+
+    next_cursor = encode_history_cursor(user_data[limit - 1]) if len(user_data) > limit else None
+    return user_data[:limit], next_cursor
+
+
+def iter_user_history(user_id, start_day=None, end_day=None, cursor=None):
+    """Yield a user's history rows, newest first, without holding them all in memory"""
+    after = decode_history_cursor(cursor) if cursor is not None else None
+    yield from get_repository().iter_history(user_id, start_day, end_day, after)
+
 
-def get_raw_user_histroy():
-    conn = psycopg2.connect(
-        host="35.193.11.213",
-        port=5432,
-        dbname="postgres",
-        user="adityaiyer7",
-        password="CalHacksAI2025"
-    )
-    
-    cur = conn.cursor()
-    cur.execute("""
-                SELECT log_time::text AS log_time, medicine_name, medicine_dosage, day::text as day, time_of_day
-                FROM user_history """, )
-    user_data = cur.fetchall()
-    conn.commit()
-    cur.close()
-    conn.close()
-        
-    return user_data
+def stream_user_history_ndjson(user_id, start_day=None, end_day=None, cursor=None):
+    """NDJSON lines (one history entry per line) for a chunked response"""
+    for row in iter_user_history(user_id, start_day, end_day, cursor):
+        yield json.dumps(user_history_to_json([row])[0]) + "\n"
 
 
 def get_user_history_json(user_data):
@@ -0,0 +1,231 @@
+"""Monthly partitions of ``user_history`` and their retention.
+
+``user_history`` is range-partitioned on ``day`` (migration 6), one
+partition per calendar month named ``user_history_pYYYYMM``. Queries that
+filter on ``day`` (the dose check, date-bounded history pages) only touch
+the matching months.
+
+    python history_partitions.py ensure              # create upcoming partitions
+    python history_partitions.py archive --dry-run   # list what retention would archive
+    python history_partitions.py maintain            # both; run daily from cron
+
+Archiving detaches a partition with ``DETACH PARTITION ... CONCURRENTLY``
+(writers to current months are never blocked), writes its rows to a gzipped
+CSV under ``HISTORY_ARCHIVE_DIR``, records the file in ``history_archives``
+and drops the table. Rollups (dashboard, compliance) keep their counts; a
+later ``rebuild`` only sees the retained months.
+"""
+import argparse
+import gzip
+import os
+import re
+from datetime import date
+
+from db import get_connection
+from postgres_repository import HISTORY_DOSE_KEY_DDL
+
+# Indexes from migrations 3 and 4, rebuilt whenever user_history is re-created
+HISTORY_INDEXES_DDL = HISTORY_DOSE_KEY_DDL + """;
+    CREATE INDEX IF NOT EXISTS user_history_user_log_time
+        ON user_history (user_id, log_time DESC, medicine_name DESC);
+"""
+
+# Partitions are created this many months past the current one
+HISTORY_MONTHS_AHEAD = int(os.getenv("HISTORY_MONTHS_AHEAD", "3"))
+# Months kept online, counting the current one; older partitions are archived
+HISTORY_RETENTION_MONTHS = int(os.getenv("HISTORY_RETENTION_MONTHS", "24"))
+HISTORY_ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR", "history_archive")
+
+PARTITION_NAME = re.compile(r"^user_history_p(\d{4})(\d{2})$")
+
+ARCHIVES_DDL = """
+    CREATE TABLE IF NOT EXISTS history_archives (
+        partition_name VARCHAR PRIMARY KEY,
+        from_day DATE NOT NULL,
+        to_day DATE NOT NULL,
+        path VARCHAR NOT NULL,
+        row_count BIGINT NOT NULL,
+        archived_at TIMESTAMP NOT NULL DEFAULT now()
+    )
+"""
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"user_history_p{month:%Y%m}"
+
+
+def create_partition_sql(month):
+    return (f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF user_history "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')")
+
+
+def _month_of(name):
+    match = PARTITION_NAME.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def existing_partitions(cur):
+    """{month: (name, state)}; state is "attached", "detaching" (an interrupted
+    DETACH CONCURRENTLY) or "detached" (detached but never archived)"""
+    cur.execute("""
+                SELECT c.relname,
+                       CASE WHEN i.inhrelid IS NULL THEN 'detached'
+                            WHEN i.inhdetachpending THEN 'detaching'
+                            ELSE 'attached' END
+                FROM pg_class c
+                LEFT JOIN pg_inherits i
+                    ON i.inhrelid = c.oid AND i.inhparent = 'user_history'::regclass
+                WHERE c.relkind = 'r' AND c.relnamespace = 'public'::regnamespace
+                AND c.relname LIKE 'user\\_history\\_p%'
+                """)
+    partitions = {}
+    for name, state in cur.fetchall():
+        month = _month_of(name)
+        if month is not None:
+            partitions[month] = (name, state)
+    return partitions
+
+
+def _create_partitions(cur, first_month, last_month, have=()):
+    created = []
+    month = month_start(first_month)
+    while month <= last_month:
+        if month not in have:
+            cur.execute(create_partition_sql(month))
+            created.append(partition_name(month))
+        month = add_months(month, 1)
+    return created
+
+
+def partition_user_history(cur):
+    """Migration 6: rebuild user_history as a table partitioned by month of ``day``.
+
+    Copies every row in the migration's transaction, so writers wait for it.
+    """
+    cur.execute("ALTER TABLE user_history RENAME TO user_history_unpartitioned")
+    cur.execute("""
+                CREATE TABLE user_history (
+                    user_id INT,
+                    log_time TIMESTAMP,
+                    medicine_name VARCHAR,
+                    medicine_dosage VARCHAR,
+                    day DATE NOT NULL,
+                    time_of_day VARCHAR
+                ) PARTITION BY RANGE (day)
+                """)
+    cur.execute("SELECT MIN(COALESCE(day, log_time::date)) FROM user_history_unpartitioned")
+    first_day = cur.fetchone()[0] or date.today()
+    _create_partitions(cur, first_day, add_months(month_start(date.today()), HISTORY_MONTHS_AHEAD))
+    cur.execute("""
+                INSERT INTO user_history (user_id, log_time, medicine_name, medicine_dosage, day, time_of_day)
+                SELECT user_id, log_time, medicine_name, medicine_dosage, COALESCE(day, log_time::date), time_of_day
+                FROM user_history_unpartitioned
+                """)
+    cur.execute("DROP TABLE user_history_unpartitioned")
+    cur.execute(HISTORY_INDEXES_DDL)
+
+
+def unpartition_user_history(cur):
+    """Reverse of migration 6: fold the attached partitions back into one plain table"""
+    cur.execute("ALTER TABLE user_history RENAME TO user_history_partitioned")
+    cur.execute("CREATE TABLE user_history (LIKE user_history_partitioned)")
+    cur.execute("ALTER TABLE user_history ALTER COLUMN day DROP NOT NULL")
+    cur.execute("INSERT INTO user_history SELECT * FROM user_history_partitioned")
+    cur.execute("DROP TABLE user_history_partitioned")
+    cur.execute(HISTORY_INDEXES_DDL)
+
+
+def ensure_history_partitions(from_day=None, months_ahead=HISTORY_MONTHS_AHEAD):
+    """Create any missing partitions from ``from_day``'s month (default: this month) to ``months_ahead`` later.
+
+    A no-op until migration 6 has made user_history partitioned.
+    """
+    today = date.today()
+    first = month_start(from_day or today)
+    last = add_months(month_start(today), months_ahead)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('user_history')")
+        partitioned = cur.fetchone() is not None
+        created = _create_partitions(cur, first, last, existing_partitions(cur)) if partitioned else []
+        cur.close()
+    return created
+
+
+def _export_partition(cur, name, path):
+    tmp_path = path + ".partial"
+    with gzip.open(tmp_path, "wt", newline="") as f:
+        cur.copy_expert(f"COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)", f)
+    os.replace(tmp_path, path)
+
+
+def archive_old_partitions(retention_months=HISTORY_RETENTION_MONTHS, archive_dir=HISTORY_ARCHIVE_DIR,
+                           dry_run=False):
+    """Detach, export and drop partitions older than the retention window; returns their names"""
+    cutoff = add_months(month_start(date.today()), -(retention_months - 1))
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(ARCHIVES_DDL)
+        old = sorted((month, name, state) for month, (name, state) in existing_partitions(cur).items()
+                     if month < cutoff)
+        cur.close()
+    if dry_run or not old:
+        return [name for _, name, _ in old]
+
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = []
+    for month, name, state in old:
+        if state != "detached":
+            with get_connection() as conn:
+                # DETACH ... CONCURRENTLY doesn't block inserts into the other
+                # partitions, but cannot run inside a transaction block
+                conn.autocommit = True
+                try:
+                    cur = conn.cursor()
+                    suffix = "FINALIZE" if state == "detaching" else "CONCURRENTLY"
+                    cur.execute(f"ALTER TABLE user_history DETACH PARTITION {name} {suffix}")
+                    cur.close()
+                finally:
+                    conn.autocommit = False
+
+        path = os.path.join(archive_dir, f"{name}.csv.gz")
+        with get_connection() as conn:
+            cur = conn.cursor()
+            _export_partition(cur, name, path)
+            cur.execute(f"SELECT COUNT(*) FROM {name}")
+            row_count = cur.fetchone()[0]
+            cur.execute("""
+                        INSERT INTO history_archives (partition_name, from_day, to_day, path, row_count)
+                        VALUES (%s, %s, %s, %s, %s)
+                        ON CONFLICT (partition_name) DO UPDATE
+                        SET path = EXCLUDED.path, row_count = EXCLUDED.row_count, archived_at = now()
+                        """, (name, month, add_months(month, 1), path, row_count))
+            cur.execute(f"DROP TABLE {name}")
+            cur.close()
+        archived.append(name)
+    return archived
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create upcoming user_history partitions and archive old ones")
+    parser.add_argument("command", choices=["ensure", "archive", "maintain"])
+    parser.add_argument("--months-ahead", type=int, default=HISTORY_MONTHS_AHEAD)
+    parser.add_argument("--retention-months", type=int, default=HISTORY_RETENTION_MONTHS)
+    parser.add_argument("--archive-dir", default=HISTORY_ARCHIVE_DIR)
+    parser.add_argument("--dry-run", action="store_true", help="list partitions to archive without touching them")
+    args = parser.parse_args()
+
+    if args.command in ("ensure", "maintain"):
+        print(f"Created: {ensure_history_partitions(months_ahead=args.months_ahead) or 'nothing missing'}")
+    if args.command in ("archive", "maintain"):
+        archived = archive_old_partitions(args.retention_months, args.archive_dir, args.dry_run)
+        print(f"{'Would archive' if args.dry_run else 'Archived'}: {archived or 'nothing past retention'}")
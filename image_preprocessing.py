@@ -0,0 +1,110 @@
+"""Shrink images before they are uploaded to the model.
+
+Phone photos and scanned prescriptions arrive at full resolution, far more
+than the model needs to read a label. ``prepare_image`` caps the longest
+side, optionally converts to grayscale with local contrast normalisation
+(helps faded label text), then binary-searches the JPEG quality so the
+payload lands under a byte target.
+
+Tune the size/accuracy tradeoff with the IMAGE_* environment variables.
+"""
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from metrics import Counter, stage
+
+MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1600"))
+TARGET_BYTES = int(os.getenv("IMAGE_TARGET_BYTES", "300000"))
+MIN_QUALITY = int(os.getenv("IMAGE_MIN_QUALITY", "50"))
+MAX_QUALITY = int(os.getenv("IMAGE_MAX_QUALITY", "90"))
+
+_totals = {"images": 0, "original_bytes": 0, "encoded_bytes": 0, "encode_seconds": 0.0}
+_totals_lock = threading.Lock()
+
+IMAGE_BYTES = Counter("medsafe_image_bytes_total", "Image bytes before and after preprocessing", ["kind"])
+
+
+def _encode_jpeg(img, quality):
+    success, encoded_image = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not success:
+        raise ValueError("Failed to encode image.")
+    return encoded_image.tobytes()
+
+
+def _cap_resolution(img, max_dimension):
+    height, width = img.shape[:2]
+    longest = max(height, width)
+    if max_dimension <= 0 or longest <= max_dimension:
+        return img
+    scale = max_dimension / longest
+    return cv2.resize(img, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+def _normalize_text_contrast(img):
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return clahe.apply(gray)
+
+
+def prepare_image(raw_bytes, max_dimension=MAX_DIMENSION, target_bytes=TARGET_BYTES,
+                  grayscale=False, min_quality=MIN_QUALITY, max_quality=MAX_QUALITY):
+    """Return ``(jpeg_bytes, report)`` for an uploaded image.
+
+    Picks the highest JPEG quality in [min_quality, max_quality] whose output
+    fits ``target_bytes``; if even min_quality doesn't fit, min_quality is used.
+    """
+    start = time.perf_counter()
+    with stage("preprocess.decode"):
+        img = cv2.imdecode(np.frombuffer(raw_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("Failed to decode image.")
+
+    img = _cap_resolution(img, max_dimension)
+    if grayscale:
+        img = _normalize_text_contrast(img)
+
+    best = None
+    low, high = min_quality, max_quality
+    with stage("preprocess.encode"):
+        while low <= high:
+            quality = (low + high) // 2
+            encoded = _encode_jpeg(img, quality)
+            if len(encoded) <= target_bytes:
+                best = (quality, encoded)
+                low = quality + 1
+            else:
+                high = quality - 1
+        if best is None:
+            best = (min_quality, _encode_jpeg(img, min_quality))
+
+    quality, encoded = best
+    elapsed = time.perf_counter() - start
+    report = {
+        "original_bytes": len(raw_bytes),
+        "encoded_bytes": len(encoded),
+        "bytes_saved": len(raw_bytes) - len(encoded),
+        "width": img.shape[1],
+        "height": img.shape[0],
+        "quality": quality,
+        "encode_seconds": elapsed,
+    }
+    IMAGE_BYTES.inc(len(raw_bytes), kind="original")
+    IMAGE_BYTES.inc(len(encoded), kind="encoded")
+    with _totals_lock:
+        _totals["images"] += 1
+        _totals["original_bytes"] += len(raw_bytes)
+        _totals["encoded_bytes"] += len(encoded)
+        _totals["encode_seconds"] += elapsed
+    return encoded, report
+
+
+def preprocessing_stats():
+    """Running totals since start-up, including overall bytes saved"""
+    with _totals_lock:
+        totals = dict(_totals)
+    totals["bytes_saved"] = totals["original_bytes"] - totals["encoded_bytes"]
+    return totals
@@ -93,41 +93,36 @@ export default function MedicationSafetyApp() {
     total: medicationLogs.length,
   }
 
-  const fetchDashboardData = async () => {
+  // The server pushes the full dashboard on connect and only the changed fields
+  // after each log or prescription upload, so switching tabs costs no request
+  useEffect(() => {
     setIsLoadingDashboard(true)
-    try {
-      console.log('Attempting to fetch dashboard data...')
-      const response = await fetch('http://localhost:8000/update-dashboard', {
-        method: 'GET',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-      })
-      console.log('Response status:', response.status)
-      if (response.ok) {
-        const data = await response.json()
-        setDashboardData(data)
-        console.log('Dashboard updated:', data)
-      } else {
-        console.error('Failed to fetch dashboard data:', response.status, response.statusText)
-      }
-    } catch (error) {
-      console.error('Error fetching dashboard data:', error)
-      // Show more specific error information
-      if (error instanceof TypeError && error.message.includes('fetch')) {
-        console.error('Network error - make sure your FastAPI server is running on port 8000')
-      }
-    } finally {
+    let received = false
+    let fellBack = false
+    const events = new EventSource('http://localhost:8000/dashboard/events')
+    events.addEventListener('dashboard', (event) => {
+      const changed = JSON.parse((event as MessageEvent).data)
+      setDashboardData((prev) => ({ ...(prev ?? { user_id: 123, message: '' }), ...changed }))
+      received = true
       setIsLoadingDashboard(false)
+    })
+    events.onerror = () => {
+      // EventSource reconnects on its own; the first event after that is a full snapshot
+      console.error('Dashboard event stream interrupted - make sure your FastAPI server is running on port 8000')
+      if (received || fellBack) return
+      // No snapshot yet: load the dashboard once instead of spinning until the stream comes back
+      fellBack = true
+      fetch('http://localhost:8000/update-dashboard')
+        .then((response) => {
+          if (!response.ok) throw new Error(`${response.status} ${response.statusText}`)
+          return response.json()
+        })
+        .then((data: DashboardData) => setDashboardData((prev) => prev ?? data))
+        .catch((error) => console.error('Error fetching dashboard data:', error))
+        .finally(() => setIsLoadingDashboard(false))
     }
-  }
-
-  // Call API when dashboard tab is selected
-  useEffect(() => {
-    if (activeTab === "dashboard") {
-      fetchDashboardData()
-    }
-  }, [activeTab])
+    return () => events.close()
+  }, [])
 
   return (
     <div className="min-h-screen bg-gradient-to-br from-blue-50 to-indigo-100 p-4">
@@ -0,0 +1,159 @@
+"""Medication name normalization and fuzzy matching against prescribed names.
+
+The model reads names off labels ("LISINOPRIL 10MG TABS", "Tylenol 500 mg"),
+while prescriptions hold whatever the prescription said ("Lisinopril",
+"acetaminophen"). ``normalize_name`` reduces both to one form: it lowercases,
+drops strengths, dosage forms and salt suffixes, and maps brand names to
+generics. ``NameIndex`` precomputes that form plus character trigrams for a
+set of names, so ``match`` returns the closest one and a 0-1 score. Exact
+normalized hits are dict lookups. Otherwise trigram overlap shortlists
+candidates and edit distance scores them. Names that normalize to the same
+form ("Tylenol", "acetaminophen") are one entry; the match carries all of
+them, with the first in sorted order as ``name``.
+
+    index = NameIndex(["Lisinopril", "Metformin"])
+    index.match("LISINOPRIL 10MG TABS")   # NameMatch(name='Lisinopril', score=1.0, names=('Lisinopril',))
+    index.match("lisinoprill")            # NameMatch(name='Lisinopril', score=0.909, names=('Lisinopril',))
+"""
+import collections
+import heapq
+import os
+import re
+import unicodedata
+from itertools import chain
+
+from metrics import Counter
+
+# Scores below this are treated as no match
+MATCH_THRESHOLD = float(os.getenv("MEDICATION_MATCH_THRESHOLD", "0.8"))
+# Trigram candidates scored by edit distance per lookup
+MATCH_CANDIDATES = 8
+
+NAME_MATCHES = Counter(
+    "medsafe_medication_name_matches_total", "Medication name lookups by how they matched", ["result"])
+
+NameMatch = collections.namedtuple("NameMatch", ["name", "score", "names"])
+
+_STRENGTH = re.compile(
+    r"\b\d+(?:[.,]\d+)?\s*(?:mg|mcg|µg|ug|g|ml|l|iu|units?|meq|%)(?:\s*/\s*\d*(?:[.,]\d+)?\s*(?:ml|l|g|dose|tab))?\b"
+    r"|\b\d+(?:[.,]\d+)?\b")
+_NON_ALPHA = re.compile(r"[^a-z ]+")
+
+FORM_WORDS = frozenset("""
+    tab tabs tablet tablets cap caps capsule capsules caplet caplets softgel softgels pill pills
+    oral solution suspension syrup liquid elixir drops injection injectable cream ointment gel
+    patch inhaler spray chewable dispersible effervescent film coated delayed extended release
+    er xr xl sr cr dr ec ir odt hfa otc generic
+""".split())
+SALT_WORDS = frozenset("""
+    hcl hydrochloride hydrobromide sodium potassium calcium magnesium besylate maleate mesylate
+    succinate tartrate citrate sulfate sulphate phosphate acetate fumarate
+""".split())
+# Brand (and international) names to the generic a prescription would use
+SYNONYMS = {
+    "tylenol": "acetaminophen", "paracetamol": "acetaminophen", "panadol": "acetaminophen",
+    "advil": "ibuprofen", "motrin": "ibuprofen", "nurofen": "ibuprofen",
+    "aleve": "naproxen", "bayer": "aspirin", "acetylsalicylic acid": "aspirin", "asa": "aspirin",
+    "zestril": "lisinopril", "prinivil": "lisinopril", "glucophage": "metformin",
+    "lipitor": "atorvastatin", "zocor": "simvastatin", "crestor": "rosuvastatin",
+    "synthroid": "levothyroxine", "levoxyl": "levothyroxine", "norvasc": "amlodipine",
+    "lopressor": "metoprolol", "toprol": "metoprolol", "prilosec": "omeprazole",
+    "protonix": "pantoprazole", "nexium": "esomeprazole", "cozaar": "losartan",
+    "proventil": "albuterol", "ventolin": "albuterol", "salbutamol": "albuterol",
+    "neurontin": "gabapentin", "microzide": "hydrochlorothiazide", "hctz": "hydrochlorothiazide",
+    "zoloft": "sertraline", "lasix": "furosemide", "prozac": "fluoxetine", "lexapro": "escitalopram",
+    "ultram": "tramadol", "wellbutrin": "bupropion", "deltasone": "prednisone",
+    "coumadin": "warfarin", "plavix": "clopidogrel", "eliquis": "apixaban",
+}
+
+
+def normalize_name(name):
+    """Canonical form used for matching: 'Tylenol 500mg Caplets' -> 'acetaminophen'"""
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode().lower()
+    text = _STRENGTH.sub(" ", text)
+    words = [word for word in _NON_ALPHA.sub(" ", text).split()
+             if word not in FORM_WORDS and word not in SALT_WORDS]
+    # Nothing left (e.g. "Tablets 10mg"): fall back to the letters that were there
+    text = " ".join(words) or " ".join(_NON_ALPHA.sub(" ", str(name).lower()).split())
+    # dict.fromkeys: "Bayer Aspirin" is one aspirin, not two
+    return SYNONYMS.get(text) or " ".join(dict.fromkeys(SYNONYMS.get(word, word) for word in words)) or text
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit=None):
+    """Edit distance counting a swap of adjacent letters as one edit (label misreads and typos
+    are mostly that); stops early and returns ``limit + 1`` once it must exceed ``limit``"""
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+def similarity(a, b, threshold=0.0):
+    """1 - edit distance / longer length; anything under ``threshold`` may come back as 0"""
+    longest = max(len(a), len(b)) or 1
+    limit = int(longest * (1 - threshold))
+    distance = edit_distance(a, b, limit)
+    return 0.0 if distance > limit else 1 - distance / longest
+
+
+class NameIndex:
+    """Immutable lookup structure over one set of names (e.g. a user's prescriptions)"""
+
+    def __init__(self, names, threshold=MATCH_THRESHOLD):
+        self.threshold = threshold
+        self._exact = {}
+        self._keys = []
+        self._postings = {}
+        spellings = {}
+        for name in sorted(names):
+            spellings.setdefault(normalize_name(name), []).append(name)
+        for key, key_names in spellings.items():
+            self._exact[key] = tuple(key_names)
+            key_id = len(self._keys)
+            self._keys.append(key)
+            for gram in trigrams(key):
+                self._postings.setdefault(gram, []).append(key_id)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def match(self, name):
+        """Best NameMatch for ``name``, or None when nothing scores at least the threshold"""
+        key = normalize_name(name)
+        exact = self._exact.get(key)
+        if exact is not None:
+            NAME_MATCHES.inc(result="exact")
+            return NameMatch(exact[0], 1.0, exact)
+
+        grams = trigrams(key)
+        # Counted in C: common trigrams ("ril", "in ") have long postings in big vocabularies
+        shared = collections.Counter(chain.from_iterable(self._postings.get(gram, ()) for gram in grams))
+        # Most shared trigrams, then the best Dice coefficients among those; edit distance decides
+        most_shared = [key_id for key_id, _ in shared.most_common(4 * MATCH_CANDIDATES)]
+        candidates = heapq.nlargest(MATCH_CANDIDATES, most_shared,
+                                    key=lambda key_id: shared[key_id] / (len(grams) + len(self._keys[key_id]) + 2))
+        best = None
+        for key_id in candidates:
+            score = similarity(key, self._keys[key_id], self.threshold)
+            if score >= self.threshold and (best is None or score > best.score):
+                key_names = self._exact[self._keys[key_id]]
+                best = NameMatch(key_names[0], round(score, 3), key_names)
+        NAME_MATCHES.inc(result="fuzzy" if best else "none")
+        return best
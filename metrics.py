@@ -0,0 +1,183 @@
+"""In-process metrics exported in the Prometheus text format.
+
+Histograms and counters are updated inline; gauges that mirror state owned
+elsewhere (pool usage, cache sizes) are read at scrape time from collectors
+that each module registers for itself. ``render()`` produces the body for
+the API's ``/metrics`` endpoint.
+
+    with stage("log_medication.insert"):
+        ...
+
+    @db_query("active_prescriptions")
+    def get_active_prescriptions(user_id):
+        ...
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; wide enough for both a cached index lookup and a slow model call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics = []
+_collectors = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the block, including when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", labels + (("le", _format_value(bound)),), cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+def register_collector(collect):
+    """``collect()`` returns ``[(name, type, help, [(labels_dict, value), ...]), ...]`` at scrape time"""
+    with _registry_lock:
+        _collectors.append(collect)
+
+
+def render():
+    """Every metric in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics, collectors = list(_metrics), list(_collectors)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for collect in collectors:
+        for name, metric_type, documentation, samples in collect():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "medsafe_stage_seconds", "Time spent in each stage of the upload pipelines", ["stage"])
+DB_QUERY_SECONDS = Histogram(
+    "medsafe_db_query_seconds", "Dashboard and history queries, including pool checkout", ["query"])
+MODEL_CALL_SECONDS = Histogram(
+    "medsafe_model_call_seconds", "generate_content round trips", ["call"])
+MODEL_REQUEST_BYTES = Counter(
+    "medsafe_model_request_bytes_total", "Image plus prompt bytes sent to the model", ["call"])
+MODEL_TOKENS = Counter(
+    "medsafe_model_tokens_total", "Tokens reported by the model's usage metadata", ["call", "kind"])
+HTTP_REQUEST_SECONDS = Histogram(
+    "medsafe_http_request_seconds", "API request latency", ["method", "route", "status"])
+
+
+def stage(name):
+    """Time one pipeline stage; usable as ``with`` block or decorator"""
+    return STAGE_SECONDS.time(stage=name)
+
+
+def db_query(name):
+    return DB_QUERY_SECONDS.time(query=name)
+
+
+def _request_bytes(contents):
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    size = 0
+    for part in parts:
+        if isinstance(part, dict):
+            size += len(part.get("data", b""))
+        else:
+            size += len(str(part).encode())
+    return size
+
+
+def generate_content(model, call, contents, **kwargs):
+    """``model.generate_content`` with latency, bytes sent and token usage recorded under ``call``"""
+    MODEL_REQUEST_BYTES.inc(_request_bytes(contents), call=call)
+    with MODEL_CALL_SECONDS.time(call=call):
+        response = model.generate_content(contents, **kwargs)
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        MODEL_TOKENS.inc(getattr(usage, "prompt_token_count", 0) or 0, call=call, kind="prompt")
+        MODEL_TOKENS.inc(getattr(usage, "candidates_token_count", 0) or 0, call=call, kind="response")
+    return response
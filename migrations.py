@@ -0,0 +1,209 @@
+"""Versioned schema migrations.
+
+    python migrations.py status
+    python migrations.py up            # apply everything pending
+    python migrations.py up --to 4
+    python migrations.py down --to 3   # revert migrations above 3 (where reversible)
+
+Each migration runs in its own transaction and records itself in
+``schema_migrations``; a transaction-scoped advisory lock keeps two
+migrators from interleaving. Earlier ad-hoc DDL (summary, compliance and
+interaction tables, the user_history dose key) is folded in as the first
+migrations, reusing the constants the runtime ``ensure_*`` helpers run.
+``up``/``down`` are SQL strings, or callables taking the cursor for steps
+that depend on existing data.
+"""
+import argparse
+import os
+from collections import namedtuple
+
+from compliance import COMPLIANCE_TABLES_DDL
+from cross_check import INTERACTION_TABLE_DDL
+from dashboard_summary import SUMMARY_TABLES_DDL
+from db import get_connection
+from history_partitions import partition_user_history, unpartition_user_history
+from postgres_repository import DEDUPE_HISTORY_SQL, HISTORY_DOSE_KEY_DDL, USER_VERSIONS_DDL
+from user_timezones import DEFAULT_TIMEZONE, USER_TIMEZONES_DDL
+
+# Any fixed key; pg_advisory_xact_lock serialises concurrent `migrations.py up` runs
+MIGRATION_LOCK_KEY = 7_340_001
+
+Migration = namedtuple("Migration", "version name up down")
+
+BASE_TABLES_DDL = """
+    CREATE TABLE IF NOT EXISTS prescription (
+        user_id INT,
+        upload_time TIMESTAMP,
+        medicine_name VARCHAR,
+        medicine_dosage VARCHAR,
+        num_of_times_per_day INT,
+        time_of_day VARCHAR
+    );
+    CREATE TABLE IF NOT EXISTS user_history (
+        user_id INT,
+        log_time TIMESTAMP,
+        medicine_name VARCHAR,
+        medicine_dosage VARCHAR,
+        day DATE,
+        time_of_day VARCHAR
+    );
+"""
+
+# prescription.time_of_day held "morning, night" strings that every reader
+# split in Python; times_of_day is the same list as a lowercase text[] so
+# matching happens in SQL (``'night' = ANY(times_of_day)``). The old column
+# is still written for anything reading it directly.
+NORMALIZE_TIMES_SQL = r"""
+    ALTER TABLE prescription ADD COLUMN IF NOT EXISTS times_of_day TEXT[] NOT NULL DEFAULT '{}';
+    UPDATE prescription
+    SET times_of_day = ARRAY(
+        SELECT DISTINCT lower(btrim(t))
+        FROM unnest(regexp_split_to_array(coalesce(time_of_day, ''), '\s*(,|\yand\y)\s*')) AS t
+        WHERE btrim(t) <> ''
+        ORDER BY 1
+    );
+"""
+
+# Before migration 7, log_time was the API server's naive local clock; since
+# then it is UTC. Rows written before 7 was applied are shifted to UTC from
+# LEGACY_LOG_TIMEZONE (the zone that server ran in). day and time_of_day were
+# already local and stay as they are.
+LEGACY_LOG_TIMEZONE = os.getenv("LEGACY_LOG_TIMEZONE", DEFAULT_TIMEZONE)
+
+LEGACY_LOG_TIMES_SQL = """
+    UPDATE user_history
+    SET log_time = (log_time AT TIME ZONE %(source)s) AT TIME ZONE %(target)s
+    WHERE log_time AT TIME ZONE %(source)s < coalesce(
+        (SELECT applied_at AT TIME ZONE current_setting('TimeZone') FROM schema_migrations WHERE version = 7),
+        now())
+"""
+
+
+def convert_legacy_log_times(cur):
+    cur.execute(LEGACY_LOG_TIMES_SQL, {"source": LEGACY_LOG_TIMEZONE, "target": "UTC"})
+
+
+def restore_legacy_log_times(cur):
+    cur.execute(LEGACY_LOG_TIMES_SQL, {"source": "UTC", "target": LEGACY_LOG_TIMEZONE})
+
+
+MIGRATIONS = [
+    Migration(1, "base tables", BASE_TABLES_DDL, None),
+    Migration(2, "dashboard, compliance and interaction tables",
+              SUMMARY_TABLES_DDL + COMPLIANCE_TABLES_DDL + INTERACTION_TABLE_DDL + ";", None),
+    # Locked so no duplicate dose lands between the dedupe and the key
+    Migration(3, "one user_history row per dose",
+              "LOCK TABLE user_history IN SHARE ROW EXCLUSIVE MODE;" + DEDUPE_HISTORY_SQL + ";" + HISTORY_DOSE_KEY_DDL,
+              "DROP INDEX IF EXISTS user_history_dose_key"),
+    Migration(4, "lookup indexes", """
+        -- verification and prescription index: one user's rows for one medicine
+        CREATE INDEX IF NOT EXISTS prescription_user_medicine ON prescription (user_id, medicine_name);
+        -- history pages: keyset on (log_time, medicine_name) newest first, per user
+        CREATE INDEX IF NOT EXISTS user_history_user_log_time
+            ON user_history (user_id, log_time DESC, medicine_name DESC);
+    """, """
+        DROP INDEX IF EXISTS prescription_user_medicine;
+        DROP INDEX IF EXISTS user_history_user_log_time;
+    """),
+    Migration(5, "prescription times of day as text[]", NORMALIZE_TIMES_SQL,
+              "ALTER TABLE prescription DROP COLUMN IF EXISTS times_of_day"),
+    Migration(6, "user_history partitioned by month", partition_user_history, unpartition_user_history),
+    Migration(7, "per-user timezones", USER_TIMEZONES_DDL, "DROP TABLE IF EXISTS user_timezones"),
+    Migration(8, "user_history.log_time in UTC", convert_legacy_log_times, restore_legacy_log_times),
+    Migration(9, "per-user data versions", USER_VERSIONS_DDL, "DROP TABLE IF EXISTS user_versions"),
+]
+
+SCHEMA_MIGRATIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT now()
+    )
+"""
+
+
+def _lock(cur):
+    cur.execute(SCHEMA_MIGRATIONS_DDL)
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+
+
+def _run(cur, step):
+    if callable(step):
+        step(cur)
+    else:
+        cur.execute(step)
+
+
+def applied_versions():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(SCHEMA_MIGRATIONS_DDL)
+        cur.execute("SELECT version FROM schema_migrations")
+        versions = {row[0] for row in cur.fetchall()}
+        cur.close()
+    return versions
+
+
+def current_version():
+    return max(applied_versions(), default=0)
+
+
+def migrate(to=None):
+    """Apply pending migrations up to ``to`` (all if None); returns the versions applied"""
+    applied = []
+    for migration in MIGRATIONS:
+        if to is not None and migration.version > to:
+            break
+        with get_connection() as conn:
+            cur = conn.cursor()
+            _lock(cur)
+            # Re-check under the lock: another migrator may have just applied it
+            cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (migration.version,))
+            if cur.fetchone() is None:
+                _run(cur, migration.up)
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                            (migration.version, migration.name))
+                applied.append(migration.version)
+            cur.close()
+    return applied
+
+
+def rollback(to):
+    """Revert applied migrations above ``to``, newest first; returns the versions reverted"""
+    reverted = []
+    for migration in reversed(MIGRATIONS):
+        if migration.version <= to:
+            break
+        with get_connection() as conn:
+            cur = conn.cursor()
+            _lock(cur)
+            cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (migration.version,))
+            if cur.fetchone() is not None:
+                if migration.down is None:
+                    raise RuntimeError(f"migration {migration.version} ({migration.name}) is not reversible")
+                _run(cur, migration.down)
+                cur.execute("DELETE FROM schema_migrations WHERE version = %s", (migration.version,))
+                reverted.append(migration.version)
+            cur.close()
+    return reverted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply or inspect schema migrations")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("status", help="list migrations and whether each is applied")
+    up = subcommands.add_parser("up", help="apply pending migrations")
+    up.add_argument("--to", type=int, help="stop after this version")
+    down = subcommands.add_parser("down", help="revert migrations")
+    down.add_argument("--to", type=int, required=True, help="revert everything above this version")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        versions = applied_versions()
+        for migration in MIGRATIONS:
+            print(f"{'applied' if migration.version in versions else 'pending':<8} "
+                  f"{migration.version:>3}  {migration.name}")
+    elif args.command == "up":
+        print(f"Applied: {migrate(args.to) or 'nothing pending'}")
+    else:
+        print(f"Reverted: {rollback(args.to) or 'nothing to revert'}")
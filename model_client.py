@@ -0,0 +1,266 @@
+"""One process-wide Gemini client shared by every extraction and interaction call.
+
+Each call goes through, in order:
+
+* a circuit breaker: after ``MODEL_BREAKER_FAILURES`` consecutive upstream
+  failures, calls fail fast with ModelUnavailableError for
+  ``MODEL_BREAKER_RESET_SECONDS``; then one probe call is let through.
+* a cap of ``MODEL_MAX_IN_FLIGHT`` concurrent requests.
+* a token bucket of ``MODEL_RATE_PER_SECOND`` calls per second, with bursts
+  of up to ``MODEL_BURST``, so a burst of uploads queues here instead of
+  turning into 429s.
+* retries of throttling, 5xx, timeout and connection errors, with full
+  jitter backoff. No attempt starts after the call's ``MODEL_DEADLINE_SECONDS``.
+
+    client = get_model_client()
+    response = client.generate_content("medication_ocr", [image_part, prompt])
+
+Set MODEL_API_ENDPOINT (e.g. http://127.0.0.1:8090) to talk REST to a local
+fake server instead of Google; see benchmarks/fake_model_server.py.
+"""
+import os
+import random
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from metrics import Counter, Histogram, generate_content, register_collector
+
+load_dotenv()
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+MODEL_API_ENDPOINT = os.getenv("MODEL_API_ENDPOINT")
+MODEL_RATE_PER_SECOND = float(os.getenv("MODEL_RATE_PER_SECOND", "5"))
+MODEL_BURST = int(os.getenv("MODEL_BURST", "10"))
+MODEL_MAX_IN_FLIGHT = int(os.getenv("MODEL_MAX_IN_FLIGHT", "8"))
+# Per attempt, and for the whole call including queueing and retries
+MODEL_TIMEOUT_SECONDS = float(os.getenv("MODEL_TIMEOUT_SECONDS", "30"))
+MODEL_DEADLINE_SECONDS = float(os.getenv("MODEL_DEADLINE_SECONDS", "60"))
+MODEL_MAX_ATTEMPTS = int(os.getenv("MODEL_MAX_ATTEMPTS", "4"))
+MODEL_RETRY_BASE_SECONDS = float(os.getenv("MODEL_RETRY_BASE_SECONDS", "0.5"))
+MODEL_RETRY_MAX_SECONDS = float(os.getenv("MODEL_RETRY_MAX_SECONDS", "8"))
+MODEL_BREAKER_FAILURES = int(os.getenv("MODEL_BREAKER_FAILURES", "5"))
+MODEL_BREAKER_RESET_SECONDS = float(os.getenv("MODEL_BREAKER_RESET_SECONDS", "30"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+MODEL_ATTEMPTS = Counter(
+    "medsafe_model_attempts_total", "Model requests sent, by outcome", ["call", "outcome"])
+MODEL_REJECTED = Counter(
+    "medsafe_model_rejected_total", "Model calls failed without a response, by reason", ["call", "reason"])
+MODEL_WAIT_SECONDS = Histogram(
+    "medsafe_model_wait_seconds", "Time a model call waited for an in-flight slot and a rate token", ["call"])
+
+
+class ModelUnavailableError(Exception):
+    """The model can't be reached right now (breaker open, deadline passed or retries exhausted)"""
+
+    def __init__(self, message, reason):
+        self.reason = reason
+        super().__init__(message)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, deadline):
+        """Take one token, sleeping until one is free; False if that would pass ``deadline``"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        """Open and still cooling down; a cheap check that doesn't claim the half-open probe"""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self._opened_at < self.reset_seconds
+
+    def allow(self):
+        """Whether a request may go out now; while half open, only one probe at a time"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """A request ended without telling us anything about upstream health (e.g. a 400)"""
+        with self._lock:
+            self._probing = False
+
+
+class ModelClient:
+    def __init__(self, model, retryable=(), rate=MODEL_RATE_PER_SECOND, burst=MODEL_BURST,
+                 max_in_flight=MODEL_MAX_IN_FLIGHT, timeout=MODEL_TIMEOUT_SECONDS,
+                 deadline=MODEL_DEADLINE_SECONDS, max_attempts=MODEL_MAX_ATTEMPTS,
+                 breaker_failures=MODEL_BREAKER_FAILURES, breaker_reset=MODEL_BREAKER_RESET_SECONDS):
+        self.model = model
+        self.retryable = tuple(retryable)
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self.max_in_flight = max_in_flight
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._in_flight = 0
+        self._count_lock = threading.Lock()
+
+    def _reject(self, call, reason, message):
+        MODEL_REJECTED.inc(call=call, reason=reason)
+        return ModelUnavailableError(message, reason)
+
+    def _attempt(self, call, contents, deadline, kwargs):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=max(0.0, deadline - start)):
+            raise self._reject(call, "in_flight", f"{call}: no free model slot before the deadline")
+        try:
+            if self.breaker.is_open():
+                raise self._reject(call, "circuit_open", f"{call}: model circuit is open after repeated failures")
+            if not self.bucket.acquire(deadline):
+                raise self._reject(call, "rate_limited", f"{call}: rate limit leaves no room before the deadline")
+            MODEL_WAIT_SECONDS.observe(time.monotonic() - start, call=call)
+            # Checked again after queueing: the breaker may have opened while we waited
+            if not self.breaker.allow():
+                raise self._reject(call, "circuit_open", f"{call}: model circuit is open after repeated failures")
+            with self._count_lock:
+                self._in_flight += 1
+            try:
+                # retry=None: the SDK's own retry (up to 10 minutes on a 503) would ignore our deadline
+                request_options = {"timeout": max(0.1, min(self.timeout, deadline - time.monotonic())), "retry": None}
+                return generate_content(self.model, call, contents, request_options=request_options, **kwargs)
+            finally:
+                with self._count_lock:
+                    self._in_flight -= 1
+        finally:
+            self._slots.release()
+
+    def generate_content(self, call, contents, **kwargs):
+        """``model.generate_content(contents, **kwargs)`` behind the limits; metrics are labelled ``call``"""
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(1, self.max_attempts + 1):
+            if self.breaker.is_open():
+                raise self._reject(call, "circuit_open", f"{call}: model circuit is open after repeated failures")
+            try:
+                response = self._attempt(call, contents, deadline, kwargs)
+            except ModelUnavailableError:
+                raise
+            except self.retryable as e:
+                MODEL_ATTEMPTS.inc(call=call, outcome="retryable_error")
+                self.breaker.record_failure()
+                # Full jitter: spreads retries from a burst instead of replaying it
+                backoff = random.uniform(0, min(MODEL_RETRY_MAX_SECONDS, MODEL_RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
+                if attempt == self.max_attempts or time.monotonic() + backoff >= deadline:
+                    raise self._reject(call, "retries_exhausted", f"{call}: model unavailable after {attempt} attempts: {e}")
+                time.sleep(backoff)
+            except Exception:
+                MODEL_ATTEMPTS.inc(call=call, outcome="error")
+                self.breaker.release()
+                raise
+            else:
+                MODEL_ATTEMPTS.inc(call=call, outcome="ok")
+                self.breaker.record_success()
+                return response
+
+    def in_flight(self):
+        with self._count_lock:
+            return self._in_flight
+
+
+def _retryable_errors():
+    """Throttling, server-side and transport failures; anything else (bad request, auth) is final"""
+    import requests
+    from google.api_core import exceptions
+    return (exceptions.TooManyRequests, exceptions.ResourceExhausted, exceptions.InternalServerError,
+            exceptions.BadGateway, exceptions.ServiceUnavailable, exceptions.GatewayTimeout,
+            exceptions.DeadlineExceeded, requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+            ConnectionError, TimeoutError)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_model_client():
+    """The shared client, configured on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                # Imported here, not at module import, so the API process starts without the SDK
+                import google.generativeai as genai
+                if MODEL_API_ENDPOINT:
+                    genai.configure(api_key=os.getenv("API_KEY"), transport="rest",
+                                    client_options={"api_endpoint": MODEL_API_ENDPOINT})
+                else:
+                    genai.configure(api_key=os.getenv("API_KEY"))
+                _client = ModelClient(genai.GenerativeModel(GEMINI_MODEL), _retryable_errors())
+    return _client
+
+
+def _collect_client_metrics():
+    if _client is None:
+        return []
+    state = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[_client.breaker.state]
+    return [
+        ("medsafe_model_in_flight", "gauge", "Model requests currently outstanding",
+         [({}, _client.in_flight())]),
+        ("medsafe_model_rate_tokens", "gauge", "Model calls the rate limiter would allow right now",
+         [({}, round(_client.bucket.available(), 2))]),
+        ("medsafe_model_circuit_state", "gauge", "Model circuit breaker: 0 closed, 1 half open, 2 open",
+         [({}, state)]),
+    ]
+
+
+register_collector(_collect_client_metrics)
@@ -0,0 +1,93 @@
+"""Count loose pills locally with OpenCV.
+
+Two independent estimates are made on a downscaled grayscale copy:
+
+* segmentation - Otsu threshold against the background, morphological
+  clean-up, then contours of pill-sized blobs (very large blobs such as the
+  bottle, and specks, are dropped relative to the median blob);
+* Hough circles - round pills show up as circles of similar radius.
+
+Confidence combines how uniform the blob sizes are with how well the two
+estimates agree. Both are trivially perfect for a single object (one blob
+is "uniform", one blob and one circle "agree"), so unless both detectors
+find at least two objects it is capped at ``SINGLE_OBJECT_MAX_CONFIDENCE``,
+below the default threshold. Callers only fall back to the model's count when the
+confidence is below ``PILL_COUNT_MIN_CONFIDENCE``.
+"""
+import os
+
+import cv2
+import numpy as np
+
+PILL_COUNT_MIN_CONFIDENCE = float(os.getenv("PILL_COUNT_MIN_CONFIDENCE", "0.8"))
+SINGLE_OBJECT_MAX_CONFIDENCE = 0.5
+WORKING_WIDTH = 800
+
+
+def _load_gray(image):
+    if isinstance(image, (bytes, bytearray)):
+        image = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Failed to decode image.")
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    scale = WORKING_WIDTH / gray.shape[1]
+    if scale < 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.GaussianBlur(gray, (5, 5), 0)
+
+
+def _segment_blobs(gray):
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Pills are the minority of the frame; make them the white foreground
+    if cv2.countNonZero(mask) > mask.size / 2:
+        mask = cv2.bitwise_not(mask)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel, iterations=2)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    areas = np.array([cv2.contourArea(c) for c in contours], dtype=float)
+    areas = areas[areas > gray.size * 0.0002]
+    if areas.size == 0:
+        return areas
+    median = np.median(areas)
+    return areas[(areas > median * 0.3) & (areas < median * 3)]
+
+
+def _hough_count(gray, areas):
+    if areas.size:
+        radius = int(np.sqrt(np.median(areas) / np.pi))
+        min_radius, max_radius = max(3, int(radius * 0.6)), int(radius * 1.5) + 1
+    else:
+        min_radius, max_radius = 5, gray.shape[1] // 8
+    circles = cv2.HoughCircles(gray, cv2.HOUGH_GRADIENT, dp=1.2, minDist=max(min_radius * 2, 1),
+                               param1=100, param2=30, minRadius=min_radius, maxRadius=max_radius)
+    return 0 if circles is None else circles.shape[1]
+
+
+def count_pills(image):
+    """Return ``(count, confidence)`` for raw image bytes or a decoded BGR array"""
+    gray = _load_gray(image)
+    areas = _segment_blobs(gray)
+    contour_count = int(areas.size)
+    hough_count = _hough_count(gray, areas)
+
+    if contour_count == 0:
+        # Nothing pill-like segmented: could be zero pills or a busy background
+        return 0, 0.5 if hough_count == 0 else 0.0
+
+    size_uniformity = max(0.0, 1.0 - float(np.std(areas) / np.mean(areas)))
+    agreement = 1.0 - abs(contour_count - hough_count) / max(contour_count, hough_count)
+    # Oblong tablets defeat Hough; trust uniform segmentation more than circle agreement
+    confidence = 0.6 * size_uniformity + 0.4 * agreement
+    if min(contour_count, hough_count) < 2:
+        confidence = min(confidence, SINGLE_OBJECT_MAX_CONFIDENCE)
+    return contour_count, round(confidence, 3)
+
+
+def count_pills_if_confident(image, min_confidence=PILL_COUNT_MIN_CONFIDENCE):
+    """The local count when confident enough to skip the model, else None"""
+    try:
+        count, confidence = count_pills(image)
+    except (ValueError, cv2.error):
+        return None
+    return count if confidence >= min_confidence else None
@@ -0,0 +1,284 @@
+"""Repository backed by the shared Postgres (db.get_connection's pool).
+
+Medication logs and prescription uploads also keep the dashboard summaries,
+compliance rollups and the user's row in user_versions current in the same
+transaction.
+"""
+import psycopg2
+from psycopg2.extras import execute_values
+
+from compliance import ensure_compliance_tables, record_dose_taken, record_schedules
+from dashboard_summary import ensure_summary_tables, record_medication_taken, record_prescriptions
+from db import execute_prepared, get_connection
+from repository import ALREADY_TAKEN, LOGGED, NOT_PRESCRIBED, Repository
+
+# Rows fetched per keyset query when streaming history
+HISTORY_STREAM_BATCH = 500
+
+HISTORY_COLUMNS = """
+    log_time::text AS log_time, medicine_name, medicine_dosage, day::text as day, time_of_day
+"""
+
+# One dose per user, day, time of day and medicine; ON CONFLICT in
+# LOG_MEDICATION_SQL relies on it, which also closes the check-then-insert
+# race between two concurrent submissions of the same dose. Created by
+# migration 3 (after DEDUPE_HISTORY_SQL), never from the request path
+HISTORY_DOSE_KEY_DDL = """
+    CREATE UNIQUE INDEX IF NOT EXISTS user_history_dose_key
+    ON user_history (user_id, day, time_of_day, medicine_name)
+"""
+
+# Keep the earliest log of each dose; only needed once, before the key exists
+DEDUPE_HISTORY_SQL = """
+    DELETE FROM user_history h
+    USING (
+        SELECT ctid, ROW_NUMBER() OVER (
+            PARTITION BY user_id, day, time_of_day, medicine_name ORDER BY log_time, ctid
+        ) AS n
+        FROM user_history
+    ) d
+    WHERE h.ctid = d.ctid AND d.n > 1
+"""
+
+# Returns (prescribed, inserted). Nothing is written unless one of the
+# prescribed spellings in $7 covers that time of day; the dose is logged
+# under $3. A second log of the same dose is a no-op.
+LOG_MEDICATION_SQL = """
+    WITH prescribed AS (
+        SELECT EXISTS (
+            SELECT 1 FROM prescription
+            WHERE user_id = $1::int AND medicine_name = ANY($7::varchar[])
+            AND $6::text = ANY(times_of_day)
+        ) AS ok
+    ),
+    logged AS (
+        INSERT INTO user_history (user_id, log_time, medicine_name, medicine_dosage, day, time_of_day)
+        SELECT $1::int, $2::timestamp, $3::varchar, $4::varchar, $5::date, $6::varchar
+        FROM prescribed WHERE ok
+        ON CONFLICT (user_id, day, time_of_day, medicine_name) DO NOTHING
+        RETURNING 1
+    )
+    SELECT (SELECT ok FROM prescribed), EXISTS (SELECT 1 FROM logged)
+"""
+
+# One row per user, bumped in the same transaction as every write to their
+# prescriptions, history or timezone, so a write from any process (the API,
+# CLI uploads, bulk_ingest.py) is visible to every other process's response
+# cache, prescription index and dashboard streams on their next read.
+# prescriptions_version only moves with prescription uploads. Created by migration 9
+USER_VERSIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS user_versions (
+        user_id INT PRIMARY KEY,
+        version BIGINT NOT NULL,
+        prescriptions_version BIGINT NOT NULL
+    )
+"""
+
+BUMP_USER_VERSION_SQL = """
+    INSERT INTO user_versions (user_id, version, prescriptions_version) VALUES (%s, 1, %s)
+    ON CONFLICT (user_id) DO UPDATE
+    SET version = user_versions.version + 1,
+        prescriptions_version = user_versions.prescriptions_version + EXCLUDED.prescriptions_version
+"""
+
+
+def bump_user_versions(cur, user_ids, prescriptions=False):
+    """Inside the caller's transaction; in user_id order so concurrent batches can't deadlock"""
+    for user_id in sorted(set(user_ids)):
+        cur.execute(BUMP_USER_VERSION_SQL, (user_id, int(prescriptions)))
+
+
+def log_medication(cur, user_id, log_time, medicine_name, medicine_dosage, day, time_of_day,
+                   prescribed_names=None):
+    """Verify and insert one dose in a single round trip, inside the caller's transaction"""
+    execute_prepared(cur, "log_medication", LOG_MEDICATION_SQL,
+                     (user_id, log_time, medicine_name, medicine_dosage, day, time_of_day,
+                      list(prescribed_names or [medicine_name])))
+    prescribed, inserted = cur.fetchone()
+    if not prescribed:
+        return NOT_PRESCRIBED
+    return LOGGED if inserted else ALREADY_TAKEN
+
+
+def insert_prescription_rows(cur, rows):
+    """Multi-row insert plus summary upkeep, inside the caller's transaction"""
+    if not rows:
+        return
+    execute_values(cur, """
+        INSERT INTO prescription
+          (user_id, upload_time,
+           medicine_name, medicine_dosage,
+           num_of_times_per_day, time_of_day, times_of_day)
+        VALUES %s
+    """, rows, template="(%s, %s, %s, %s, %s, %s, %s::text[])")
+    record_prescriptions(cur, [(user_id, medicine_name)
+                               for user_id, _, medicine_name, *_ in rows])
+    record_schedules(cur, [(user_id, medicine_name, num_of_times_per_day, upload_time)
+                           for user_id, upload_time, medicine_name, _, num_of_times_per_day, *_ in rows])
+    bump_user_versions(cur, [row[0] for row in rows], prescriptions=True)
+
+
+def _history_filters(user_id, start_day, end_day, after):
+    clauses = ["user_id = %(user_id)s"]
+    params = {"user_id": user_id}
+    if start_day is not None:
+        clauses.append("day >= %(start_day)s::date")
+        params["start_day"] = start_day
+    if end_day is not None:
+        clauses.append("day <= %(end_day)s::date")
+        params["end_day"] = end_day
+    if after is not None:
+        # Keyset pagination: newest first, resume strictly after the last row seen
+        params["cursor_time"], params["cursor_name"] = after
+        clauses.append("(log_time, medicine_name) < (%(cursor_time)s::timestamp, %(cursor_name)s)")
+        # Implied by the keyset (day is the log's local date, at most a day
+        # past its UTC log_time), but lets the planner skip newer months
+        clauses.append("day <= %(cursor_time)s::timestamp::date + 1")
+    return " AND ".join(clauses), params
+
+
+class PostgresRepository(Repository):
+    name = "postgres"
+    errors = (psycopg2.Error,)
+
+    def prepare(self):
+        from history_partitions import ensure_history_partitions
+        with get_connection() as conn:
+            cur = conn.cursor()
+            # Every log and upload writes these; IF NOT EXISTS, so a fresh deploy works before any rebuild
+            ensure_summary_tables(cur)
+            ensure_compliance_tables(cur)
+            cur.execute("SELECT to_regclass('user_history_dose_key'), to_regclass('user_versions')")
+            ready = None not in cur.fetchone()
+            cur.close()
+        if not ready:
+            raise RuntimeError("schema is missing the dose key or user_versions; run `python migrations.py up` first")
+        return ensure_history_partitions()
+
+    def active_prescription_count(self, user_id):
+        # Single-row lookup; kept up to date by dashboard_summary.record_prescription
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                        SELECT active_prescriptions
+                        FROM prescription_summary
+                        WHERE user_id = %s""", (user_id,))
+            row = cur.fetchone()
+            cur.close()
+        return row[0] if row else 0
+
+    def medicines_taken_on(self, user_id, day):
+        # Single-row lookup; kept up to date by dashboard_summary.record_medication_taken
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                        SELECT medicines_taken
+                        FROM daily_medication_summary
+                        WHERE user_id = %s
+                        AND day = %s""", (user_id, day))
+            row = cur.fetchone()
+            cur.close()
+        return row[0] if row else 0
+
+    def prescribed_times(self, user_id):
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                        SELECT medicine_name, times_of_day
+                        FROM prescription
+                        WHERE user_id = %s
+                        """, (user_id,))
+            results = cur.fetchall()
+            cur.close()
+
+        index = {}
+        for medicine_name, times_of_day in results:
+            index.setdefault(medicine_name, set()).update(times_of_day)
+        return {name: frozenset(times) for name, times in index.items()}
+
+    def dose_taken(self, user_id, day, time_of_day, medicine_name):
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                        SELECT EXISTS (
+                            SELECT 1
+                            FROM user_history
+                            WHERE user_id = %s AND day = %s AND time_of_day = %s AND medicine_name = %s
+                        )
+                        """,
+                        (user_id, day, time_of_day, medicine_name))
+            already_taken = cur.fetchone()[0]
+            cur.close()
+        return already_taken
+
+    def history_page(self, user_id, start_day=None, end_day=None, after=None, limit=100):
+        where, params = _history_filters(user_id, start_day, end_day, after)
+        params["limit"] = limit
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"""
+                        SELECT {HISTORY_COLUMNS}
+                        FROM user_history
+                        WHERE {where}
+                        ORDER BY user_history.log_time DESC, medicine_name DESC
+                        LIMIT %(limit)s""", params)
+            rows = cur.fetchall()
+            cur.close()
+        return rows
+
+    def iter_history(self, user_id, start_day=None, end_day=None, after=None):
+        # A keyset query per batch rather than a server-side cursor: each batch
+        # checks a pooled connection out and back in, so a slow client reading
+        # a long stream holds no connection or transaction between batches
+        while True:
+            rows = self.history_page(user_id, start_day, end_day, after, HISTORY_STREAM_BATCH)
+            yield from rows
+            if len(rows) < HISTORY_STREAM_BATCH:
+                return
+            after = (rows[-1][0], rows[-1][1])
+
+    def add_prescriptions(self, rows):
+        with get_connection() as conn:
+            cur = conn.cursor()
+            insert_prescription_rows(cur, rows)
+            cur.close()
+
+    def log_medication(self, user_id, log_time, medicine_name, medicine_dosage, day, time_of_day,
+                       prescribed_names=None):
+        with get_connection() as conn:
+            cur = conn.cursor()
+            outcome = log_medication(cur, user_id, log_time, medicine_name, medicine_dosage, day, time_of_day,
+                                     prescribed_names)
+            if outcome == LOGGED:
+                record_medication_taken(cur, user_id, day, medicine_name)
+                record_dose_taken(cur, user_id, day, medicine_name)
+                bump_user_versions(cur, [user_id])
+            cur.close()
+        return outcome
+
+    def get_timezone(self, user_id):
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT timezone FROM user_timezones WHERE user_id = %s", (user_id,))
+            row = cur.fetchone()
+            cur.close()
+        return row[0] if row else None
+
+    def set_timezone(self, user_id, timezone):
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                        INSERT INTO user_timezones (user_id, timezone) VALUES (%s, %s)
+                        ON CONFLICT (user_id) DO UPDATE SET timezone = EXCLUDED.timezone
+                        """, (user_id, timezone))
+            # "Today" may now be a different day
+            bump_user_versions(cur, [user_id])
+            cur.close()
+
+    def data_versions(self, user_id):
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT version, prescriptions_version FROM user_versions WHERE user_id = %s", (user_id,))
+            row = cur.fetchone()
+            cur.close()
+        return tuple(row) if row else (0, 0)
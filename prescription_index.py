@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from medication_names import NameIndex
+from metrics import register_collector
+from repository import get_repository
+
+INDEX_TTL_SECONDS = float(os.getenv("PRESCRIPTION_INDEX_TTL", "300"))
+INDEX_MAX_USERS = int(os.getenv("PRESCRIPTION_INDEX_MAX_USERS", "10000"))
+
+
+def load_user_prescriptions(user_id):
+    """Read one user's prescription rows into {medicine_name: frozenset(times)}"""
+    return get_repository().prescribed_times(user_id)
+
+
+def prescriptions_version(user_id):
+    """Moves whenever any process commits prescriptions for the user"""
+    return get_repository().data_versions(user_id)[1]
+
+
+class PrescriptionIndex:
+    """Per-user cache of medicine -> allowed times of day, plus a NameIndex over
+    the medicine names for matching what the model read off a label.
+
+    Entries expire after ``ttl`` seconds and the least recently used user is
+    evicted once ``max_users`` entries are held, so memory stays bounded.
+    With ``version``, every lookup first reads the user's prescriptions
+    version (one primary-key query) and reloads when it moved, so uploads
+    from other processes are seen at once. Writers in this process may also
+    call ``invalidate(user_id)`` after committing new prescription rows.
+    """
+
+    def __init__(self, loader=load_user_prescriptions, ttl=INDEX_TTL_SECONDS,
+                 max_users=INDEX_MAX_USERS, version=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.max_users = max_users
+        self.version = version
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped on every invalidation so a load that raced with a write
+        # doesn't put the stale result back into the cache
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, user_id):
+        # Read before loading: a write committed in between leaves the entry one version behind
+        version = self.version(user_id) if self.version is not None else None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[0] < self.ttl and entry[3] == version:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            generation = self._generation
+
+        # Load (and build the name index) outside the lock so one slow query doesn't stall other users
+        index = self.loader(user_id)
+        entry = (time.monotonic(), index, NameIndex(index), version)
+        with self._lock:
+            if generation != self._generation:
+                return entry
+            self._entries[user_id] = entry
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return entry
+
+    def get(self, user_id):
+        return self._entry(user_id)[1]
+
+    def match_medicine(self, user_id, medicine_name):
+        """The user's prescribed name closest to ``medicine_name`` as a NameMatch, or None"""
+        return self._entry(user_id)[2].match(medicine_name)
+
+    def is_prescribed(self, user_id, medicine_name, time_of_day):
+        _, index, names, _ = self._entry(user_id)
+        match = names.match(medicine_name)
+        # Any spelling of the medicine counts: "Tylenol" morning and "acetaminophen" night
+        return match is not None and any(time_of_day in index[name] for name in match.names)
+
+    def invalidate(self, user_id=None):
+        """Drop one user's entry, or everything when ``user_id`` is None"""
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"users": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+prescription_index = PrescriptionIndex(version=prescriptions_version)
+
+
+def _collect_index_metrics():
+    stats = prescription_index.stats()
+    return [
+        ("medsafe_prescription_index_lookups_total", "counter", "Prescription index lookups by outcome",
+         [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])]),
+        ("medsafe_prescription_index_users", "gauge", "Users currently held in the prescription index",
+         [({}, stats["users"])]),
+    ]
+
+
+register_collector(_collect_index_metrics)
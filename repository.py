@@ -0,0 +1,120 @@
+"""Storage behind one interface, so the API can run on Postgres or a local SQLite file.
+
+    STORAGE_BACKEND=postgres   # default: the shared Postgres in DB_CONFIG
+    STORAGE_BACKEND=sqlite     # embedded file at SQLITE_DB_PATH (WAL), no network hop
+
+The dashboard, history, verification, upload and timezone modules call
+``get_repository()`` instead of opening database connections themselves.
+Both backends keep the same guarantees: one row per dose (user, day, time
+of day, medicine), the prescription check and insert of a log happen
+atomically, every write bumps the user's data version in the same
+transaction, and history is returned newest first as
+``(log_time, medicine_name, medicine_dosage, day, time_of_day)`` strings.
+
+Compliance rollups, the interaction cache and partition maintenance are
+Postgres-only and are not part of this interface. With SQLite, /compliance
+answers 501 and the interaction check on log defaults to off.
+"""
+import os
+import threading
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "postgres")
+
+LOGGED, NOT_PRESCRIBED, ALREADY_TAKEN = "LOGGED", "NOT_PRESCRIBED", "ALREADY_TAKEN"
+
+
+class Repository:
+    """What the application needs from storage; see PostgresRepository and SQLiteRepository"""
+
+    name = None
+    # The driver's exception classes, for callers that report database errors
+    errors = ()
+
+    def prepare(self):
+        """Startup housekeeping (schema, upcoming partitions); returns a list of what it created"""
+        return []
+
+    def active_prescription_count(self, user_id):
+        """Distinct medicines on the user's prescriptions"""
+        raise NotImplementedError
+
+    def medicines_taken_on(self, user_id, day):
+        """Distinct medicines logged on the user's local ``day``"""
+        raise NotImplementedError
+
+    def prescribed_times(self, user_id):
+        """{medicine_name: frozenset(times of day)} from the user's prescriptions"""
+        raise NotImplementedError
+
+    def dose_taken(self, user_id, day, time_of_day, medicine_name):
+        raise NotImplementedError
+
+    def history_page(self, user_id, start_day=None, end_day=None, after=None, limit=100):
+        """Up to ``limit`` rows newest first; ``after`` is the (log_time, medicine_name) to resume below"""
+        raise NotImplementedError
+
+    def iter_history(self, user_id, start_day=None, end_day=None, after=None):
+        """Like history_page without a limit, yielding rows without loading them all"""
+        raise NotImplementedError
+
+    def add_prescriptions(self, rows):
+        """Insert update_prescription.prescription_rows() tuples in one transaction"""
+        raise NotImplementedError
+
+    def log_medication(self, user_id, log_time, medicine_name, medicine_dosage, day, time_of_day,
+                       prescribed_names=None):
+        """Verify and insert one dose atomically; returns LOGGED, NOT_PRESCRIBED or ALREADY_TAKEN.
+
+        The dose counts as prescribed if any of ``prescribed_names`` (default: just
+        ``medicine_name``) is prescribed for ``time_of_day``; it is logged as ``medicine_name``.
+        """
+        raise NotImplementedError
+
+    def get_timezone(self, user_id):
+        """The user's stored IANA timezone name, or None"""
+        raise NotImplementedError
+
+    def set_timezone(self, user_id, timezone):
+        raise NotImplementedError
+
+    def data_versions(self, user_id):
+        """(version, prescriptions_version) for the user, (0, 0) before any write.
+
+        Every write above bumps ``version`` in its own transaction; prescription
+        uploads also bump ``prescriptions_version``. Caches in any process compare
+        these instead of relying on the writer to tell them.
+        """
+        raise NotImplementedError
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def create_repository(backend=None):
+    backend = backend or STORAGE_BACKEND
+    # Imported on demand: a SQLite deployment never loads the Postgres repository or opens a connection
+    if backend == "postgres":
+        from postgres_repository import PostgresRepository
+        return PostgresRepository()
+    if backend == "sqlite":
+        from sqlite_repository import SQLiteRepository
+        return SQLiteRepository()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend!r} (expected 'postgres' or 'sqlite')")
+
+
+def get_repository():
+    """Process-wide repository for STORAGE_BACKEND, created on first use"""
+    global _repository
+    if _repository is None:
+        with _repository_lock:
+            if _repository is None:
+                _repository = create_repository()
+    return _repository
+
+
+def set_repository(repository):
+    """Swap the process-wide repository (benchmarks and parity runs)"""
+    global _repository
+    with _repository_lock:
+        _repository = repository
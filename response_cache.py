@@ -0,0 +1,95 @@
+"""Per-user data versions, ETags and an in-process cache of read responses.
+
+Every write to a user's prescriptions, history or timezone bumps that
+user's version in storage, in the same transaction as the write (see
+Repository.data_versions), whichever process made it. Read endpoints key
+their serialized JSON on (user, endpoint, parameters, version), so while
+nothing changes:
+
+* a client sending the last ETag in ``If-None-Match`` gets a 304, and
+* any other client gets the cached bytes,
+
+both at the cost of one primary-key lookup instead of the endpoint's queries.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from metrics import register_collector
+from repository import get_repository
+
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+
+
+class ResponseCache:
+    """LRU of serialized responses; stale versions simply stop being looked up and age out"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+response_cache = ResponseCache()
+
+
+def user_version(user_id):
+    return get_repository().data_versions(user_id)[0]
+
+
+def cache_key(user_id, endpoint, *params):
+    """Key for the user's current version; read it before loading the data. Blocking (storage)"""
+    return (user_id, endpoint, params, user_version(user_id))
+
+
+def etag_for(key):
+    user_id, endpoint, params, version = key
+    digest = hashlib.sha1(json.dumps([endpoint, params], default=str).encode()).hexdigest()[:12]
+    return f'W/"{user_id}-{version}-{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: a W/ prefix on either side doesn't matter
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def _collect_cache_metrics():
+    return [
+        ("medsafe_response_cache_entries", "gauge", "Serialized read responses held in memory",
+         [({}, len(response_cache))]),
+        ("medsafe_response_cache_lookups_total", "counter", "Response cache lookups by result",
+         [({"result": "hit"}, response_cache.hits), ({"result": "miss"}, response_cache.misses)]),
+    ]
+
+
+register_collector(_collect_cache_metrics)
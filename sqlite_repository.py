@@ -0,0 +1,238 @@
+"""Repository backed by a local SQLite file, for single-site deployments.
+
+One connection per thread in WAL mode, so readers never wait for the writer
+and every query is a local function call instead of a network round trip.
+Writes take the database lock up front (``BEGIN IMMEDIATE``), which makes
+the prescription check and insert of a medication log atomic. Dashboard
+counts are computed from the indexed raw tables; at one site's volume that
+is cheaper than maintaining rollups.
+
+    STORAGE_BACKEND=sqlite SQLITE_DB_PATH=/var/lib/medsafe/medsafe.db uvicorn main:app
+"""
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from repository import ALREADY_TAKEN, LOGGED, NOT_PRESCRIBED, Repository
+
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "medsafe.db")
+# Rows per keyset query when streaming history
+HISTORY_STREAM_BATCH = 500
+
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS prescription (
+        user_id INTEGER NOT NULL,
+        upload_time TEXT,
+        medicine_name TEXT NOT NULL,
+        medicine_dosage TEXT,
+        num_of_times_per_day INTEGER,
+        time_of_day TEXT,
+        times_of_day TEXT NOT NULL DEFAULT '[]'
+    );
+    CREATE INDEX IF NOT EXISTS prescription_user_medicine ON prescription (user_id, medicine_name);
+    CREATE TABLE IF NOT EXISTS user_history (
+        user_id INTEGER NOT NULL,
+        log_time TEXT NOT NULL,
+        medicine_name TEXT NOT NULL,
+        medicine_dosage TEXT,
+        day TEXT NOT NULL,
+        time_of_day TEXT NOT NULL
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS user_history_dose_key
+        ON user_history (user_id, day, time_of_day, medicine_name);
+    CREATE INDEX IF NOT EXISTS user_history_user_log_time
+        ON user_history (user_id, log_time DESC, medicine_name DESC);
+    CREATE TABLE IF NOT EXISTS user_timezones (
+        user_id INTEGER PRIMARY KEY,
+        timezone TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS user_versions (
+        user_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL,
+        prescriptions_version INTEGER NOT NULL
+    );
+"""
+
+# See postgres_repository.USER_VERSIONS_DDL
+BUMP_USER_VERSION_SQL = """
+    INSERT INTO user_versions (user_id, version, prescriptions_version) VALUES (?, 1, ?)
+    ON CONFLICT (user_id) DO UPDATE
+    SET version = version + 1, prescriptions_version = prescriptions_version + excluded.prescriptions_version
+"""
+
+HISTORY_COLUMNS = "log_time, medicine_name, medicine_dosage, day, time_of_day"
+
+
+def _text(value):
+    """Dates and timestamps are stored as ISO text, which sorts chronologically"""
+    return None if value is None else str(value)
+
+
+def _history_filters(user_id, start_day, end_day, after):
+    clauses = ["user_id = ?"]
+    params = [user_id]
+    if start_day is not None:
+        clauses.append("day >= ?")
+        params.append(_text(start_day))
+    if end_day is not None:
+        clauses.append("day <= ?")
+        params.append(_text(end_day))
+    if after is not None:
+        clauses.append("(log_time, medicine_name) < (?, ?)")
+        params.extend((_text(after[0]), after[1]))
+    return " AND ".join(clauses), params
+
+
+class SQLiteRepository(Repository):
+    name = "sqlite"
+    errors = (sqlite3.Error,)
+
+    def __init__(self, path=SQLITE_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        with self._lock:
+            conn = self._connect()
+            conn.executescript(SCHEMA_SQL)
+
+    def _connect(self):
+        # isolation_level=None: no implicit transactions, writes say BEGIN IMMEDIATE themselves.
+        # check_same_thread=False only so close() may close it from another thread;
+        # each connection is still used by the one thread that opened it
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        self._connections.append(conn)
+        self._local.conn = conn
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self._lock:
+                conn = self._connect()
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def active_prescription_count(self, user_id):
+        return self._conn().execute(
+            "SELECT COUNT(DISTINCT medicine_name) FROM prescription WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+
+    def medicines_taken_on(self, user_id, day):
+        return self._conn().execute(
+            "SELECT COUNT(DISTINCT medicine_name) FROM user_history WHERE user_id = ? AND day = ?",
+            (user_id, _text(day)),
+        ).fetchone()[0]
+
+    def prescribed_times(self, user_id):
+        rows = self._conn().execute(
+            "SELECT medicine_name, times_of_day FROM prescription WHERE user_id = ?", (user_id,)
+        ).fetchall()
+        index = {}
+        for medicine_name, times_of_day in rows:
+            index.setdefault(medicine_name, set()).update(json.loads(times_of_day))
+        return {name: frozenset(times) for name, times in index.items()}
+
+    def dose_taken(self, user_id, day, time_of_day, medicine_name):
+        return bool(self._conn().execute("""
+            SELECT EXISTS (
+                SELECT 1 FROM user_history
+                WHERE user_id = ? AND day = ? AND time_of_day = ? AND medicine_name = ?
+            )
+        """, (user_id, _text(day), time_of_day, medicine_name)).fetchone()[0])
+
+    def history_page(self, user_id, start_day=None, end_day=None, after=None, limit=100):
+        where, params = _history_filters(user_id, start_day, end_day, after)
+        return self._conn().execute(f"""
+            SELECT {HISTORY_COLUMNS} FROM user_history
+            WHERE {where}
+            ORDER BY log_time DESC, medicine_name DESC
+            LIMIT ?
+        """, params + [limit]).fetchall()
+
+    def iter_history(self, user_id, start_day=None, end_day=None, after=None):
+        # A keyset query per batch rather than one open cursor: a streaming
+        # response may resume the generator on a different thread, and
+        # SQLite connections belong to the thread that opened them
+        while True:
+            rows = self.history_page(user_id, start_day, end_day, after, HISTORY_STREAM_BATCH)
+            yield from rows
+            if len(rows) < HISTORY_STREAM_BATCH:
+                return
+            after = (rows[-1][0], rows[-1][1])
+
+    def add_prescriptions(self, rows):
+        if not rows:
+            return
+        with self._write() as conn:
+            conn.executemany("""
+                INSERT INTO prescription
+                  (user_id, upload_time, medicine_name, medicine_dosage,
+                   num_of_times_per_day, time_of_day, times_of_day)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(user_id, _text(upload_time), medicine_name, medicine_dosage,
+                   num_of_times_per_day, time_of_day, json.dumps(list(times_of_day)))
+                  for user_id, upload_time, medicine_name, medicine_dosage,
+                  num_of_times_per_day, time_of_day, times_of_day in rows])
+            conn.executemany(BUMP_USER_VERSION_SQL, [(user_id, 1) for user_id in sorted({row[0] for row in rows})])
+
+    def log_medication(self, user_id, log_time, medicine_name, medicine_dosage, day, time_of_day,
+                       prescribed_names=None):
+        names = list(prescribed_names or [medicine_name])
+        with self._write() as conn:
+            prescribed = conn.execute(f"""
+                SELECT EXISTS (
+                    SELECT 1 FROM prescription, json_each(prescription.times_of_day) AS t
+                    WHERE prescription.user_id = ? AND prescription.medicine_name IN ({", ".join("?" * len(names))})
+                    AND t.value = ?
+                )
+            """, (user_id, *names, time_of_day)).fetchone()[0]
+            if not prescribed:
+                return NOT_PRESCRIBED
+            inserted = conn.execute("""
+                INSERT INTO user_history (user_id, log_time, medicine_name, medicine_dosage, day, time_of_day)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, day, time_of_day, medicine_name) DO NOTHING
+            """, (user_id, _text(log_time), medicine_name, medicine_dosage, _text(day), time_of_day)).rowcount
+            if inserted:
+                conn.execute(BUMP_USER_VERSION_SQL, (user_id, 0))
+        return LOGGED if inserted else ALREADY_TAKEN
+
+    def get_timezone(self, user_id):
+        row = self._conn().execute("SELECT timezone FROM user_timezones WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_timezone(self, user_id, timezone):
+        with self._write() as conn:
+            conn.execute("""
+                INSERT INTO user_timezones (user_id, timezone) VALUES (?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET timezone = excluded.timezone
+            """, (user_id, timezone))
+            conn.execute(BUMP_USER_VERSION_SQL, (user_id, 0))
+
+    def data_versions(self, user_id):
+        row = self._conn().execute(
+            "SELECT version, prescriptions_version FROM user_versions WHERE user_id = ?", (user_id,)).fetchone()
+        return tuple(row) if row else (0, 0)
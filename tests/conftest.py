@@ -0,0 +1,88 @@
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+# The modules live at the repository root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USER_TABLES = ("prescription", "user_history", "prescription_medicines", "prescription_summary",
+               "daily_medicines_taken", "daily_medication_summary", "compliance_schedule",
+               "compliance_daily", "user_timezones", "user_versions")
+
+
+def postgres_available():
+    if not all(os.getenv(name) for name in ("DB_HOST", "DB_USER", "DB_PASSWORD")):
+        return False
+    if os.getenv("DB_HOST") not in ("localhost", "127.0.0.1", "::1"):
+        return False  # never write test rows to a shared database
+    try:
+        from db import get_connection
+        with get_connection() as conn:
+            conn.cursor().execute("SELECT 1")
+    except Exception:
+        return False
+    return True
+
+
+def delete_user(user_id):
+    from db import get_connection
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for table in USER_TABLES:
+            cur.execute(f"DELETE FROM {table} WHERE user_id = %s", (user_id,))
+        cur.close()
+
+
+@pytest.fixture
+def postgres():
+    """A migrated local Postgres (skips without one); returns delete_user for cleaning up test users"""
+    if not postgres_available():
+        pytest.skip("no local Postgres configured")
+    from history_partitions import ensure_history_partitions
+    from migrations import migrate
+    migrate()
+    ensure_history_partitions(from_day=date.today() - timedelta(days=7))
+    return delete_user
+
+
+@pytest.fixture
+def scratch_postgres(monkeypatch):
+    """An empty, unmigrated database on the local Postgres that the pool points at for one test"""
+    if not postgres_available():
+        pytest.skip("no local Postgres configured")
+    import psycopg2
+    import db
+
+    name = f"medsafe_test_{os.getpid()}"
+    admin = psycopg2.connect(**db.DB_CONFIG)
+    admin.autocommit = True
+    admin.cursor().execute(f"DROP DATABASE IF EXISTS {name}")
+    admin.cursor().execute(f"CREATE DATABASE {name}")
+    monkeypatch.setitem(db.DB_CONFIG, "dbname", name)
+    monkeypatch.setattr(db, "_pool", None)
+    try:
+        yield name
+    finally:
+        if db._pool is not None:
+            db._pool.closeall()
+        admin.cursor().execute(f"DROP DATABASE IF EXISTS {name}")
+        admin.close()
+
+
+@pytest.fixture
+def sqlite_storage(tmp_path):
+    """Swap the process-wide repository for a fresh SQLite file for one test"""
+    import repository
+    import user_timezones
+    from sqlite_repository import SQLiteRepository
+
+    previous = repository._repository
+    repo = SQLiteRepository(str(tmp_path / "storage.db"))
+    repository.set_repository(repo)
+    user_timezones._cache.clear()
+    yield repo
+    repository.set_repository(previous)
+    user_timezones._cache.clear()
+    repo.close()
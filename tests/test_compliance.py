@@ -0,0 +1,64 @@
+"""Compliance rollups against a local Postgres (skipped without one)."""
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from update_prescription import prescription_rows
+
+USER_ID = 987_654_323
+TODAY = date.today()
+DAYS = [TODAY - timedelta(days=2), TODAY - timedelta(days=1), TODAY]
+
+MEDICATIONS = [
+    {"medication_name": "Aspirin", "dosage": "81mg", "frequency_per_day": 2, "times_of_day": ["morning", "night"]},
+    {"medication_name": "Ibuprofen", "dosage": "200mg", "frequency_per_day": 1, "times_of_day": ["afternoon"]},
+]
+
+# (day, medicine, time of day); nothing is logged on the last day
+DOSES = [
+    (DAYS[0], "Aspirin", "morning"),
+    (DAYS[0], "Aspirin", "night"),
+    (DAYS[0], "Ibuprofen", "afternoon"),
+    (DAYS[1], "Aspirin", "morning"),
+]
+
+
+@pytest.fixture
+def user(postgres):
+    from postgres_repository import PostgresRepository
+    postgres(USER_ID)
+    repo = PostgresRepository()
+    repo.add_prescriptions(prescription_rows(USER_ID, datetime.combine(DAYS[0], datetime.min.time()), MEDICATIONS))
+    for day, name, time_of_day in DOSES:
+        repo.log_medication(USER_ID, f"{day} 08:00:00", name, "1 pill", day, time_of_day)
+    yield USER_ID
+    postgres(USER_ID)
+
+
+def summary(user_id, **kwargs):
+    from compliance import get_compliance
+    result = get_compliance(user_id, end_day=TODAY, **kwargs)
+    return result["expected_doses"], result["taken_doses"]
+
+
+def test_window_totals(user):
+    assert summary(user, days=3) == (9, 4)
+    assert summary(user, days=1) == (3, 0)
+    # All time starts at the first prescription
+    assert summary(user) == (9, 4)
+    assert summary(user, days=3, medicine_name="Aspirin") == (6, 3)
+
+
+def test_trend_is_per_day_oldest_first(user):
+    from compliance import get_compliance_trend
+    trend = get_compliance_trend(user, days=4, end_day=TODAY)
+    assert [day["day"] for day in trend] == [str(day) for day in [DAYS[0] - timedelta(days=1), *DAYS]]
+    assert [(day["expected_doses"], day["taken_doses"]) for day in trend] == [(0, 0), (3, 3), (3, 1), (3, 0)]
+    assert trend[0]["compliance_rate"] == 0.0 and trend[1]["compliance_rate"] == 1.0
+
+
+def test_rebuild_matches_incremental_rollups(user):
+    from compliance import get_compliance_trend, rebuild_rollups
+    before = (summary(user, days=3), get_compliance_trend(user, days=3, end_day=TODAY))
+    rebuild_rollups([user])
+    assert (summary(user, days=3), get_compliance_trend(user, days=3, end_day=TODAY)) == before
@@ -0,0 +1,77 @@
+import asyncio
+import json
+import threading
+
+import dashboard_events
+import main
+from dashboard_events import DashboardEventBus
+
+
+def test_slow_subscriber_only_gets_the_newest_snapshot():
+    async def scenario():
+        bus = DashboardEventBus()
+        queue, _ = subscription = bus.subscribe(1)
+        for taken in range(1, 4):
+            bus.publish(1, {"todays_medication": taken})
+        await asyncio.sleep(0)
+        assert queue.qsize() == 1
+        assert queue.get_nowait() == {"todays_medication": 3}
+        bus.unsubscribe(1, subscription)
+        assert not bus.has_subscribers(1) and bus.subscriber_count() == 0
+
+    asyncio.run(scenario())
+
+
+def test_publish_from_worker_threads_reaches_each_users_loop():
+    async def scenario():
+        bus = DashboardEventBus()
+        (mine, _), (other, _) = bus.subscribe(1), bus.subscribe(2)
+        workers = [threading.Thread(target=bus.publish, args=(1, {"todays_medication": 5}))]
+        workers[0].start()
+        assert await asyncio.wait_for(mine.get(), 1) == {"todays_medication": 5}
+        workers[0].join()
+        assert other.empty()
+
+    asyncio.run(scenario())
+
+
+def test_notify_reads_the_dashboard_only_when_someone_is_watching(monkeypatch):
+    reads = []
+
+    def snapshot(user_id):
+        reads.append(user_id)
+        return {"active_prescriptions": 2, "todays_medication": 1}
+
+    monkeypatch.setattr(dashboard_events, "dashboard_snapshot", snapshot)
+    bus = DashboardEventBus()
+    monkeypatch.setattr(dashboard_events, "dashboard_events", bus)
+    dashboard_events.notify_dashboard_changed(1)
+    assert reads == []
+
+    async def scenario():
+        queue, _ = bus.subscribe(1)
+        await asyncio.get_running_loop().run_in_executor(None, dashboard_events.notify_dashboard_changed, 1)
+        return await asyncio.wait_for(queue.get(), 1)
+
+    assert asyncio.run(scenario()) == {"active_prescriptions": 2, "todays_medication": 1}
+    assert reads == [1]
+
+
+def test_stream_sends_everything_first_then_only_changes(monkeypatch):
+    bus = DashboardEventBus()
+    monkeypatch.setattr(main, "dashboard_events", bus)
+    monkeypatch.setattr(main, "dashboard_snapshot", lambda user_id: {"active_prescriptions": 2, "todays_medication": 0})
+    monkeypatch.setattr(main, "stream_state", lambda user_id: ("2025-01-01", 1))
+
+    async def scenario():
+        stream = main.dashboard_event_stream(1)
+        first = await anext(stream)
+        threading.Thread(target=bus.publish, args=(1, {"active_prescriptions": 2, "todays_medication": 1})).start()
+        second = await anext(stream)
+        await stream.aclose()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == 'event: dashboard\ndata: {"active_prescriptions": 2, "todays_medication": 0}\n\n'
+    assert json.loads(second.split("data: ")[1]) == {"todays_medication": 1}
+    assert bus.subscriber_count() == 0
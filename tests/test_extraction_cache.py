@@ -0,0 +1,75 @@
+import itertools
+
+import cv2
+import numpy as np
+import pytest
+
+import extraction_cache
+from extraction_cache import ExtractionCache, perceptual_hash
+
+
+def label(seed, brightness=0):
+    """A PNG of random dark and light blocks; the same seed is the same label"""
+    blocks = np.random.default_rng(seed).integers(0, 200, (8, 9)).astype(np.int16)
+    image = cv2.resize(np.clip(blocks + brightness, 0, 255).astype(np.uint8), (360, 320),
+                       interpolation=cv2.INTER_NEAREST)
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # Strictly increasing access times, so LRU order never depends on timer resolution
+    ticks = itertools.count(1)
+    monkeypatch.setattr(extraction_cache.time, "time", lambda: float(next(ticks)))
+
+
+def cache(tmp_path, **kwargs):
+    return ExtractionCache(str(tmp_path / "cache.db"), **kwargs)
+
+
+def test_exact_hit_needs_same_bytes_kind_and_prompt(tmp_path):
+    c = cache(tmp_path)
+    c.put("prescription", b"photo", "v1", {"medications": ["Aspirin"]})
+    assert c.get("prescription", b"photo", "v1") == {"medications": ["Aspirin"]}
+    assert c.get("prescription", b"photo", "v2") is None
+    assert c.get("medication", b"photo", "v1") is None
+    assert c.get("prescription", b"other photo", "v1") is None
+    assert c.stats()["hits"] == 1 and c.stats()["misses"] == 3
+
+
+def test_entries_survive_reopening(tmp_path):
+    cache(tmp_path).put("prescription", b"photo", "v1", [1, 2])
+    assert cache(tmp_path).get("prescription", b"photo", "v1") == [1, 2]
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    c = cache(tmp_path, max_entries=2)
+    c.put("prescription", b"a", "v1", "a")
+    c.put("prescription", b"b", "v1", "b")
+    assert c.get("prescription", b"a", "v1") == "a"  # b is now the oldest
+    c.put("prescription", b"c", "v1", "c")
+    assert c.get("prescription", b"b", "v1") is None
+    assert c.get("prescription", b"a", "v1") == "a"
+    assert c.get("prescription", b"c", "v1") == "c"
+    assert c.stats()["entries"] == 2
+
+
+def test_retaken_photo_matches_a_near_duplicate(tmp_path):
+    original, retake, other = label(1), label(1, brightness=20), label(2)
+    assert original != retake
+    assert bin(perceptual_hash(original) ^ perceptual_hash(retake)).count("1") == 0
+    c = cache(tmp_path, near_duplicate_distance=4)
+    c.put("prescription", original, "v1", "first label")
+    assert c.get("prescription", retake, "v1") == "first label"
+    assert c.get("prescription", other, "v1") is None
+    assert c.get("prescription", retake, "v2") is None
+    assert c.stats()["near_hits"] == 1
+
+
+def test_near_duplicates_are_only_searched_among_recent_entries(tmp_path):
+    c = cache(tmp_path, near_duplicate_distance=4, near_duplicate_window=2)
+    c.put("prescription", label(1), "v1", "first label")
+    c.put("prescription", label(2), "v1", "second label")
+    c.put("prescription", label(3), "v1", "third label")
+    assert c.get("prescription", label(1, brightness=20), "v1") is None
+    assert c.get("prescription", label(3, brightness=20), "v1") == "third label"
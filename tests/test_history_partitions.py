@@ -0,0 +1,74 @@
+"""Monthly user_history partitions and retention on a scratch database (skipped without a local Postgres)."""
+import gzip
+from datetime import date
+
+import pytest
+
+from db import get_connection
+from history_partitions import (add_months, archive_old_partitions, ensure_history_partitions, month_start,
+                                partition_name)
+
+USER_ID = 987_654_325
+THIS_MONTH = month_start(date.today())
+OLD_MONTH = add_months(THIS_MONTH, -30)
+
+
+def query(sql, params=()):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall() if cur.description else None
+        cur.close()
+    return rows
+
+
+@pytest.fixture
+def history(scratch_postgres):
+    from migrations import migrate
+    migrate()
+    ensure_history_partitions(from_day=OLD_MONTH)
+    for day in (OLD_MONTH, THIS_MONTH):
+        query("""
+            INSERT INTO user_history (user_id, log_time, medicine_name, medicine_dosage, day, time_of_day)
+            VALUES (%s, %s, 'Aspirin', '81mg', %s, 'morning')
+        """, (USER_ID, day, day))
+
+
+def partitions():
+    return {name for (name,) in query("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'user_history'::regclass
+    """)}
+
+
+def test_partitions_cover_every_month_through_months_ahead(history):
+    assert ensure_history_partitions(from_day=OLD_MONTH) == []
+    created = ensure_history_partitions(months_ahead=5)
+    assert created == [partition_name(add_months(THIS_MONTH, 4)), partition_name(add_months(THIS_MONTH, 5))]
+    expected, month = set(), OLD_MONTH
+    while month <= add_months(THIS_MONTH, 5):
+        expected.add(partition_name(month))
+        month = add_months(month, 1)
+    assert partitions() == expected
+    # A day-bounded query only scans its own month
+    plan = "\n".join(row[0] for row in query(
+        "EXPLAIN SELECT * FROM user_history WHERE user_id = %s AND day = %s", (USER_ID, THIS_MONTH)))
+    assert partition_name(THIS_MONTH) in plan and partition_name(OLD_MONTH) not in plan
+
+
+def test_archive_exports_and_drops_months_past_retention(history, tmp_path):
+    cutoff = add_months(THIS_MONTH, -23)
+    expected = [partition_name(add_months(OLD_MONTH, i)) for i in range(7)]
+    assert add_months(OLD_MONTH, 7) == cutoff
+
+    assert archive_old_partitions(retention_months=24, archive_dir=str(tmp_path), dry_run=True) == expected
+    assert set(expected) <= partitions()
+
+    assert archive_old_partitions(retention_months=24, archive_dir=str(tmp_path)) == expected
+    assert not set(expected) & partitions()
+    assert query("SELECT day FROM user_history WHERE user_id = %s", (USER_ID,)) == [(THIS_MONTH,)]
+    with gzip.open(tmp_path / f"{partition_name(OLD_MONTH)}.csv.gz", "rt") as f:
+        assert str(OLD_MONTH) in f.read()
+    assert query("SELECT row_count FROM history_archives WHERE partition_name = %s",
+                 (partition_name(OLD_MONTH),)) == [(1,)]
+    assert archive_old_partitions(retention_months=24, archive_dir=str(tmp_path)) == []
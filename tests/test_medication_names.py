@@ -0,0 +1,39 @@
+from medication_names import NameIndex, normalize_name
+from prescription_index import PrescriptionIndex
+
+
+def test_normalize_drops_strength_form_and_brand():
+    assert normalize_name("LISINOPRIL 10MG TABS") == "lisinopril"
+    assert normalize_name("Tylenol 500 mg Caplets") == "acetaminophen"
+    assert normalize_name("Metformin HCl ER 500mg") == "metformin"
+    assert normalize_name("Bayer Aspirin 81mg") == "aspirin"
+
+
+def test_exact_and_fuzzy_matches():
+    index = NameIndex(["Lisinopril", "Metformin", "Atorvastatin"])
+    assert index.match("LISINOPRIL 10MG TABS") == ("Lisinopril", 1.0, ("Lisinopril",))
+    match = index.match("lisinoprill")
+    assert match.name == "Lisinopril" and 0.8 <= match.score < 1.0
+    # A swapped pair of letters is one edit
+    assert index.match("metfromin").name == "Metformin"
+
+
+def test_unrelated_name_does_not_match():
+    index = NameIndex(["Lisinopril", "Metformin"])
+    assert index.match("warfarin") is None
+
+
+def test_spellings_with_one_normalized_form_are_kept_together():
+    index = NameIndex(["acetaminophen", "Tylenol", "Metformin"])
+    assert len(index) == 2
+    match = index.match("TYLENOL 500MG")
+    assert match.name == "Tylenol"
+    assert set(match.names) == {"Tylenol", "acetaminophen"}
+
+
+def test_is_prescribed_checks_every_spelling():
+    prescriptions = {"Tylenol": frozenset({"morning"}), "acetaminophen": frozenset({"night"})}
+    index = PrescriptionIndex(loader=lambda user_id: prescriptions)
+    assert index.is_prescribed(1, "Acetaminophen 500 mg", "morning")
+    assert index.is_prescribed(1, "tylenol", "night")
+    assert not index.is_prescribed(1, "tylenol", "afternoon")
@@ -0,0 +1,74 @@
+"""Schema migrations on a scratch database (skipped without a local Postgres)."""
+from datetime import date, timedelta
+
+from db import get_connection
+
+USER_ID = 987_654_324
+DAY = date.today() - timedelta(days=1)
+
+
+def query(sql, params=()):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+
+def execute(sql, params=()):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        cur.close()
+
+
+def seed_legacy_rows():
+    """Data as it looked before migrations 3 and 5: duplicate doses and free-text times of day"""
+    execute("""
+        INSERT INTO prescription (user_id, upload_time, medicine_name, medicine_dosage, num_of_times_per_day, time_of_day)
+        VALUES (%(user)s, now(), 'Aspirin', '81mg', 2, 'Morning and night'),
+               (%(user)s, now(), 'Ibuprofen', '200mg', 2, ' afternoon, Evening,afternoon')
+    """, {"user": USER_ID})
+    execute("""
+        INSERT INTO user_history (user_id, log_time, medicine_name, medicine_dosage, day, time_of_day)
+        VALUES (%(user)s, %(day)s::date + time '09:00', 'Aspirin', '81mg', %(day)s, 'morning'),
+               (%(user)s, %(day)s::date + time '08:00', 'Aspirin', '81mg', %(day)s, 'morning'),
+               (%(user)s, %(day)s::date + time '21:00', 'Aspirin', '81mg', %(day)s, 'night')
+    """, {"user": USER_ID, "day": DAY})
+
+
+def test_upgrade_normalizes_and_dedupes_existing_rows(scratch_postgres):
+    from migrations import LEGACY_LOG_TIMEZONE, MIGRATIONS, applied_versions, migrate
+    assert migrate(to=2) == [1, 2]
+    seed_legacy_rows()
+    assert migrate() == [m.version for m in MIGRATIONS[2:]]
+    assert applied_versions() == {m.version for m in MIGRATIONS}
+    assert migrate() == []
+
+    # Migration 3 keeps the earliest log of each dose; migration 8 moved log_time
+    # from the server's zone to UTC, which converts back to the same wall clock
+    history = query("""
+        SELECT time_of_day, ((log_time AT TIME ZONE 'UTC') AT TIME ZONE %s)::time::text
+        FROM user_history ORDER BY time_of_day
+    """, (LEGACY_LOG_TIMEZONE,))
+    assert history == [("morning", "08:00:00"), ("night", "21:00:00")]
+    # Migration 5 splits on commas and "and", lowercases and de-duplicates
+    times = dict(query("SELECT medicine_name, times_of_day FROM prescription"))
+    assert times == {"Aspirin": ["morning", "night"], "Ibuprofen": ["afternoon", "evening"]}
+    assert query("SELECT to_regclass('user_history_dose_key') IS NOT NULL")[0][0]
+
+
+def test_downgrade_and_upgrade_round_trip(scratch_postgres):
+    from migrations import current_version, migrate, rollback
+    migrate(to=2)
+    seed_legacy_rows()
+    migrate()
+    before = query("SELECT user_id, log_time, medicine_name, day, time_of_day FROM user_history ORDER BY log_time")
+
+    assert rollback(4) == [9, 8, 7, 6, 5]
+    assert current_version() == 4
+    assert query("SELECT to_regclass('user_versions') IS NULL")[0][0]
+    assert migrate() == [5, 6, 7, 8, 9]
+    after = query("SELECT user_id, log_time, medicine_name, day, time_of_day FROM user_history ORDER BY log_time")
+    assert after == before
@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+import model_client
+from model_client import CLOSED, HALF_OPEN, OPEN, ModelClient, ModelUnavailableError, TokenBucket
+
+
+class Overloaded(Exception):
+    pass
+
+
+class FakeModel:
+    """Plays back ``outcomes`` (exceptions are raised) and records each call"""
+
+    def __init__(self, *outcomes, release=None):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.release = release
+
+    def generate_content(self, contents, **kwargs):
+        self.calls += 1
+        if self.release is not None:
+            self.release.wait(5)
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(model_client, "MODEL_RETRY_BASE_SECONDS", 0.0)
+
+
+def client(model, **kwargs):
+    options = dict(retryable=(Overloaded,), rate=1000, burst=1000, deadline=5, max_attempts=3,
+                   breaker_failures=3, breaker_reset=60)
+    options.update(kwargs)
+    return ModelClient(model, **options)
+
+
+def test_bucket_allows_a_burst_then_paces_calls():
+    bucket = TokenBucket(rate=20, capacity=2)
+    start = time.monotonic()
+    assert bucket.acquire(start + 1) and bucket.acquire(start + 1)
+    assert bucket.available() < 1
+    assert bucket.acquire(start + 1)
+    assert time.monotonic() - start >= 0.04
+    # The next token is ~50ms away; a 10ms deadline can't wait for it
+    assert not bucket.acquire(time.monotonic() + 0.01)
+
+
+def test_rate_limit_rejects_instead_of_passing_the_deadline():
+    fake = FakeModel()
+    c = client(fake, rate=1, burst=1, deadline=0.2)
+    assert c.generate_content("test", "prompt") == "ok"
+    with pytest.raises(ModelUnavailableError) as error:
+        c.generate_content("test", "prompt")
+    assert error.value.reason == "rate_limited" and fake.calls == 1
+
+
+def test_transient_errors_are_retried():
+    fake = FakeModel(Overloaded(), Overloaded(), "answer")
+    c = client(fake)
+    assert c.generate_content("test", "prompt") == "answer"
+    assert fake.calls == 3 and c.breaker.state == CLOSED
+
+
+def test_other_errors_are_not_retried_and_do_not_trip_the_breaker():
+    fake = FakeModel(ValueError("bad request"), ValueError("bad request"), ValueError("bad request"))
+    c = client(fake, breaker_failures=1)
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            c.generate_content("test", "prompt")
+    assert fake.calls == 3 and c.breaker.state == CLOSED
+
+
+def test_breaker_opens_fails_fast_and_recovers_through_one_probe():
+    fake = FakeModel(Overloaded(), Overloaded())
+    c = client(fake, max_attempts=1, breaker_failures=2, breaker_reset=0.05)
+    for _ in range(2):
+        with pytest.raises(ModelUnavailableError) as error:
+            c.generate_content("test", "prompt")
+        assert error.value.reason == "retries_exhausted"
+    assert c.breaker.state == OPEN
+
+    with pytest.raises(ModelUnavailableError) as error:
+        c.generate_content("test", "prompt")
+    assert error.value.reason == "circuit_open" and fake.calls == 2
+
+    time.sleep(0.06)
+    assert c.breaker.allow() and c.breaker.state == HALF_OPEN
+    assert not c.breaker.allow()  # one probe at a time
+    c.breaker.release()
+    assert c.generate_content("test", "prompt") == "ok"
+    assert c.breaker.state == CLOSED
+
+
+def test_failed_probe_reopens_the_breaker():
+    fake = FakeModel(Overloaded(), Overloaded())
+    c = client(fake, max_attempts=1, breaker_failures=1, breaker_reset=0.05)
+    with pytest.raises(ModelUnavailableError):
+        c.generate_content("test", "prompt")
+    time.sleep(0.06)
+    with pytest.raises(ModelUnavailableError):
+        c.generate_content("test", "prompt")
+    assert c.breaker.state == OPEN and c.breaker.is_open()
+
+
+def test_calls_beyond_max_in_flight_wait_for_a_slot():
+    release = threading.Event()
+    fake = FakeModel(release=release)
+    c = client(fake, max_in_flight=1, deadline=0.1)
+    first = threading.Thread(target=c.generate_content, args=("test", "prompt"))
+    first.start()
+    while c.in_flight() == 0:
+        time.sleep(0.001)
+    with pytest.raises(ModelUnavailableError) as error:
+        c.generate_content("test", "prompt")
+    assert error.value.reason == "in_flight"
+    release.set()
+    first.join()
+    assert fake.calls == 1 and c.in_flight() == 0
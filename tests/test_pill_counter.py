@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+import pytest
+
+from pill_counter import PILL_COUNT_MIN_CONFIDENCE, count_pills, count_pills_if_confident
+
+
+def photo(centers, radius=40, size=(600, 800)):
+    """Light background with dark round pills"""
+    image = np.full(size + (3,), 220, np.uint8)
+    for center in centers:
+        cv2.circle(image, center, radius, (60, 60, 60), -1)
+    return image
+
+
+def test_several_round_pills_are_counted_confidently():
+    count, confidence = count_pills(photo([(150, 150), (400, 150), (650, 150), (150, 420), (400, 420)]))
+    assert count == 5
+    assert confidence >= PILL_COUNT_MIN_CONFIDENCE
+
+
+def test_single_pill_is_not_trusted():
+    count, confidence = count_pills(photo([(400, 300)]))
+    assert count == 1
+    assert confidence < PILL_COUNT_MIN_CONFIDENCE
+    assert count_pills_if_confident(photo([(400, 300)])) is None
+
+
+def test_empty_frame_is_not_trusted():
+    count, confidence = count_pills(photo([]))
+    assert count == 0
+    assert confidence < PILL_COUNT_MIN_CONFIDENCE
+
+
+def test_encoded_bytes_are_accepted():
+    ok, encoded = cv2.imencode(".png", photo([(200, 200), (500, 200), (350, 450)]))
+    assert ok
+    assert count_pills(encoded.tobytes())[0] == 3
+
+
+def test_unreadable_bytes():
+    with pytest.raises(ValueError):
+        count_pills(b"not an image")
+    assert count_pills_if_confident(b"not an image") is None
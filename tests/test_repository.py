@@ -0,0 +1,160 @@
+"""The same storage operations against SQLite and, when DB_HOST/DB_USER/DB_PASSWORD
+point at a reachable local Postgres, against Postgres too; both must agree."""
+import os
+import subprocess
+import sys
+import threading
+from datetime import date, timedelta
+
+import pytest
+
+from repository import ALREADY_TAKEN, LOGGED, NOT_PRESCRIBED
+from sqlite_repository import SQLiteRepository
+from update_prescription import prescription_rows
+
+USER_ID = 987_654_322
+TODAY = date.today()
+YESTERDAY = TODAY - timedelta(days=1)
+
+MEDICATIONS = [
+    {"medication_name": "Aspirin", "dosage": "81mg", "frequency_per_day": 2, "times_of_day": ["Morning", "night"]},
+    {"medication_name": "Ibuprofen", "dosage": "200mg", "frequency_per_day": 1, "times_of_day": ["afternoon"]},
+    {"medication_name": "Tylenol", "dosage": "500mg", "frequency_per_day": 1, "times_of_day": ["morning"]},
+    {"medication_name": "acetaminophen", "dosage": "500mg", "frequency_per_day": 1, "times_of_day": ["night"]},
+]
+
+# (log_time, day, name, time_of_day, prescribed_names, expected outcome)
+DOSES = [
+    ("08:00:00", YESTERDAY, "Aspirin", "morning", None, LOGGED),
+    ("09:00:00", YESTERDAY, "Aspirin", "morning", None, ALREADY_TAKEN),
+    ("13:00:00", YESTERDAY, "Ibuprofen", "afternoon", None, LOGGED),
+    ("13:30:00", YESTERDAY, "Aspirin", "afternoon", None, NOT_PRESCRIBED),
+    ("23:00:00", YESTERDAY, "Tylenol", "night", ("Tylenol", "acetaminophen"), LOGGED),
+    ("23:00:00", YESTERDAY, "Tylenol", "evening", ("Tylenol", "acetaminophen"), NOT_PRESCRIBED),
+    ("07:00:00", TODAY, "Aspirin", "morning", None, LOGGED),
+    ("07:00:00", TODAY, "Tylenol", "morning", None, LOGGED),
+    ("12:00:00", TODAY, "Warfarin", "afternoon", None, NOT_PRESCRIBED),
+]
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def repo(request, tmp_path):
+    if request.param == "sqlite":
+        repo = SQLiteRepository(str(tmp_path / "test.db"))
+        repo.prepare()
+        yield repo
+        repo.close()
+        return
+    delete_user = request.getfixturevalue("postgres")
+    from postgres_repository import PostgresRepository
+    delete_user(USER_ID)
+    try:
+        yield PostgresRepository()
+    finally:
+        delete_user(USER_ID)
+
+
+def run_operations(repo):
+    """Every result, in order, from one pass over the operations both backends must agree on"""
+    results = {}
+    repo.add_prescriptions(prescription_rows(USER_ID, "2025-01-01 08:00:00", MEDICATIONS))
+    results["active"] = repo.active_prescription_count(USER_ID)
+    results["times"] = {name: sorted(times) for name, times in repo.prescribed_times(USER_ID).items()}
+    results["outcomes"] = [
+        repo.log_medication(USER_ID, f"{day} {clock}", name, "1 pill", day, time_of_day, names)
+        for clock, day, name, time_of_day, names, _ in DOSES]
+    results["dose_taken"] = [repo.dose_taken(USER_ID, YESTERDAY, "night", "Tylenol"),
+                             repo.dose_taken(USER_ID, TODAY, "afternoon", "Ibuprofen")]
+    results["taken_today"] = repo.medicines_taken_on(USER_ID, TODAY)
+
+    pages, after = [], None
+    while True:
+        page = [tuple(row) for row in repo.history_page(USER_ID, after=after, limit=2)]
+        pages.append(page)
+        if len(page) < 2:
+            break
+        after = page[-1][:2]
+    results["pages"] = pages
+    results["yesterday"] = [tuple(row) for row in repo.history_page(
+        USER_ID, start_day=str(YESTERDAY), end_day=str(YESTERDAY))]
+    results["stream"] = [tuple(row) for row in repo.iter_history(USER_ID)]
+    results["stream_after"] = [tuple(row) for row in repo.iter_history(
+        USER_ID, after=(f"{TODAY} 07:00:00", "Tylenol"))]
+
+    results["timezone_before"] = repo.get_timezone(USER_ID)
+    repo.set_timezone(USER_ID, "Europe/Berlin")
+    repo.set_timezone(USER_ID, "Asia/Tokyo")
+    results["timezone_after"] = repo.get_timezone(USER_ID)
+    results["versions"] = repo.data_versions(USER_ID)
+    return results
+
+
+def test_operations(repo):
+    results = run_operations(repo)
+    assert results["active"] == 4
+    assert results["times"]["Aspirin"] == ["morning", "night"]
+    assert results["outcomes"] == [expected for *_, expected in DOSES]
+    assert results["dose_taken"] == [True, False]
+    assert results["taken_today"] == 2
+
+    history = [row for page in results["pages"] for row in page]
+    assert [row[:2] for row in history] == [
+        (f"{TODAY} 07:00:00", "Tylenol"), (f"{TODAY} 07:00:00", "Aspirin"),
+        (f"{YESTERDAY} 23:00:00", "Tylenol"), (f"{YESTERDAY} 13:00:00", "Ibuprofen"),
+        (f"{YESTERDAY} 08:00:00", "Aspirin")]
+    assert all(len(page) <= 2 for page in results["pages"])
+    assert results["stream"] == history
+    assert results["stream_after"] == history[1:]
+    assert results["yesterday"] == history[2:]
+    assert history[2] == (f"{YESTERDAY} 23:00:00", "Tylenol", "1 pill", str(YESTERDAY), "night")
+
+    assert results["timezone_before"] is None
+    assert results["timezone_after"] == "Asia/Tokyo"
+    # One upload, five logged doses (refused ones write nothing), two timezone changes
+    assert results["versions"] == (8, 1)
+
+
+def test_backends_agree(tmp_path, postgres):
+    from postgres_repository import PostgresRepository
+    postgres(USER_ID)
+    sqlite = SQLiteRepository(str(tmp_path / "test.db"))
+    try:
+        sqlite.prepare()
+        assert run_operations(PostgresRepository()) == run_operations(sqlite)
+    finally:
+        postgres(USER_ID)
+        sqlite.close()
+
+
+def test_sqlite_close_from_another_thread(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / "test.db"))
+    worker = threading.Thread(target=repo.active_prescription_count, args=(USER_ID,))
+    worker.start()
+    worker.join()
+    repo.close()
+
+
+def test_sqlite_log_path_does_not_load_postgres():
+    code = "import sys, update_user_history; sys.exit('psycopg2' in sys.modules)"
+    env = dict(os.environ, STORAGE_BACKEND="sqlite")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert subprocess.run([sys.executable, "-c", code], cwd=root, env=env).returncode == 0
+
+
+def test_concurrent_logs_of_one_dose_insert_once(repo):
+    repo.add_prescriptions(prescription_rows(USER_ID, "2025-01-01 08:00:00", MEDICATIONS))
+    barrier = threading.Barrier(8)
+    outcomes = []
+
+    def submit():
+        barrier.wait()
+        outcomes.append(repo.log_medication(USER_ID, f"{TODAY} 08:00:00", "Aspirin", "1 pill", TODAY, "morning"))
+
+    workers = [threading.Thread(target=submit) for _ in range(8)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert sorted(outcomes) == [ALREADY_TAKEN] * 7 + [LOGGED]
+    assert len(repo.history_page(USER_ID)) == 1
+    assert repo.medicines_taken_on(USER_ID, TODAY) == 1
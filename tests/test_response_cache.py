@@ -0,0 +1,134 @@
+import asyncio
+import json
+
+import pytest
+from pydantic import BaseModel
+from starlette.requests import Request
+
+import main
+from prescription_index import PrescriptionIndex, prescriptions_version
+from response_cache import ResponseCache, cache_key, etag_for, etag_matches
+from sqlite_repository import SQLiteRepository
+from update_prescription import prescription_rows
+
+MEDICATIONS = [{"medication_name": "Aspirin", "dosage": "81mg", "frequency_per_day": 1, "times_of_day": ["morning"]}]
+
+
+class Count(BaseModel):
+    count: int
+
+
+def get(if_none_match=None):
+    headers = [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+@pytest.fixture(autouse=True)
+def storage(sqlite_storage, monkeypatch):
+    monkeypatch.setattr(main, "response_cache", ResponseCache())
+    return sqlite_storage
+
+
+def serve(key, if_none_match=None, loads=None):
+    async def load():
+        loads.append(key)
+        return Count(count=len(loads))
+    return asyncio.run(main.cached_json(get(if_none_match), key, load))
+
+
+def test_etag_comparison_is_weak():
+    etag = 'W/"1-2-abc"'
+    assert etag_matches('W/"1-2-abc"', etag)
+    assert etag_matches('"1-2-abc"', etag)
+    assert etag_matches('"other", W/"1-2-abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('W/"1-3-abc"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_matching_etag_gets_304_and_others_get_the_cached_body():
+    loads = []
+    key = cache_key(1, "count")
+    first = serve(key, loads=loads)
+    assert first.status_code == 200 and json.loads(first.body) == {"count": 1}
+    assert first.headers["etag"] == etag_for(key)
+
+    not_modified = serve(key, first.headers["etag"], loads=loads)
+    assert not_modified.status_code == 304 and not_modified.body == b""
+    assert serve(key, loads=loads).body == first.body
+    assert loads == [key]
+
+
+def test_a_write_moves_the_version_and_the_etag(storage):
+    loads = []
+    before = cache_key(1, "count")
+    etag = serve(before, loads=loads).headers["etag"]
+    assert cache_key(1, "count") == before
+
+    storage.add_prescriptions(prescription_rows(1, "2025-01-01 08:00:00", MEDICATIONS))
+    after = cache_key(1, "count")
+    assert after != before and etag_for(after) != etag
+    assert cache_key(2, "count") == (2, "count", (), 0)
+    response = serve(after, etag, loads=loads)
+    assert response.status_code == 200 and json.loads(response.body) == {"count": 2}
+
+
+def test_writes_from_another_process_invalidate_too(storage):
+    before = cache_key(1, "count")
+    # A second connection to the same file stands in for a CLI upload in its own process
+    other = SQLiteRepository(storage.path)
+    try:
+        other.add_prescriptions(prescription_rows(1, "2025-01-01 08:00:00", MEDICATIONS))
+        other.log_medication(1, "2025-01-01 08:00:00", "Aspirin", "81mg", "2025-01-01", "morning")
+    finally:
+        other.close()
+    assert cache_key(1, "count")[3] == before[3] + 2
+
+
+def test_prescription_index_reloads_when_prescriptions_version_moves(storage):
+    loads = []
+
+    def loader(user_id):
+        loads.append(user_id)
+        return storage.prescribed_times(user_id)
+
+    index = PrescriptionIndex(loader=loader, version=prescriptions_version)
+    assert index.get(1) == {}
+    assert index.get(1) == {} and len(loads) == 1
+    other = SQLiteRepository(storage.path)
+    try:
+        other.add_prescriptions(prescription_rows(1, "2025-01-01 08:00:00", MEDICATIONS))
+        index.get(1)
+        # Logging a dose moves only the data version, not the prescriptions version
+        other.log_medication(1, "2025-01-01 08:00:00", "Aspirin", "81mg", "2025-01-01", "morning")
+    finally:
+        other.close()
+    assert index.get(1) == {"Aspirin": frozenset({"morning"})}
+    assert len(loads) == 2
+
+
+def test_cache_keeps_the_most_recently_used_entries():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    assert cache.get("a") == b"1"
+    cache.put("c", b"3")
+    assert cache.get("b") is None and cache.get("a") == b"1" and len(cache) == 2
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_idle_stream_picks_up_a_version_bump_it_was_not_told_about(monkeypatch):
+    versions = iter([("2025-01-01", 1), ("2025-01-01", 2)])
+    counts = iter([0, 1])
+    monkeypatch.setattr(main, "DASHBOARD_KEEPALIVE_SECONDS", 0.01)
+    monkeypatch.setattr(main, "stream_state", lambda user_id: next(versions))
+    monkeypatch.setattr(main, "dashboard_snapshot", lambda user_id: {"todays_medication": next(counts)})
+
+    async def scenario():
+        stream = main.dashboard_event_stream(1)
+        events = [await anext(stream), await anext(stream)]
+        await stream.aclose()
+        return events
+
+    assert [json.loads(event.split("data: ")[1]) for event in asyncio.run(scenario())] == [
+        {"todays_medication": 0}, {"todays_medication": 1}]
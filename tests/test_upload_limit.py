@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import main
+
+
+def request(chunks, content_length=None):
+    headers = [] if content_length is None else [(b"content-length", str(content_length).encode())]
+    sent = []
+
+    async def receive():
+        body = chunks[len(sent)] if len(sent) < len(chunks) else b""
+        sent.append(body)
+        return {"type": "http.request", "body": body, "more_body": len(sent) < len(chunks)}
+
+    scope = {"type": "http", "method": "POST", "path": "/medication-logs", "headers": headers}
+    return Request(scope, receive), sent
+
+
+def test_small_upload_is_read(monkeypatch):
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", 10)
+    req, _ = request([b"abc", b"def"])
+    assert asyncio.run(main.read_upload(req)) == b"abcdef"
+
+
+def test_declared_oversize_upload_is_refused_before_reading(monkeypatch):
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", 10)
+    req, sent = request([b"x" * 20], content_length=20)
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(main.read_upload(req))
+    assert e.value.status_code == 413
+    assert sent == []
+
+
+def test_undeclared_oversize_upload_stops_at_the_cap(monkeypatch):
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", 10)
+    req, sent = request([b"x" * 6] * 100)
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(main.read_upload(req))
+    assert e.value.status_code == 413
+    assert len(sent) == 2
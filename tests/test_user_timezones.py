@@ -0,0 +1,60 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+import pytz
+
+from user_timezones import DEFAULT_TIMEZONE, get_user_timezone, local_today, set_user_timezone, stamp_dose
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=pytz.utc)
+
+
+@pytest.fixture(autouse=True)
+def storage(sqlite_storage):
+    return sqlite_storage
+
+
+def test_users_without_a_row_get_the_default():
+    assert get_user_timezone(1).zone == DEFAULT_TIMEZONE
+
+
+def test_one_instant_lands_on_each_users_local_day_and_slot():
+    set_user_timezone(1, "Asia/Tokyo")
+    set_user_timezone(2, "Europe/Berlin")
+    set_user_timezone(3, "America/Los_Angeles")
+    instant = utc(2025, 6, 30, 22, 30)
+    assert stamp_dose(1, instant) == (datetime(2025, 6, 30, 22, 30), date(2025, 7, 1), "morning")
+    assert stamp_dose(2, instant) == (datetime(2025, 6, 30, 22, 30), date(2025, 7, 1), "night")
+    assert stamp_dose(3, instant) == (datetime(2025, 6, 30, 22, 30), date(2025, 6, 30), "afternoon")
+
+
+def test_slots_follow_daylight_saving_changes():
+    set_user_timezone(1, "America/Los_Angeles")
+    # Spring forward on 2025-03-09: 13:30 UTC is 06:30 PDT; a fixed -8 offset would say 05:30, night
+    assert stamp_dose(1, utc(2025, 3, 9, 9, 30))[1:] == (date(2025, 3, 9), "night")
+    assert stamp_dose(1, utc(2025, 3, 9, 13, 30))[1:] == (date(2025, 3, 9), "morning")
+    # Fall back on 2025-11-02: 13:30 UTC is 05:30 PST, still night
+    assert stamp_dose(1, utc(2025, 11, 2, 13, 30))[1:] == (date(2025, 11, 2), "night")
+    set_user_timezone(2, "Europe/Berlin")
+    # Berlin springs forward on 2025-03-30: 22:30 UTC the day before is 23:30 CET, 04:30 UTC is 06:30 CEST
+    assert stamp_dose(2, utc(2025, 3, 29, 22, 30))[1:] == (date(2025, 3, 29), "night")
+    assert stamp_dose(2, utc(2025, 3, 30, 4, 30))[1:] == (date(2025, 3, 30), "morning")
+
+
+def test_local_today_is_the_users_date_not_the_servers():
+    set_user_timezone(1, "Pacific/Kiritimati")  # UTC+14
+    set_user_timezone(2, "Pacific/Pago_Pago")   # UTC-11
+    ahead, behind = local_today(1), local_today(2)
+    assert ahead == datetime.now(pytz.timezone("Pacific/Kiritimati")).date()
+    # 25 hours apart, so never the same date
+    assert ahead - behind in (timedelta(days=1), timedelta(days=2))
+
+
+def test_changing_the_timezone_takes_effect_immediately():
+    set_user_timezone(1, "Asia/Tokyo")
+    assert get_user_timezone(1).zone == "Asia/Tokyo"
+    set_user_timezone(1, "Europe/Berlin")
+    assert get_user_timezone(1).zone == "Europe/Berlin"
+    with pytest.raises(ValueError):
+        set_user_timezone(1, "Mars/Olympus_Mons")
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+
+import pytest
+
+import verification_jobs
+from verification_jobs import DONE, FAILED, JobStore, QueueFullError, VerificationQueue
+
+
+def spool(tmp_path, store, count):
+    job_ids = []
+    for i in range(count):
+        image_path = tmp_path / f"job-{i}"
+        image_path.write_bytes(b"photo")
+        store.create(f"job-{i}", 123, str(image_path))
+        job_ids.append(f"job-{i}")
+    return job_ids
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"))
+
+
+def test_jobs_run_and_record_their_result(tmp_path, store):
+    jobs = VerificationQueue(store, workers=2, max_queued=4, spool_dir=str(tmp_path),
+                             handler=lambda image_path, user_id: {"success": True, "user_id": user_id})
+    jobs.start()
+    try:
+        job_id = jobs.submit(b"photo", 7)
+        assert wait_for(lambda: jobs.get(job_id)["status"] == DONE)
+        assert jobs.get(job_id)["result"] == {"success": True, "user_id": 7}
+        assert not os.path.exists(os.path.join(str(tmp_path), job_id))
+    finally:
+        jobs.stop()
+
+
+def test_submit_raises_when_the_queue_is_full(tmp_path, store):
+    release = threading.Event()
+    jobs = VerificationQueue(store, workers=1, max_queued=1, spool_dir=str(tmp_path),
+                             handler=lambda image_path, user_id: release.wait())
+    jobs.start()
+    try:
+        jobs.submit(b"running", 1)
+        assert wait_for(lambda: jobs.depth() == 0)
+        jobs.submit(b"queued", 1)
+        with pytest.raises(QueueFullError):
+            jobs.submit(b"rejected", 1)
+    finally:
+        release.set()
+        jobs.stop()
+
+
+def test_restart_with_more_unfinished_jobs_than_slots_does_not_block(tmp_path, store):
+    job_ids = spool(tmp_path, store, 5)
+    release = threading.Event()
+    jobs = VerificationQueue(store, workers=1, max_queued=2, spool_dir=str(tmp_path),
+                             handler=lambda image_path, user_id: release.wait(5) and {"success": True})
+
+    starter = threading.Thread(target=jobs.start)
+    starter.start()
+    starter.join(timeout=2)
+    try:
+        assert not starter.is_alive(), "start() blocked on a full queue"
+        failed = [job_id for job_id in job_ids if jobs.get(job_id)["status"] == FAILED]
+        # One job running plus two queued at most; the rest are failed for resubmission
+        assert len(failed) >= 2
+        assert all("resubmit" in jobs.get(job_id)["error"] for job_id in failed)
+        release.set()
+        assert wait_for(lambda: all(jobs.get(job_id)["status"] in (DONE, FAILED) for job_id in job_ids))
+        assert sum(jobs.get(job_id)["status"] == DONE for job_id in job_ids) == 5 - len(failed)
+    finally:
+        release.set()
+        jobs.stop()
+
+
+def test_finished_jobs_are_pruned_while_running(tmp_path, store, monkeypatch):
+    monkeypatch.setattr(verification_jobs, "PRUNE_INTERVAL_SECONDS", 0.05)
+    monkeypatch.setattr(verification_jobs, "RETENTION_SECONDS", 0)
+    jobs = VerificationQueue(store, workers=1, max_queued=2, spool_dir=str(tmp_path),
+                             handler=lambda image_path, user_id: {"success": True})
+    jobs.start()
+    try:
+        job_id = jobs.submit(b"photo", 1)
+        assert wait_for(lambda: jobs.get(job_id) is None)
+    finally:
+        jobs.stop()
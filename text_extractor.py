@@ -1,41 +1,73 @@
-import cv2
-import google.generativeai as genai
+import argparse
 from dotenv import load_dotenv
 import os
-from datetime import datetime
 import re
 import json
+from extraction_cache import get_extraction_cache
+from extraction_models import MedicationExtraction, PrescriptionExtraction
+from metrics import stage
+from model_client import get_model_client
+from user_timezones import stamp_dose
 
 load_dotenv()
 
-def get_time_of_day(timestamp):
-    """
-    Determine time of day based on timestamp.
-    Morning: 6am-12pm, Afternoon: 12pm-4pm, Evening: 4pm-10pm, Night: 10pm-6am
-    """
-    hour = timestamp.hour
-    
-    if 6 <= hour < 12:
-        return "morning"
-    elif 12 <= hour < 16:
-        return "afternoon"
-    elif 16 <= hour < 22:
-        return "evening"
-    else:
-        return "night"
+# Bump when a prompt or the parsing below changes, so cached results are not reused
+MEDICATION_PROMPT_VERSION = "3"
+PRESCRIPTION_PROMPT_VERSION = "2"
+# "structured": one JSON-mode call validated with pydantic, falling back to the
+# two-call text path if validation fails. "two_call": always use the text path.
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "structured")
+JSON_GENERATION_CONFIG = {"response_mime_type": "application/json"}
+DEMO_PRESCRIPTION_PATH = "test_images/prescriptions/demo_prescription.png"
+
+def read_image_bytes(file_path):
+    with open(file_path, "rb") as f:
+        return f.read()
+
+def encode_image_for_model(raw_bytes, grayscale=False):
+    """Downscaled, size-targeted JPEG for upload (raises ValueError if unreadable)"""
+    from image_preprocessing import prepare_image  # loads OpenCV on first use
+    # The per-image report isn't needed here: prepare_image already counts original
+    # and encoded bytes in medsafe_image_bytes_total
+    with stage("extraction.preprocess"):
+        image_bytes, _ = prepare_image(raw_bytes, grayscale=grayscale)
+    return image_bytes
+
+def _pill_count_instruction(known_pill_count):
+    if known_pill_count is not None:
+        return (f"2. {known_pill_count} pills are visible outside of the bottle (already counted; "
+                "use exactly this number for number_of_pills).\n")
+    return ("2. Count only the number of pills that are physically visible and outside of the bottle or packaging. "
+            "Do not use numbers written on the label or packaging to estimate this. If none are visible, use 'unknown'.\n")
+
+def _extract_medication_fields_structured(model, image_bytes, known_pill_count=None):
+    """One call: the model answers in JSON, validated against MedicationExtraction"""
+    prompt = (
+        "This is a photo of a medication someone is about to take.\n\n"
+        "1. Read the medication name from the label.\n"
+        f"{_pill_count_instruction(known_pill_count)}"
+        "3. Compute the total dosage (number of pills × dosage per pill) in mg. "
+        "If dosage per pill is not on the label, use 'unknown'.\n\n"
+        "Respond with a single JSON object matching this JSON schema and nothing else:\n"
+        f"{json.dumps(MedicationExtraction.model_json_schema())}"
+    )
 
-def extract_medication_details():
-    file_path = os.getenv("MEDICATION_FILE_PATH")
-    genai.configure(api_key=os.getenv("API_KEY"))
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    img = cv2.imread(file_path)
+    response = model.generate_content("medication_structured", [
+        {"mime_type": "image/jpeg", "data": image_bytes},
+        prompt
+    ], generation_config=JSON_GENERATION_CONFIG)
 
-    success, encoded_image = cv2.imencode('.jpg', img)
-    if not success:
-        print("Failed to encode image.")
-        exit()
+    return MedicationExtraction.model_validate_json(response.text).model_dump()
 
-    image_bytes = encoded_image.tobytes()
+def _extract_medication_fields_two_call(model, image_bytes, known_pill_count=None):
+    """Free-text extraction, then a second call to reformat it as a CSV line"""
+    if known_pill_count is not None:
+        # Pills already counted locally: the first call only needs the label text
+        response = model.generate_content("medication_ocr", [
+            {"mime_type": "image/jpeg", "data": image_bytes},
+            "Extract all the text from this image as accurately as possible. Output only the text."
+        ])
+        return _format_medication_fields(model, response.text.strip(), known_pill_count)
 
     prompt = (
         "Extract all the text from this image as accurately as possible.\n\n"
@@ -50,7 +82,7 @@ def extract_medication_details():
         "[number]"
     )
 
-    response = model.generate_content([
+    response = model.generate_content("medication_ocr", [
     {"mime_type": "image/jpeg", "data": image_bytes},
     prompt
     
@@ -63,6 +95,10 @@ def extract_medication_details():
     text_match = re.search(r"Extracted Text:\s*(.*?)\n\nVisible Pills Count:", response.text, re.DOTALL)
     ocr_text = text_match.group(1).strip() if text_match else ""
 
+    return _format_medication_fields(model, ocr_text, visible_pills)
+
+def _format_medication_fields(model, ocr_text, visible_pills):
+    """Second call of the text path: label text + pill count -> CSV line"""
     final_prompt = (
         "You will be given:\n"
         "- Text extracted from a medication label\n"
@@ -79,50 +115,86 @@ def extract_medication_details():
         f"Visible Pill Count: {visible_pills}"
     )
 
-    final_response = model.generate_content(final_prompt)
+    final_response = model.generate_content("medication_format", final_prompt)
 
-    timestamp = datetime.now()
-    
     parts = [p.strip() for p in final_response.text.split(",")]
 
-    medicine_name = parts[0].lower()
-    number_of_pills = parts[1]
-    medicine_dosage = parts[2]
+    return {
+        "medicine_name": parts[0].lower(),
+        "number_of_pills": parts[1],
+        "medicine_dosage": parts[2],
+    }
+
+def _extract_medication_fields(raw_bytes):
+    """Model calls for a medication photo: name, visible pill count and dosage"""
+    model = get_model_client()
+
+    image_bytes = encode_image_for_model(raw_bytes)
+
+    # Local OpenCV count; None when not confident, and the model counts instead
+    from pill_counter import count_pills_if_confident
+    with stage("extraction.pill_count"):
+        known_pill_count = count_pills_if_confident(raw_bytes)
+
+    if EXTRACTION_MODE == "structured":
+        try:
+            return _extract_medication_fields_structured(model, image_bytes, known_pill_count)
+        except ValueError:
+            # Invalid JSON or schema mismatch (pydantic's ValidationError is a ValueError)
+            pass
+    return _extract_medication_fields_two_call(model, image_bytes, known_pill_count)
+
+def extract_medication_details(file_path=None, user_id=None):
+    file_path = file_path or os.getenv("MEDICATION_FILE_PATH")
+    with stage("extraction.read_image"):
+        raw_bytes = read_image_bytes(file_path)
+
+    # Same photo resubmitted (retry, double tap) -> no model call
+    cache = get_extraction_cache()
+    with stage("extraction.cache_lookup"):
+        fields = cache.get("medication", raw_bytes, MEDICATION_PROMPT_VERSION)
+    if fields is None:
+        with stage("extraction.medication_model"):
+            fields = _extract_medication_fields(raw_bytes)
+        cache.put("medication", raw_bytes, MEDICATION_PROMPT_VERSION, fields)
+
+    # log_time in UTC; day and time of day in the user's own timezone
+    log_time, day, time_of_day = stamp_dose(user_id)
 
     medication_data = {
-        "log_time": timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-        "medicine_name": medicine_name,
-        "medicine_dosage": medicine_dosage,
-        "day": timestamp.strftime('%Y-%m-%d'),
-        "time_of_day": get_time_of_day(timestamp)
+        "log_time": log_time.strftime('%Y-%m-%d %H:%M:%S'),
+        "medicine_name": fields["medicine_name"],
+        "medicine_dosage": fields["medicine_dosage"],
+        "day": day.strftime('%Y-%m-%d'),
+        "time_of_day": time_of_day
     }
     json_output = json.dumps(medication_data, indent=4)
 
     return json_output
 
-def extract_prescription():
-
-    # file_path = os.getenv("test_images/prescriptions/demo_prescription.png")
-    # if not file_path:
-    #     raise EnvironmentError("PRESCRIPTION_FILE_PATH is not set in your .env")
-    # if not os.path.isfile(file_path):
-    #     raise FileNotFoundError(f"No file found at: {file_path}")
-    file_path = "test_images/prescriptions/demo_prescription.png"
-
-    
-
-    load_dotenv()
-    genai.configure(api_key=os.getenv("API_KEY"))
-    model = genai.GenerativeModel("gemini-2.5-flash")
+def _extract_prescription_medications_structured(model, image_bytes):
+    """One call: the model answers in JSON, validated against PrescriptionExtraction"""
+    prompt = (
+        "Read this image of a prescription. For each medication on it, identify:\n"
+        "- Medication name\n"
+        "- Dosage (e.g., 500mg)\n"
+        "- Frequency per day (e.g., 2 for twice a day)\n"
+        "- Specific times of day to take it (e.g., morning, afternoon, night). "
+        "If times of day are unavailable, use [\"Anytime\"].\n\n"
+        "Respond with a single JSON object matching this JSON schema and nothing else:\n"
+        f"{json.dumps(PrescriptionExtraction.model_json_schema())}"
+    )
 
-    img = cv2.imread(file_path)
-    success, encoded_image = cv2.imencode('.jpg', img)
-    if not success:
-        print("Failed to encode image.")
-        exit()
+    response = model.generate_content("prescription_structured", [
+        {"mime_type": "image/jpeg", "data": image_bytes},
+        prompt
+    ], generation_config=JSON_GENERATION_CONFIG)
 
-    image_bytes = encoded_image.tobytes()
+    extraction = PrescriptionExtraction.model_validate_json(response.text)
+    return [med.model_dump() for med in extraction.medications]
 
+def _extract_prescription_medications_two_call(model, image_bytes):
+    """Free-text extraction, then a second call to reformat it as CSV lines"""
     full_prompt = (
         "Step 1: Extract all the text from this image of a prescription as accurately as possible. "
         "This includes medication names, dosages, instructions, and any additional labels or printed notes.\n\n"
@@ -154,12 +226,12 @@ def extract_prescription():
     [Medication_name], [dosage], [frequency_per_day], [times_of_day]. 
     If times_of_day is unavalible, write Anytime"""
 
-    response = model.generate_content([
+    response = model.generate_content("prescription_ocr", [
         {"mime_type": "image/jpeg", "data": image_bytes},
         full_prompt
     ])
 
-    final_response = model.generate_content([
+    final_response = model.generate_content("prescription_format", [
         final_prompt + "Medication Prescription: \n" + response.text
     ])
 
@@ -183,15 +255,45 @@ def extract_prescription():
                 "frequency_per_day": freq,
                 "times_of_day": [t.strip() for t in times.split("and") if t.strip()]
             })
+    return medications
+
+def _extract_prescription_medications(raw_bytes):
+    """Model calls for a prescription image: one dict per prescribed medication"""
+    model = get_model_client()
+
+    # Prescriptions are printed text: grayscale + contrast normalisation helps and shrinks the payload
+    image_bytes = encode_image_for_model(raw_bytes, grayscale=True)
+
+    if EXTRACTION_MODE == "structured":
+        try:
+            return _extract_prescription_medications_structured(model, image_bytes)
+        except ValueError:
+            pass
+    return _extract_prescription_medications_two_call(model, image_bytes)
+
+def extract_prescription(file_path=DEMO_PRESCRIPTION_PATH):
+    with stage("extraction.read_image"):
+        raw_bytes = read_image_bytes(file_path)
+
+    # Re-uploads of the same prescription -> no model call
+    cache = get_extraction_cache()
+    with stage("extraction.cache_lookup"):
+        medications = cache.get("prescription", raw_bytes, PRESCRIPTION_PROMPT_VERSION)
+    if medications is None:
+        with stage("extraction.prescription_model"):
+            medications = _extract_prescription_medications(raw_bytes)
+        cache.put("prescription", raw_bytes, PRESCRIPTION_PROMPT_VERSION, medications)
+
     json_output = json.dumps(medications, indent=4)
     return json_output
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an extractor on one image and print the JSON")
+    parser.add_argument("kind", choices=["prescription", "medication"])
+    parser.add_argument("file_path", nargs="?")
+    args = parser.parse_args()
 
-
-
-
-
-
-print(extract_prescription())
-
-
+    if args.kind == "prescription":
+        print(extract_prescription(args.file_path or DEMO_PRESCRIPTION_PATH))
+    else:
+        print(extract_medication_details(args.file_path))
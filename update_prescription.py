@@ -1,56 +1,55 @@
-import psycopg2
+import argparse
 from datetime import datetime
-from text_extractor import extract_prescription
+from text_extractor import extract_prescription, DEMO_PRESCRIPTION_PATH
+from prescription_index import prescription_index
+from repository import get_repository
+from dashboard_events import notify_dashboard_changed
+from metrics import stage
 import json
-import os
 
-def upload_data_to_prescription():
+def normalize_times(times_of_day):
+    """Lowercase, de-duplicated times of day, as stored in prescription.times_of_day"""
+    return sorted({t.strip().lower() for t in times_of_day if t.strip()})
+
+def prescription_rows(user_id, upload_time, medications):
+    """Turn extracted medications into prescription table rows"""
+    rows = []
+    for med in medications:
+        rows.append((
+            user_id,
+            upload_time,
+            med["medication_name"],
+            med["dosage"],
+            med["frequency_per_day"],
+            ", ".join(med["times_of_day"]),
+            normalize_times(med["times_of_day"])
+        ))
+    return rows
+
+def upload_data_to_prescription(file_path=DEMO_PRESCRIPTION_PATH, user_id=123):
     # 1) Call your OCR/extraction and parse it:
-    json_data = extract_prescription()
+    with stage("prescription_upload.extract"):
+        json_data = extract_prescription(file_path)
     medications = json.loads(json_data)   # → a Python list of dicts
 
     # 2) Prepare your metadata:
-    user_id    = 123
     upload_time = datetime.now()
 
-    # 3) Open your connection (fill in your real creds or use env vars)
-    conn = psycopg2.connect(
-        host="35.193.11.213",
-        port=5432,
-        dbname="postgres",
-        user="adityaiyer7",
-        password="CalHacksAI2025"
-    )
-    cur = conn.cursor()
-
-    # 4) Loop & insert each medication
-    for med in medications:
-        medicine_name         = med["medication_name"]
-        medicine_dosage       = med["dosage"]
-        num_of_times_per_day  = med["frequency_per_day"]
-        time_of_day_str       = ", ".join(med["times_of_day"])
-
-        cur.execute("""
-            INSERT INTO prescription
-              (user_id, upload_time,
-               medicine_name, medicine_dosage,
-               num_of_times_per_day, time_of_day)
-            VALUES
-              (%s, %s, %s, %s, %s, %s)
-        """, (
-            user_id,
-            upload_time,
-            medicine_name,
-            medicine_dosage,
-            num_of_times_per_day,
-            time_of_day_str
-        ))
+    # 3) Insert every medication in one transaction
+    with stage("prescription_upload.insert"):
+        get_repository().add_prescriptions(prescription_rows(user_id, upload_time, medications))
 
-    # 5) Commit & clean up
-    conn.commit()
-    cur.close()
-    conn.close()
+    # 4) New rows are committed, with the user's version bumped, so any API process serving
+    #    this user picks them up on its next read; here we only update this process's own caches
+    prescription_index.invalidate(user_id)
+    notify_dashboard_changed(user_id)
 
     return {"success": True, "message": "Prescription data logged successfully"}
 
-print(upload_data_to_prescription())
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract a prescription image and store its medications")
+    parser.add_argument("file_path", nargs="?", default=DEMO_PRESCRIPTION_PATH)
+    parser.add_argument("--user-id", type=int, default=123)
+    args = parser.parse_args()
+
+    print(upload_data_to_prescription(args.file_path, args.user_id))
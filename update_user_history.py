@@ -1,8 +1,17 @@
-import psycopg2
-from datetime import datetime
+import argparse
 from text_extractor import extract_medication_details
 import json
-from verification import verify_medication_in_prescription, verify_not_already_taken
+from dashboard_events import notify_dashboard_changed
+from metrics import stage
+from model_client import ModelUnavailableError
+from prescription_index import prescription_index
+from repository import ALREADY_TAKEN, NOT_PRESCRIBED, STORAGE_BACKEND, get_repository
+import os
+
+# Check the logged medication against the user's other prescriptions (cached pairs cost no model call).
+# Off by default on SQLite: the interaction cache is a Postgres table
+INTERACTION_CHECK_ON_LOG = os.getenv("INTERACTION_CHECK_ON_LOG", "1" if STORAGE_BACKEND == "postgres" else "0") == "1"
+
 
 class MedicationVerificationError(Exception):
     """Custom exception for medication verification failures"""
@@ -11,9 +20,10 @@ class MedicationVerificationError(Exception):
         self.error_type = error_type
         super().__init__(self.message)
 
-def upload_data_to_user_history():
+def upload_data_to_user_history(file_path=None, user_id=123):
     try:
-        json_data = extract_medication_details()
+        with stage("log_medication.extract"):
+            json_data = extract_medication_details(file_path, user_id)
         data = json.loads(json_data)
         
         log_time = data["log_time"]
@@ -21,45 +31,51 @@ def upload_data_to_user_history():
         medicine_dosage = data["medicine_dosage"]
         day = data["day"]
         time_of_day = data["time_of_day"]
-        user_id = 123
 
-        # Check if medication is in prescription
-        if not verify_medication_in_prescription(data):
+        # Log under the prescribed spelling ("LISINOPRIL 10MG TABS" -> "Lisinopril"); with no
+        # close match the name is kept as read and the insert reports NOT_PRESCRIBED.
+        # Every stored spelling of the match is checked, so "Tylenol" prescribed for
+        # the morning and "acetaminophen" for the night both count
+        with stage("log_medication.match_name"):
+            match = prescription_index.match_medicine(user_id, medicine_name)
+        prescribed_names = None
+        if match is not None:
+            medicine_name, prescribed_names = match.name, match.names
+
+        # Prescription check, duplicate check and insert in one transaction
+        with stage("log_medication.verify_and_insert"):
+            outcome = get_repository().log_medication(
+                user_id, log_time, medicine_name, medicine_dosage, day, time_of_day, prescribed_names)
+
+        if outcome == NOT_PRESCRIBED:
             raise MedicationVerificationError(
                 f"Medication '{medicine_name}' is not prescribed for {time_of_day}",
                 "NOT_PRESCRIBED"
             )
-        
-        # Check if medication already taken
-        if not verify_not_already_taken(data):
+        if outcome == ALREADY_TAKEN:
             raise MedicationVerificationError(
                 f"Medication '{medicine_name}' has already been taken for {time_of_day} on {day}",
                 "ALREADY_TAKEN"
             )
 
-        # If both verifications pass, insert into database
-        conn = psycopg2.connect(
-            host="35.193.11.213",
-            port=5432,
-            dbname="postgres",
-            user="adityaiyer7",
-            password="CalHacksAI2025"
-        )
+        notify_dashboard_changed(user_id)
+        result = {"success": True, "message": "Medication logged successfully"}
 
-        cur = conn.cursor()
-        cur.execute("""
-                INSERT INTO user_history
-                (user_id, log_time, medicine_name, medicine_dosage, day, time_of_day)
-                VALUES
-                (%s, %s::timestamp, %s, %s, %s::date, %s)""", 
-                (user_id, log_time, medicine_name, medicine_dosage, day, time_of_day))
-        
+        # Advisory only: the log is already written, so a model outage must not fail it
+        if INTERACTION_CHECK_ON_LOG:
+            # Imported here: cross_check needs Postgres, which SQLite deployments never load
+            from cross_check import check_new_medication
+            try:
+                with stage("log_medication.interaction_check"):
+                    conflicting_meds = check_new_medication(user_id, medicine_name)
+            except Exception:
+                conflicting_meds = []
+            if conflicting_meds:
+                result["warnings"] = [
+                    f"{medicine_name} SHOULD NOT be taken with {med}" for med in conflicting_meds
+                ]
 
-        conn.commit()
-        cur.close()
-        conn.close()
-        
-        return {"success": True, "message": "Medication logged successfully"}
+        return result
         
     except MedicationVerificationError as e:
         return {
@@ -67,7 +83,13 @@ def upload_data_to_user_history():
             "error": e.message, 
             "error_type": e.error_type
         }
-    except psycopg2.Error as e:
+    except ModelUnavailableError as e:
+        return {
+            "success": False,
+            "error": f"Medication photo could not be read right now: {str(e)}",
+            "error_type": "MODEL_UNAVAILABLE"
+        }
+    except get_repository().errors as e:
         return {
             "success": False, 
             "error": f"Database error: {str(e)}", 
@@ -81,10 +103,10 @@ def upload_data_to_user_history():
         }
 
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Log a medication photo to the user's history")
+    parser.add_argument("file_path", nargs="?", help="photo to log (default: $MEDICATION_FILE_PATH)")
+    parser.add_argument("--user-id", type=int, default=123)
+    args = parser.parse_args()
 
-result = upload_data_to_user_history()
-print(result)
-
-
-
-
+    print(upload_data_to_user_history(args.file_path, args.user_id))
@@ -0,0 +1,110 @@
+"""Per-user timezones and the local day / time-of-day a dose belongs to.
+
+Each user's IANA timezone is stored once in ``user_timezones`` (users
+without a row get ``DEFAULT_USER_TIMEZONE``). Medication logs are stamped
+at write time: ``log_time`` in UTC, ``day`` and ``time_of_day`` in the
+user's local time, so "today" and dose-slot queries are plain equality or
+range matches on indexed columns instead of per-row timezone conversion.
+
+    python user_timezones.py set 123 Europe/Berlin
+    python user_timezones.py show 123
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime
+
+import pytz
+
+from repository import get_repository
+
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_USER_TIMEZONE", "America/Los_Angeles")
+TIMEZONE_TTL_SECONDS = float(os.getenv("USER_TIMEZONE_TTL", "300"))
+
+USER_TIMEZONES_DDL = """
+    CREATE TABLE IF NOT EXISTS user_timezones (
+        user_id INT PRIMARY KEY,
+        timezone VARCHAR NOT NULL
+    )
+"""
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_time_of_day(timestamp):
+    """
+    Determine time of day based on a local timestamp.
+    Morning: 6am-12pm, Afternoon: 12pm-4pm, Evening: 4pm-10pm, Night: 10pm-6am
+    """
+    hour = timestamp.hour
+
+    if 6 <= hour < 12:
+        return "morning"
+    elif 12 <= hour < 16:
+        return "afternoon"
+    elif 16 <= hour < 22:
+        return "evening"
+    else:
+        return "night"
+
+
+def get_user_timezone(user_id):
+    """The user's pytz timezone, cached for ``USER_TIMEZONE_TTL`` seconds"""
+    if user_id is None:
+        return pytz.timezone(DEFAULT_TIMEZONE)
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(user_id)
+    if entry is not None and now - entry[0] < TIMEZONE_TTL_SECONDS:
+        return entry[1]
+
+    tz = pytz.timezone(get_repository().get_timezone(user_id) or DEFAULT_TIMEZONE)
+    with _cache_lock:
+        _cache[user_id] = (now, tz)
+    return tz
+
+
+def set_user_timezone(user_id, timezone):
+    """Store an IANA timezone name for the user; raises ValueError if it is unknown.
+
+    Doses already logged keep the day and time of day they were stamped with.
+    """
+    try:
+        tz = pytz.timezone(timezone)
+    except pytz.UnknownTimeZoneError:
+        raise ValueError(f"Unknown timezone: {timezone}")
+    get_repository().set_timezone(user_id, tz.zone)
+    with _cache_lock:
+        _cache.pop(user_id, None)
+    return tz.zone
+
+
+def stamp_dose(user_id, now=None):
+    """(log_time in UTC, local day, time-of-day bucket) for a dose logged at ``now``"""
+    utc_now = now or datetime.now(pytz.utc)
+    local = utc_now.astimezone(get_user_timezone(user_id))
+    return utc_now.replace(tzinfo=None), local.date(), get_time_of_day(local)
+
+
+def local_today(user_id):
+    return datetime.now(get_user_timezone(user_id)).date()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or set a user's timezone")
+    parser.add_argument("command", choices=["show", "set"])
+    parser.add_argument("user_id", type=int)
+    parser.add_argument("timezone", nargs="?", help="IANA name, e.g. Europe/Berlin (for set)")
+    args = parser.parse_args()
+
+    if args.command == "set":
+        if not args.timezone:
+            parser.error("set needs a timezone")
+        try:
+            print(f"User {args.user_id} timezone: {set_user_timezone(args.user_id, args.timezone)}")
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        print(f"User {args.user_id} timezone: {get_user_timezone(args.user_id).zone}")
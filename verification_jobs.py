@@ -0,0 +1,258 @@
+"""Background verification of medication photos.
+
+The API accepts a photo, spools it to disk and returns a job id at once; a
+fixed pool of worker threads runs the extract -> verify -> insert pipeline
+(``update_user_history.upload_data_to_user_history``) and records the result.
+Job state lives in a local SQLite file (WAL), so no outside service is
+needed and jobs queued when the process stopped are picked up on restart.
+
+The in-memory queue is bounded: once ``VERIFICATION_QUEUE_MAX`` jobs are
+waiting, ``submit`` raises ``QueueFullError`` and the API answers 503 so
+clients back off instead of piling up work.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+from metrics import Histogram, register_collector
+
+JOBS_PATH = os.getenv("VERIFICATION_JOBS_PATH", "verification_jobs.db")
+SPOOL_DIR = os.getenv("VERIFICATION_SPOOL_DIR", "verification_spool")
+WORKERS = int(os.getenv("VERIFICATION_WORKERS", "4"))
+QUEUE_MAX = int(os.getenv("VERIFICATION_QUEUE_MAX", "100"))
+# Finished jobs (and their results) are kept this long for polling clients
+RETENTION_SECONDS = float(os.getenv("VERIFICATION_JOB_RETENTION_HOURS", "24")) * 3600
+# How often a running queue drops finished jobs older than the retention window
+PRUNE_INTERVAL_SECONDS = float(os.getenv("VERIFICATION_PRUNE_INTERVAL_SECONDS", "3600"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+JOB_SECONDS = Histogram("medsafe_verification_job_seconds",
+                        "Verification job time spent waiting in the queue and running", ["phase"])
+
+
+class QueueFullError(Exception):
+    """Raised by ``submit`` when the queue is at capacity"""
+
+
+class JobStore:
+    """Job rows in a SQLite file; safe to share between threads"""
+
+    def __init__(self, path=JOBS_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS verification_jobs (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                image_path TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        """)
+        self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS verification_jobs_status
+            ON verification_jobs (status, created_at)
+        """)
+        self._conn.commit()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cur = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cur.fetchall()
+
+    def create(self, job_id, user_id, image_path):
+        self._execute("""
+            INSERT INTO verification_jobs (id, user_id, status, image_path, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (job_id, user_id, QUEUED, image_path, time.time()))
+
+    def mark_running(self, job_id):
+        self._execute("UPDATE verification_jobs SET status = ?, started_at = ? WHERE id = ?",
+                      (RUNNING, time.time(), job_id))
+
+    def finish(self, job_id, result=None, error=None):
+        self._execute("""
+            UPDATE verification_jobs
+            SET status = ?, result = ?, error = ?, image_path = NULL, finished_at = ?
+            WHERE id = ?
+        """, (FAILED if error else DONE, None if result is None else json.dumps(result),
+              error, time.time(), job_id))
+
+    def get(self, job_id):
+        rows = self._execute("""
+            SELECT id, user_id, status, result, error, created_at, started_at, finished_at
+            FROM verification_jobs WHERE id = ?
+        """, (job_id,))
+        if not rows:
+            return None
+        job_id, user_id, status, result, error, created_at, started_at, finished_at = rows[0]
+        return {
+            "job_id": job_id,
+            "user_id": user_id,
+            "status": status,
+            "result": None if result is None else json.loads(result),
+            "error": error,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+        }
+
+    def unfinished(self):
+        """(id, user_id, image_path) of jobs a previous process never completed, oldest first"""
+        return self._execute("""
+            SELECT id, user_id, image_path FROM verification_jobs
+            WHERE status IN (?, ?) ORDER BY created_at
+        """, (QUEUED, RUNNING))
+
+    def prune(self, older_than):
+        self._execute("DELETE FROM verification_jobs WHERE status IN (?, ?) AND finished_at < ?",
+                      (DONE, FAILED, older_than))
+
+
+def run_verification(image_path, user_id):
+    """The pipeline a job runs; imported lazily so the API starts without OpenCV/Gemini"""
+    from update_user_history import upload_data_to_user_history
+    return upload_data_to_user_history(image_path, user_id)
+
+
+class VerificationQueue:
+    def __init__(self, store=None, workers=WORKERS, max_queued=QUEUE_MAX,
+                 spool_dir=SPOOL_DIR, handler=run_verification):
+        self.store = store or JobStore()
+        self.spool_dir = spool_dir
+        self.handler = handler
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._workers = [threading.Thread(target=self._work, name=f"verify-{i}", daemon=True)
+                         for i in range(workers)]
+        self._janitor = threading.Thread(target=self._prune_periodically, name="verify-prune", daemon=True)
+        self._stopping = threading.Event()
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def start(self):
+        """Start the workers, then requeue what a previous process left unfinished.
+
+        Never blocks: get_verification_queue calls this under its lock, so a
+        full queue must not wait for a worker. Jobs that don't fit are failed
+        and their clients resubmit.
+        """
+        self.store.prune(time.time() - RETENTION_SECONDS)
+        for worker in self._workers:
+            worker.start()
+        self._janitor.start()
+        for job_id, user_id, image_path in self.store.unfinished():
+            if not image_path or not os.path.exists(image_path):
+                self.store.finish(job_id, error="Image lost before the job could run")
+                continue
+            try:
+                self._queue.put_nowait((job_id, user_id, image_path, time.monotonic()))
+            except queue.Full:
+                self.store.finish(job_id, error="Verification queue was full after a restart; resubmit the photo")
+                os.remove(image_path)
+
+    def _prune_periodically(self):
+        while not self._stopping.wait(PRUNE_INTERVAL_SECONDS):
+            try:
+                self.store.prune(time.time() - RETENTION_SECONDS)
+            except sqlite3.Error as e:
+                print(f"Could not prune verification jobs: {e}")
+
+    def submit(self, image_bytes, user_id):
+        """Spool the photo and enqueue it; returns the job id"""
+        if self._queue.full():
+            raise QueueFullError("Verification queue is full, retry shortly")
+        job_id = uuid.uuid4().hex
+        image_path = os.path.join(self.spool_dir, job_id)
+        with open(image_path, "wb") as f:
+            f.write(image_bytes)
+        self.store.create(job_id, user_id, image_path)
+        try:
+            self._queue.put_nowait((job_id, user_id, image_path, time.monotonic()))
+        except queue.Full:
+            # Lost the race for the last slot
+            self.store.finish(job_id, error="Verification queue is full")
+            os.remove(image_path)
+            raise QueueFullError("Verification queue is full, retry shortly")
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job_id, user_id, image_path, queued_at = item
+            JOB_SECONDS.observe(time.monotonic() - queued_at, phase="queued")
+            self.store.mark_running(job_id)
+            try:
+                with JOB_SECONDS.time(phase="running"):
+                    result = self.handler(image_path, user_id)
+                self.store.finish(job_id, result=result)
+            except Exception as e:
+                self.store.finish(job_id, error=str(e))
+            finally:
+                if os.path.exists(image_path):
+                    os.remove(image_path)
+
+    def stop(self):
+        """Let the workers finish their current job and exit; queued jobs resume on restart"""
+        self._stopping.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers + [self._janitor]:
+            if worker.is_alive():
+                worker.join()
+
+
+_jobs = None
+_jobs_lock = threading.Lock()
+
+
+def get_verification_queue():
+    """Process-wide queue, started on first use"""
+    global _jobs
+    if _jobs is None:
+        with _jobs_lock:
+            if _jobs is None:
+                jobs = VerificationQueue()
+                jobs.start()
+                _jobs = jobs
+    return _jobs
+
+
+def shutdown_verification_queue():
+    global _jobs
+    with _jobs_lock:
+        if _jobs is not None:
+            _jobs.stop()
+            _jobs = None
+
+
+def _collect_queue_metrics():
+    if _jobs is None:
+        return []
+    return [("medsafe_verification_queue_depth", "gauge", "Verification jobs waiting for a worker",
+             [({}, _jobs.depth())])]
+
+
+register_collector(_collect_queue_metrics)